@@ -1,5 +1,9 @@
         // API endpoint
         const API_URL = "https://lavanderia-teresa.onrender.com/optimize";
+        const DELTA_URL = `${API_URL}/delta`;
+        // Precomputed pricing table (offline quotes); same format as the server's
+        const PRICING_URL = "https://lavanderia-teresa.onrender.com/pricing_table";
+        const PRICING_FORMAT = 1;
         
         // Initial items data
         const initialItems = [
@@ -44,6 +48,7 @@
         let items = [];
         let clients = [];
         let orders = [];
+        let pricingTables = {};
 
         // Initialize the app
         function initApp() {
@@ -89,7 +94,130 @@
             document.getElementById('client-select').addEventListener('change', function() {
                 currentClient = this.value;
                 saveToStorage();
+                loadPricingTable(currentClient || "Cliente Geral");
             });
+
+            loadPricingTable(currentClient || "Cliente Geral");
+        }
+
+        // Load the pricing table of a client's catalog: the saved copy first
+        // (works offline), then the server's (the browser revalidates it by ETag)
+        async function loadPricingTable(client) {
+            const key = `pricingTable:${client}`;
+            if (!pricingTables[client]) {
+                const saved = localStorage.getItem(key);
+                if (saved) {
+                    try {
+                        pricingTables[client] = JSON.parse(saved);
+                    } catch (e) {
+                        localStorage.removeItem(key);
+                    }
+                }
+            }
+            try {
+                const response = await fetch(`${PRICING_URL}?cliente=${encodeURIComponent(client)}`);
+                if (response.ok) {
+                    const table = await response.json();
+                    if (table.formato === PRICING_FORMAT) {
+                        pricingTables[client] = table;
+                        try {
+                            localStorage.setItem(key, JSON.stringify(table));
+                        } catch (e) {
+                            // Storage full: the table stays in memory only
+                        }
+                    }
+                }
+            } catch (e) {
+                // Offline: keep the saved table
+            }
+            return pricingTables[client] || null;
+        }
+
+        // Optimal quote read from the pricing table, in the /optimize response
+        // format (without pdf_url); null if the order is outside the table
+        function localQuote(table, qty) {
+            if (!table || table.formato !== PRICING_FORMAT) return null;
+            const pecas = qty.peca_variada || 0;
+            const camisas = qty.camisa || 0;
+            if (pecas > table.max_pecas || camisas > table.max_camisas) return null;
+            const ordered = Object.entries(qty).filter(([, n]) => n > 0);
+            if (!ordered.length || ordered.some(([id]) => !(id in table.precos))) return null;
+
+            // Prices in cents, as the server sums them
+            const cents = value => Math.round(value * 100);
+            const cell = pecas * (table.max_camisas + 1) + camisas;
+
+            const packs_mistos = {};
+            let capacity = 0;
+            let mistosCents = 0;
+            table.packs_mistos.forEach(pack => {
+                const n = table.mistos[pack.tipo][cell];
+                if (n > 0) {
+                    packs_mistos[pack.tipo] = n;
+                    capacity += pack.capacidade * n;
+                    mistosCents += cents(pack.preco) * n;
+                }
+            });
+
+            const packs_camisas = {};
+            let camisasCents = 0;
+            table.packs_camisas.forEach(pack => {
+                const n = table.camisas[pack.tipo][cell];
+                if (n > 0) {
+                    packs_camisas[pack.tipo] = n;
+                    camisasCents += cents(pack.preco) * n;
+                }
+            });
+
+            // Shirts in the mixed packs, spread in catalog order
+            const shirtsInMixed = table.camisas_em_mistos[cell];
+            const camisas_em_packs_mistos = {};
+            let remaining = shirtsInMixed;
+            table.packs_mistos.forEach(pack => {
+                const placed = Math.min(remaining, pack.limite_camisas * (packs_mistos[pack.tipo] || 0));
+                if (placed > 0) {
+                    camisas_em_packs_mistos[pack.tipo] = placed;
+                    remaining -= placed;
+                }
+            });
+
+            const itens_avulsos = {
+                peca_variada: Math.max(0, pecas - (capacity - shirtsInMixed)),
+                camisa: table.camisas_avulsas[cell]
+            };
+            const avulsosCents = cents(table.precos.peca_variada) * itens_avulsos.peca_variada +
+                cents(table.precos.camisa) * itens_avulsos.camisa;
+
+            const itens_fixos = {};
+            let fixosCents = 0;
+            ordered.forEach(([id, n]) => {
+                if (id !== 'peca_variada' && id !== 'camisa') {
+                    itens_fixos[id] = n;
+                    fixosCents += cents(table.precos[id]) * n;
+                }
+            });
+
+            const variableCents = mistosCents + camisasCents + avulsosCents;
+            return {
+                status: 'sucesso',
+                custo_total: (fixosCents + variableCents) / 100,
+                offline: true,
+                detalhes: {
+                    itens_fixos,
+                    packs_mistos,
+                    packs_camisas,
+                    itens_avulsos,
+                    camisas_em_packs_mistos,
+                    detalhe_custos: {
+                        custos_fixos: fixosCents / 100,
+                        packs_mistos: mistosCents / 100,
+                        packs_camisas: camisasCents / 100,
+                        itens_avulsos: avulsosCents / 100,
+                        total_variavel: variableCents / 100,
+                        total: (fixosCents + variableCents) / 100
+                    }
+                }
+            };
         }
 
         // Load data from localStorage
@@ -254,16 +382,48 @@
                 items: {...quantities},
                 cliente: currentClient || "Cliente Geral"
             };
+
+            // Diferenças face ao último recibo do servidor, calculadas antes
+            // de a cotação offline substituir o pedido atual
+            const delta = orderDelta();
+            const receiptId = delta ? currentOrder.pdf_url.split('/').pop() : null;
+
+            // Instant quote from the pricing table; the server still creates
+            // the receipt (and quotes orders outside the table)
+            const offlineResult = localQuote(pricingTables[requestData.cliente], quantities);
+            if (offlineResult) {
+                setCurrentOrder(offlineResult);
+                displayResults(offlineResult);
+            }
             
             try {
-                // Call the API
-                const response = await fetch(API_URL, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(requestData)
-                });
+                // Edição de um pedido já calculado: enviar só as diferenças
+                let response = null;
+                if (delta) {
+                    response = await fetch(DELTA_URL, {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify({
+                            receipt_id: receiptId,
+                            delta
+                        })
+                    });
+                    // Recibo expirado: recalcular o pedido completo
+                    if (response.status === 404 || response.status === 409) response = null;
+                }
+
+                if (!response) {
+                    // Call the API
+                    response = await fetch(API_URL, {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json'
+                        },
+                        body: JSON.stringify(requestData)
+                    });
+                }
                 
                 if (!response.ok) {
                     const errorData = await response.json();
@@ -273,25 +433,17 @@
                 const result = await response.json();
                 
                 // Create order object
-                const timestamp = Date.now();
-                currentOrder = {
-                    id: timestamp,
-                    timestamp,
-                    date: new Date(timestamp).toLocaleString('pt-PT'),
-                    client: currentClient || "Cliente Geral",
-                    quantities: {...quantities},
-                    total: result.custo_total,
-                    status: 'pending',
-                    details: result.detalhes,
-                    pdf_url: result.pdf_url
-                };
+                setCurrentOrder(result);
                 
                 // Display results
                 displayResults(result);
                 
             } catch (error) {
                 console.error('API Error:', error);
-                alert(`Erro: ${error.message || "Falha na comunicação com o servidor"}`);
+                // Offline quote already shown: only the receipt is missing
+                if (!offlineResult) {
+                    alert(`Erro: ${error.message || "Falha na comunicação com o servidor"}`);
+                }
             } finally {
                 // Hide loading state
                 spinner.style.display = 'none';
@@ -299,6 +451,38 @@
             }
         }
         
+        // Current (unconfirmed) order from an /optimize response or an offline quote
+        function setCurrentOrder(result) {
+            const timestamp = Date.now();
+            currentOrder = {
+                id: timestamp,
+                timestamp,
+                date: new Date(timestamp).toLocaleString('pt-PT'),
+                client: currentClient || "Cliente Geral",
+                quantities: {...quantities},
+                total: result.custo_total,
+                status: 'pending',
+                details: result.detalhes,
+                pdf_url: result.pdf_url
+            };
+        }
+
+        // Differences between the quantities and the last calculated order
+        // (null if there is no previous order for the same client)
+        function orderDelta() {
+            if (!currentOrder || !currentOrder.pdf_url ||
+                currentOrder.client !== (currentClient || "Cliente Geral")) {
+                return null;
+            }
+            const delta = {};
+            const ids = new Set([...Object.keys(quantities), ...Object.keys(currentOrder.quantities)]);
+            for (const id of ids) {
+                const diff = (quantities[id] || 0) - (currentOrder.quantities[id] || 0);
+                if (diff !== 0) delta[id] = diff;
+            }
+            return Object.keys(delta).length ? delta : null;
+        }
+
         // Display calculation results
         function displayResults(result) {
             // 1. Get required DOM elements
@@ -399,13 +583,18 @@
                 });
             }
             
-            // 6. Update result header with savings
+            // 6. Update result header with savings (offline quotes have no receipt yet)
+            const receiptButton = result.pdf_url
+                ? `<a href="${result.pdf_url}" target="_blank" class="receipt-btn">
+                        <i class="fas fa-file-pdf"></i> Ver Recibo
+                    </a>`
+                : `<span class="receipt-btn disabled">
+                        <i class="fas fa-file-pdf"></i> Recibo indisponível offline
+                    </span>`;
             resultHeader.innerHTML = `
                 <h2 class="section-title"><i class="fas fa-chart-line"></i> Resultado da Otimização</h2>
                 <div>
-                    <a href="${result.pdf_url}" target="_blank" class="receipt-btn">
-                        <i class="fas fa-file-pdf"></i> Ver Recibo
-                    </a>
+                    ${receiptButton}
                     <div class="savings-badge">
                         <i class="fas fa-piggy-bank"></i> Poupança: €${savings.toFixed(2)} (${savingsPercent}%)
                     </div>
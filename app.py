@@ -1,21 +1,27 @@
-from flask import Flask, request, jsonify, send_file
-from laundry_optimizer_final import gpt_optimize_handler, CATALOG
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import Paragraph, Table, TableStyle
-from reportlab.lib.units import mm
-from datetime import datetime
-import tempfile
-import logging
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
+from laundry_optimizer_final import (
+    gpt_optimize_handler, gpt_optimize_batch_handler, gpt_reoptimize_handler,
+    gpt_price_curve_handler, delta_sem_solver, memo_respostas, MEMO_ATIVO,
+    SOLVER_HEURISTICO, FORMATO_TABELA_PRECOS, TABELA_CAMISAS, TABELA_PECAS
+)
+from catalogos import registo_catalogos
+from collections import OrderedDict
+from functools import partial
+from urllib.parse import urlencode
+import gzip
+import hashlib
+import io
+import json
 import os
 import uuid
 from flask_cors import CORS
+from solver_pool import SolverAtrasado, SolverExecutor, SolverOcupado, SolverTempoEsgotado
+from result_store import criar_result_store, RESULT_TTL
+from order_ledger import CATEGORIAS, criar_livro_pedidos, mes_de
+from metricas import METRICAS_ATIVAS, exportar as exportar_metricas, span
+from request_log import configurar_logging, instalar as instalar_request_log
 import threading
 import time
-from pathlib import Path
-import traceback
 
 app = Flask(__name__)
 
@@ -26,237 +32,247 @@ CORS(app, resources={
         "methods": ["POST", "OPTIONS"],
         "allow_headers": ["Content-Type"]
     },
+    r"/optimize/batch": {
+        "origins": ["https://jcristovao99.github.io"],
+        "methods": ["POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/optimize/delta": {
+        "origins": ["https://jcristovao99.github.io"],
+        "methods": ["POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/price_curve": {
+        "origins": ["https://jcristovao99.github.io"],
+        "methods": ["POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
     r"/download_pdf/*": {
         "origins": ["https://jcristovao99.github.io"],
         "methods": ["GET"]
     },
+    r"/export_pdf": {
+        "origins": ["https://jcristovao99.github.io"],
+        "methods": ["POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/quote": {
+        # Resposta igual para todas as origens: sem Vary: Origin na CDN
+        "origins": "*",
+        "send_wildcard": True,
+        "methods": ["GET"]
+    },
+    r"/pricing_table": {
+        "origins": "*",
+        "send_wildcard": True,
+        "methods": ["GET"]
+    },
+    r"/relatorios/*": {
+        "origins": ["https://jcristovao99.github.io"],
+        "methods": ["GET"]
+    },
     r"/health": {
         "origins": "*",
         "methods": ["GET"]
     }
 })
 
-# Configurações de caminho
-BASE_DIR = Path(__file__).parent.resolve()
-LOGO_PATH = BASE_DIR / "logo.png"
+# Configuração de logging: fila assíncrona + uma linha amostrada por pedido
+configurar_logging()
+instalar_request_log(app)
+
+# Pré-aquecer no master do gunicorn antes do fork (ver aquecer_servico)
+PRELOAD_APP = os.environ.get("PRELOAD_APP", "1") != "0"
+
+def aquecer_servico():
+    """
+    Carrega o que é pesado e fica partilhado após o fork: para cada catálogo
+    registado, a tabela de custos ótimos no tamanho máximo com a redução por
+    blocos dos pedidos grandes (NumPy; de LAUNDRY_TABELA_PATH ou calculada),
+    e o template dos recibos (ReportLab, logo pré-processado). Sem isto, os
+    imports e as tabelas são feitos no primeiro pedido que precisar deles;
+    o mesmo acontece com catálogos acrescentados por recarga do ficheiro.
+    """
+    from receipt_pdf import obter_template
+    registo_catalogos.aquecer()
+    obter_template()
+
+# Execução dos solves num pool de processos limitado (0 workers = inline)
+solver_executor = SolverExecutor(
+    max_workers=int(os.environ.get("SOLVER_POOL_WORKERS", 2)),
+    max_pending=int(os.environ.get("SOLVER_POOL_QUEUE", 16)),
+    timeout=float(os.environ.get("SOLVER_TIMEOUT", 10)),
+    logger=app.logger
+)
 
-# Verificar existência do logo
-if not LOGO_PATH.exists():
-    app.logger.warning(f"Arquivo de logo não encontrado: {LOGO_PATH}")
-    LOGO_PATH = None
+# Prazo por omissão de um solve em /optimize (ms; 0 = só o tempo limite).
+# Passado o prazo, responde-se com a heurística e o exato chega ao recibo depois
+SOLVER_PRAZO_MS = float(os.environ.get("SOLVER_PRAZO_MS", 2000))
 
-# Configuração de logging
-logging.basicConfig(level=logging.INFO)
-app.logger.setLevel(logging.INFO)
+# Tamanho máximo de um lote em /optimize/batch
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
 
-# Lista de chaves válidas
-VALID_KEYS = {
-    "peca_variada", "camisa", "vestido_simples",
-    "calca_com_vinco", "blazer", "toalha_ou_lencol",
-    "capa_de_edredon", "calca_com_blazer", "vestido_cerimonia", 
-    "vestido_noiva", "casaco_sobretudo", "blusao_almofadado", "blusao_penas"
-}
+# Máximo de recibos por exportação em /export_pdf
+MAX_EXPORT_SIZE = int(os.environ.get("MAX_EXPORT_SIZE", 500))
 
-# Cache para armazenar resultados
-result_cache = {}
-cache_lock = threading.Lock()
+# Resultados (recibos) partilhados entre workers: ver result_store.py
+result_store = criar_result_store(app.logger)
+
+# Histórico permanente dos pedidos (relatórios): ver order_ledger.py
+livro_pedidos = criar_livro_pedidos()
 
 # ========================================================================== #
-#  LIMPEZA AUTOMÁTICA DO CACHE (executa a cada 5 minutos)
+#  CACHE DE PDFS RENDERIZADOS (LRU limitado em entradas e bytes)
 # ========================================================================== #
-def clean_cache():
-    while True:
-        time.sleep(300)  # 5 minutos
-        now = time.time()
-        with cache_lock:
-            global result_cache
-            # Mantém registros dos últimos 30 minutos
-            result_cache = {k: v for k, v in result_cache.items() if now - v['timestamp'] < 1800}
-
-# Inicia thread de limpeza
-cache_cleaner = threading.Thread(target=clean_cache, daemon=True)
-cache_cleaner.start()
+class PdfCache:
+    """LRU thread-safe de PDFs por receipt_id, com limite de memória."""
+
+    def __init__(self, max_items=256, max_bytes=32 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while len(self._items) > self.max_items or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def discard(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entradas": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+pdf_cache = PdfCache(
+    max_items=int(os.environ.get("PDF_CACHE_MAX_ITEMS", 256)),
+    max_bytes=int(os.environ.get("PDF_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+)
 
 # ========================================================================== #
-#  GERADOR DE PDF PROFISSIONAL (ATUALIZADO)
+#  RESPOSTAS GET CACHEÁVEIS: /quote e /pricing_table (brotli opcional)
 # ========================================================================== #
-def generate_receipt_pdf(resultado, cliente_nome=""):
-    """Gera PDF profissional com design atualizado e altura dinâmica"""
-    try:
-        # 1. Criar arquivo temporário
-        filename = os.path.join(tempfile.gettempdir(), f"receipt_{uuid.uuid4().hex}.pdf")
-        
-        # Criar canvas com tamanho A4
-        c = canvas.Canvas(filename, pagesize=A4)
-        width, height = A4
-        
-        # 2. Definir paleta de cores
-        COLORS = {
-            "background": colors.Color(249/255, 249/255, 247/255),  # #f9f9f7
-            "text_dark": colors.Color(24/255, 34/255, 50/255),     # #182232
-            "table_header": colors.Color(26/255, 45/255, 68/255),   # #1a2d44
-            "row_even": colors.white,
-            "row_odd": colors.Color(240/255, 240/255, 240/255),    # #f0f0f0
-            "total_bg": colors.Color(26/255, 45/255, 68/255),      # #1a2d44
-            "text_light": colors.white
-        }
-        
-        # 3. Estilos personalizados
-        styles = getSampleStyleSheet()
-        item_style = ParagraphStyle(
-            'Item',
-            parent=styles['BodyText'],
-            fontName='Helvetica',
-            fontSize=10,
-            leading=12,
-            textColor=COLORS["text_dark"]
-        )
-        
-        total_style = ParagraphStyle(
-            'Total',
-            parent=styles['BodyText'],
-            fontName='Helvetica-Bold',
-            fontSize=12,
-            textColor=COLORS["text_light"]
-        )
-        
-        # 4. Fundo
-        c.setFillColor(COLORS["background"])
-        c.rect(0, 0, width, height, fill=1, stroke=0)
-        
-        # 5. Logo no topo (largura total)
-        logo_height = 50
-        logo_y = height - logo_height - 20
-        if LOGO_PATH and LOGO_PATH.exists():
-            c.drawImage(
-                str(LOGO_PATH),
-                x=20,
-                y=logo_y,
-                width=width - 40,
-                height=logo_height,
-                preserveAspectRatio=True,
-                mask='auto'
-            )
-        else:
-            # Fallback caso o logo não exista
-            c.setFillColor(COLORS["table_header"])
-            c.rect(20, logo_y, width - 40, logo_height, fill=1, stroke=0)
-            c.setFillColor(COLORS["text_light"])
-            c.setFont("Helvetica-Bold", 16)
-            c.drawCentredString(width/2, logo_y + logo_height/2, "ENGOMADORIA TERESA")
-        
-        # 6. Nome do cliente (se fornecido)
-        y_pos = logo_y - 30
-        if cliente_nome:
-            c.setFillColor(COLORS["text_dark"])
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(30, y_pos, f"Cliente: {cliente_nome}")
-            y_pos -= 20
-        
-        # 7. Tabela de itens
-        data = [['Descrição', 'Quantidade', 'Preço Unitário', 'Subtotal']]
-        
-        # Adicionar itens fixos
-        for item, qty in resultado['detalhes']['itens_fixos'].items():
-            if qty > 0:
-                preco = CATALOG['avulso'][item]
-                desc = item.replace('_', ' ').replace('ou', '/').title()
-                data.append([
-                    Paragraph(desc, item_style),
-                    str(qty),
-                    f"€{preco:.2f}".replace('.', ','),
-                    f"€{(qty*preco):.2f}".replace('.', ',')
-                ])
-        
-        # Adicionar packs mistos
-        for pack, qty in resultado['detalhes']['packs_mistos'].items():
-            if qty > 0:
-                pack_data = next(p for p in CATALOG['packs_mistos'] if p['tipo'] == pack)
-                data.append([
-                    Paragraph(f"Pack Misto {pack} peças", item_style),
-                    str(qty),
-                    f"€{pack_data['preco']:.2f}".replace('.', ','),
-                    f"€{(qty*pack_data['preco']):.2f}".replace('.', ',')
-                ])
-        
-        # Adicionar packs de camisas
-        for pack, qty in resultado['detalhes']['packs_camisas'].items():
-            if qty > 0:
-                pack_data = next(p for p in CATALOG['packs_camisas'] if p['tipo'] == pack)
-                data.append([
-                    Paragraph(f"Pack Camisas {pack}", item_style),
-                    str(qty),
-                    f"€{pack_data['preco']:.2f}".replace('.', ','),
-                    f"€{(qty*pack_data['preco']):.2f}".replace('.', ',')
-                ])
-        
-        # Adicionar itens avulsos
-        for item, qty in resultado['detalhes']['itens_avulsos'].items():
-            if qty > 0:
-                preco = CATALOG['avulso'][item]
-                desc = item.replace('_', ' ').title()
-                data.append([
-                    Paragraph(desc, item_style),
-                    str(qty),
-                    f"€{preco:.2f}".replace('.', ','),
-                    f"€{(qty*preco):.2f}".replace('.', ',')
-                ])
-        
-        # 8. Criar tabela com estilo
-        table = Table(
-            data, 
-            colWidths=[width*0.4, width*0.15, width*0.2, width*0.25],
-            repeatRows=1
-        )
-        
-        table_style = TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), COLORS["table_header"]),
-            ('TEXTCOLOR', (0,0), (-1,0), COLORS["text_light"]),
-            ('FONT', (0,0), (-1,0), 'Helvetica-Bold', 10),
-            ('ALIGN', (1,0), (-1,0), 'CENTER'),
-            ('ALIGN', (2,0), (-1,-1), 'RIGHT'),
-            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-            ('INNERGRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
-            ('BOX', (0,0), (-1,-1), 0.5, colors.lightgrey),
-            ('ROWBACKGROUNDS', (0,1), (-1,-1), [COLORS["row_even"], COLORS["row_odd"]])
-        ])
-        
-        table.setStyle(table_style)
-        
-        # 9. Desenhar tabela
-        table.wrapOn(c, width - 40, height)
-        table.drawOn(c, 20, y_pos - table._height - 30)
-        
-        # 10. Seção de total
-        total_y = y_pos - table._height - 60
-        c.setFillColor(COLORS["total_bg"])
-        c.rect(20, total_y, width - 40, 30, fill=1, stroke=0)
-        
-        c.setFillColor(COLORS["text_light"])
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(30, total_y + 10, "TOTAL")
-        
-        total_text = f"€{resultado['custo_total']:.2f}".replace('.', ',')
-        c.drawRightString(width - 30, total_y + 10, total_text)
-        
-        # 11. Adicionar rodapé com data e nome do cliente
-        c.setFillColor(COLORS["text_dark"])
-        c.setFont("Helvetica", 8)
-        
-        footer_text = f"Recibo gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-        if cliente_nome:
-            footer_text += f" | Cliente: {cliente_nome}"
-        footer_text += " | Engomadoria Teresa"
-        
-        c.drawCentredString(width/2, 20, footer_text)
-        
-        c.save()
-        return filename
-            
-    except Exception as e:
-        app.logger.error(f"Erro ao gerar PDF: {str(e)}")
-        app.logger.error(traceback.format_exc())
-        raise
+try:
+    import brotli
+except ImportError:  # sem brotli, só gzip
+    brotli = None
+
+# Cache de /quote sem a versão do catálogo no URL: o catálogo pode mudar
+QUOTE_MAX_AGE = int(os.environ.get("QUOTE_MAX_AGE", 60))
+# Com a versão no URL, a resposta desse URL nunca muda
+QUOTE_MAX_AGE_VERSAO = 365 * 24 * 3600
+
+# Cache de /pricing_table sem a versão do catálogo no URL
+PRICING_TABLE_MAX_AGE = int(os.environ.get("PRICING_TABLE_MAX_AGE", 3600))
+
+# Tabelas de preços já serializadas e comprimidas, por ETag da representação
+tabelas_cache = PdfCache(max_items=32, max_bytes=16 * 1024 * 1024)
+
+# Abaixo disto a compressão não compensa
+COMPRESSAO_MIN_BYTES = 256
+
+# Codificação -> sufixo do ETag (ETags fortes diferem por representação)
+_SUFIXOS_CODIFICACAO = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+def _escolher_codificacao():
+    """Melhor codificação aceite pelo cliente (Accept-Encoding)."""
+    opcoes = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(opcoes, default="identity")
+
+def _comprimir(corpo, codificacao):
+    """Comprime de forma determinística (o mesmo corpo dá os mesmos bytes)."""
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=5)
+    if codificacao == "gzip":
+        return gzip.compress(corpo, compresslevel=6, mtime=0)
+    return corpo
+
+def _json_canonico(dados):
+    """JSON determinístico (chaves ordenadas, sem espaços): bytes estáveis para o ETag."""
+    return json.dumps(
+        dados, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    ).encode("utf-8")
+
+def _motor_get(versao, cliente_nome):
+    """Motor de um GET cacheável: o da versão pedida (None se desconhecida) ou o do cliente."""
+    if versao is None:
+        return registo_catalogos.selecionar(cliente_nome)[1]
+    return registo_catalogos.procurar(versao)
+
+def _catalogo_desconhecido(versao):
+    return jsonify({"status": "erro", "mensagem": f"Catálogo desconhecido: '{versao}'"}), 404
+
+def _resposta_cacheavel(etag, content_location, imutavel, max_age, gerar_corpo, cache=None):
+    """
+    Resposta GET com ETag forte por representação (sufixo por codificação),
+    Cache-Control e compressão negociada. Um If-None-Match que coincida com
+    qualquer representação responde 304 sem chamar ``gerar_corpo``, que
+    devolve o JSON (bytes) ou uma resposta de erro. Com ``cache``, os bytes
+    já comprimidos ficam guardados por ETag da representação.
+    """
+    codificacao = _escolher_codificacao()
+    cabecalhos = {
+        "ETag": f'"{etag}{_SUFIXOS_CODIFICACAO[codificacao]}"',
+        "Cache-Control": (
+            f"public, max-age={QUOTE_MAX_AGE_VERSAO}, immutable" if imutavel
+            else f"public, max-age={max_age}"
+        ),
+        "Vary": "Accept-Encoding",
+        "Content-Location": content_location,
+    }
+    # Revalidação: qualquer representação do mesmo conteúdo serve
+    if any(
+        request.if_none_match.contains_weak(etag + sufixo)
+        for sufixo in _SUFIXOS_CODIFICACAO.values()
+    ):
+        return Response(status=304, headers=cabecalhos)
+
+    chave = cabecalhos["ETag"]
+    guardado = cache.get(chave) if cache is not None else None
+    if guardado is None:
+        corpo = gerar_corpo()
+        if not isinstance(corpo, bytes):
+            return corpo
+        if len(corpo) < COMPRESSAO_MIN_BYTES:
+            codificacao = "identity"
+        guardado = (_comprimir(corpo, codificacao), codificacao)
+        if cache is not None:
+            cache.put(chave, guardado, len(guardado[0]))
+    corpo, codificacao = guardado
+    cabecalhos["ETag"] = f'"{etag}{_SUFIXOS_CODIFICACAO[codificacao]}"'
+    if codificacao != "identity":
+        cabecalhos["Content-Encoding"] = codificacao
+    return Response(corpo, mimetype="application/json", headers=cabecalhos)
 
 # ========================================================================== #
 #  ENDPOINTS DA API
@@ -270,7 +286,14 @@ def home():
         "versao": "2.0.1",
         "endpoints": {
             "optimize": "/optimize (POST)",
+            "optimize_batch": "/optimize/batch (POST)",
+            "optimize_delta": "/optimize/delta (POST)",
+            "price_curve": "/price_curve (POST)",
+            "quote": "/quote?<item>=<quantidade>&...[&cliente=][&catalogo=] (GET)",
+            "pricing_table": "/pricing_table[?cliente=][&catalogo=] (GET)",
             "download_pdf": "/download_pdf/<receipt_id> (GET)",
+            "export_pdf": "/export_pdf (POST)",
+            "relatorios": "/relatorios/<receita|itens|packs|historico> (GET)",
             "health": "/health (GET)"
         },
         "mensagem": "Envie um POST para /optimize com os itens de lavanderia"
@@ -284,44 +307,16 @@ def optimize():
     
     # 1. Obter e validar dados de entrada
     try:
-        app.logger.info("Recebendo solicitação de otimização")
-        app.logger.info(f"Headers: {request.headers}")
-        app.logger.info(f"Data: {request.data}")
-        
         # Tentar obter JSON do corpo da requisição
-        data = request.get_json(silent=True) or {}
-        
-        # Aceitar tanto o formato direto (novo) quanto o formato com "items" (antigo)
-        if 'items' in data:
-            items = data['items']
-        else:
-            items = data
+        with span("optimize.validacao"):
+            data = request.get_json(silent=True) or {}
+            clean_items, cliente_nome, motor = _validate_order(data)
+            prazo = _validate_prazo(data)
 
-        # Validação básica
-        if not items or not isinstance(items, dict):
-            raise ValueError("Formato inválido: esperado objeto com itens")
-            
-        # Capturar nome do cliente se fornecido
-        cliente_nome = data.get('cliente', '').strip()
-            
-        # Converter valores para inteiros e validar
-        clean_items = {}
-        for item, qty in items.items():
-            if item not in VALID_KEYS:
-                raise ValueError(f"Item desconhecido: '{item}'. Itens válidos: {', '.join(VALID_KEYS)}")
-                
-            try:
-                clean_qty = int(qty)
-                if clean_qty < 0:
-                    raise ValueError(f"Quantidade negativa para '{item}': {qty}")
-                clean_items[item] = clean_qty
-            except (TypeError, ValueError):
-                raise ValueError(f"Quantidade inválida para '{item}': {qty} - deve ser número inteiro")
-
-        app.logger.info(f"Pedido validado: {clean_items}")
+        app.logger.debug("Pedido validado: %s", clean_items)
 
     except Exception as e:
-        app.logger.error(f"Erro na validação: {str(e)}")
+        app.logger.info("Erro na validação: %s", e)
         return jsonify({
             "status": "erro",
             "mensagem": str(e)
@@ -329,71 +324,743 @@ def optimize():
 
     # 2. Processar otimização usando o handler do ChatGPT
     try:
-        app.logger.info("Iniciando otimização...")
-        response = gpt_optimize_handler(clean_items)
-        
-        # Gerar ID único para o resultado
-        receipt_id = str(uuid.uuid4())
-        
-        # Armazenar resultado no cache
-        with cache_lock:
-            result_cache[receipt_id] = {
-                "result": response,
-                "cliente": cliente_nome,  # Armazenar nome do cliente
-                "timestamp": time.time()
-            }
+        # Pedidos repetidos (ex.: assinaturas) nem chegam ao pool
+        with span("optimize.memo"):
+            response = memo_respostas.obter(clean_items, None, motor) if MEMO_ATIVO else None
+        pendente = None
+        if response is None:
+            try:
+                with span("optimize.solver"):
+                    response = solver_executor.submit(
+                        partial(gpt_optimize_handler, motor=motor), clean_items, prazo=prazo
+                    )
+            except SolverAtrasado as e:
+                # Resposta heurística já; o exato segue para o recibo
+                app.logger.warning("%s: resposta heurística", e)
+                pendente = e.pendente
+                with span("optimize.heuristico"):
+                    response = gpt_optimize_handler(clean_items, SOLVER_HEURISTICO, False, motor)
+            if MEMO_ATIVO:
+                with span("optimize.memo"):
+                    memo_respostas.guardar(clean_items, None, response, motor)
         
         # Adicionar URL para download do PDF (GET)
-        base_url = "https://lavanderia-teresa.onrender.com"
-        response['pdf_url'] = f"{base_url}/download_pdf/{receipt_id}"
+        with span("optimize.result_store"):
+            # O receipt_id é o ID de correlação do pedido (X-Request-ID)
+            response['pdf_url'] = _store_receipt(
+                response, cliente_nome, g.request_id, clean_items, motor
+            )
+        if pendente is not None:
+            pendente.quando_concluir(partial(_refinar_recibo, g.request_id, clean_items, motor))
         
-        app.logger.info("Otimização concluída com sucesso")
         return _corsify_actual_response(jsonify(response))
 
+    except (SolverOcupado, SolverTempoEsgotado) as e:
+        return _solver_unavailable_response(e)
+    except Exception as e:
+        app.logger.exception("Erro fatal na otimização: %s", e)
+        return _corsify_actual_response(jsonify({
+            "status": "erro",
+            "mensagem": f"Erro interno no servidor: {str(e)}"
+        }), 500)
+
+@app.route('/optimize/batch', methods=['POST', 'OPTIONS'])
+def optimize_batch():
+    """
+    Otimiza vários pedidos num só pedido HTTP.
+
+    Corpo: {"pedidos": [<pedido>, ...], "recibos": false}, em que cada pedido
+    tem o mesmo formato aceite por /optimize. Os resultados vêm pela ordem de
+    entrada; um pedido inválido recebe o seu próprio erro sem falhar o lote.
+    Os pedidos são agrupados pelo catálogo do respetivo cliente.
+    Recibos (pdf_url) só são criados com "recibos": true.
+    """
+    if request.method == 'OPTIONS':
+        return _build_cors_preflight_response()
+
+    data = request.get_json(silent=True)
+    pedidos = data.get('pedidos') if isinstance(data, dict) else data
+    if not isinstance(pedidos, list) or not pedidos:
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Formato inválido: esperado objeto com lista 'pedidos'"
+        }), 400
+    if len(pedidos) > MAX_BATCH_SIZE:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Lote demasiado grande ({len(pedidos)} pedidos). Máximo: {MAX_BATCH_SIZE}"
+        }), 400
+    gerar_recibos = isinstance(data, dict) and data.get('recibos') is True
+
+    resultados = [None] * len(pedidos)
+    validos = []
+    for i, pedido in enumerate(pedidos):
+        try:
+            validos.append((i, *_validate_order(pedido)))
+        except Exception as e:
+            resultados[i] = {"status": "erro", "mensagem": str(e)}
+
+    grupos = {}
+    for i, items, cliente_nome, motor in validos:
+        grupos.setdefault(motor.versao, (motor, []))[1].append((i, items, cliente_nome))
+
+    try:
+        for motor, membros in grupos.values():
+            respostas = solver_executor.submit(
+                partial(gpt_optimize_batch_handler, motor=motor),
+                [items for _, items, _ in membros]
+            )
+            for (i, items, cliente_nome), response in zip(membros, respostas):
+                if gerar_recibos and response["status"] == "sucesso":
+                    response['pdf_url'] = _store_receipt(
+                        response, cliente_nome, items=items, motor=motor
+                    )
+                resultados[i] = response
+
+        app.logger.debug("Lote otimizado: %d pedidos", len(pedidos))
+        return _corsify_actual_response(jsonify({
+            "status": "sucesso",
+            "total_pedidos": len(pedidos),
+            "resultados": resultados
+        }))
+
+    except (SolverOcupado, SolverTempoEsgotado) as e:
+        return _solver_unavailable_response(e)
     except Exception as e:
-        app.logger.error(f"Erro fatal na otimização: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        app.logger.exception("Erro fatal na otimização em lote: %s", e)
         return _corsify_actual_response(jsonify({
             "status": "erro",
             "mensagem": f"Erro interno no servidor: {str(e)}"
         }), 500)
 
+@app.route('/optimize/delta', methods=['POST', 'OPTIONS'])
+def optimize_delta():
+    """
+    Re-otimização incremental de um recibo já calculado, para edições ao
+    balcão: {"receipt_id": "<id>", "delta": {"camisa": 2, "blazer": -1}}.
+
+    Responde como /optimize (com um novo pdf_url) e ainda com ``pedido`` (as
+    quantidades resultantes), ``alteracoes`` (packs que mudaram) e
+    ``recibo_anterior``. Deltas só de itens de preço fixo são resolvidos aqui
+    mesmo, sem solver; os restantes seguem para o pool como em /optimize.
+    Aplica-se o catálogo atual do cliente: se já não for o do recibo, o
+    pedido é resolvido de novo por inteiro.
+    """
+    if request.method == 'OPTIONS':
+        return _build_cors_preflight_response()
+
+    try:
+        with span("optimize.validacao"):
+            data = request.get_json(silent=True) or {}
+            receipt_id, delta = _validate_delta(data)
+    except Exception as e:
+        app.logger.info("Erro na validação: %s", e)
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+
+    with span("optimize.result_store"):
+        entrada = result_store.get(receipt_id)
+    if entrada is None:
+        return _corsify_actual_response(jsonify({
+            "status": "erro",
+            "mensagem": "Recibo expirado ou inválido"
+        }), 404)
+    if "items" not in entrada:
+        # Recibos criados sem o pedido original (lotes, versões anteriores)
+        return _corsify_actual_response(jsonify({
+            "status": "erro",
+            "mensagem": "Recibo sem pedido original: use /optimize"
+        }), 409)
+
+    try:
+        _, motor = registo_catalogos.selecionar(entrada["cliente"])
+        _validar_itens(delta, motor)
+    except ValueError as e:
+        return _corsify_actual_response(jsonify({"status": "erro", "mensagem": str(e)}), 400)
+
+    try:
+        handler = partial(gpt_reoptimize_handler, motor=motor)
+        args = (entrada["items"], entrada["result"], delta, entrada.get("catalogo"))
+        if delta_sem_solver(delta):
+            with span("optimize.fixos"):
+                response = handler(*args)
+        else:
+            with span("optimize.solver"):
+                response = solver_executor.submit(handler, *args)
+        if response["status"] != "sucesso":
+            return _corsify_actual_response(jsonify(response), 400)
+
+        with span("optimize.result_store"):
+            novo_pedido = response.pop("pedido")
+            response['pdf_url'] = _store_receipt(
+                response, entrada["cliente"], g.request_id, novo_pedido, motor,
+                substitui=receipt_id
+            )
+        response["pedido"] = novo_pedido
+        response["recibo_anterior"] = receipt_id
+        return _corsify_actual_response(jsonify(response))
+
+    except (SolverOcupado, SolverTempoEsgotado) as e:
+        return _solver_unavailable_response(e)
+    except Exception as e:
+        app.logger.exception("Erro fatal na re-otimização: %s", e)
+        return _corsify_actual_response(jsonify({
+            "status": "erro",
+            "mensagem": f"Erro interno no servidor: {str(e)}"
+        }), 500)
+
+@app.route('/price_curve', methods=['POST', 'OPTIONS'])
+def price_curve():
+    """
+    Custo ótimo e mistura de packs para todo um retângulo de quantidades,
+    de uma só vez: {"cliente": "", "peca_variada": [0, 60], "camisa": [0, 20]}
+    (um número fixa o eixo). Devolve matrizes [peças][camisas] de custos e de
+    contagens de cada pack, e os ``pontos_de_quebra`` em que a escolha de
+    packs muda. Usa o catálogo do cliente, como /optimize.
+    """
+    if request.method == 'OPTIONS':
+        return _build_cors_preflight_response()
+
+    try:
+        with span("price_curve.validacao"):
+            data = request.get_json(silent=True) or {}
+            pecas, camisas, cliente_nome = _validate_curve(data)
+            _, motor = registo_catalogos.selecionar(cliente_nome)
+    except Exception as e:
+        app.logger.info("Erro na validação: %s", e)
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+
+    try:
+        with span("price_curve.solver"):
+            response = solver_executor.submit(
+                partial(gpt_price_curve_handler, motor=motor), pecas, camisas
+            )
+        if response["status"] != "sucesso":
+            return _corsify_actual_response(jsonify(response), 400)
+        return _corsify_actual_response(jsonify(response))
+
+    except (SolverOcupado, SolverTempoEsgotado) as e:
+        return _solver_unavailable_response(e)
+    except Exception as e:
+        app.logger.exception("Erro fatal na curva de preços: %s", e)
+        return _corsify_actual_response(jsonify({
+            "status": "erro",
+            "mensagem": f"Erro interno no servidor: {str(e)}"
+        }), 500)
+
+@app.route('/quote', methods=['GET'])
+def quote():
+    """
+    Orçamento idempotente e cacheável (GET): o pedido vai na query string,
+    ex.: /quote?peca_variada=10&camisa=3&cliente=Hotel%20Avenida. Não cria
+    recibo nem pdf_url; para isso, POST /optimize.
+
+    O ETag (forte) depende só da versão do catálogo e da forma canónica do
+    pedido (Content-Location): um If-None-Match coincidente responde 304 sem
+    otimizar nada. Com ``catalogo=<versão>`` no URL (o da forma canónica) a
+    resposta é imutável; sem ele, cacheável por QUOTE_MAX_AGE segundos.
+    """
+    try:
+        with span("quote.validacao"):
+            items, versao, cliente_nome = _validate_quote(request.args)
+            motor = _motor_get(versao, cliente_nome)
+            if motor is None:
+                return _catalogo_desconhecido(versao)
+            _validar_itens(items, motor)
+    except ValueError as e:
+        app.logger.info("Erro na validação: %s", e)
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+
+    canonico = urlencode(
+        [(k, items[k]) for k in motor.itens if items.get(k)] + [("catalogo", motor.versao)]
+    )
+    etag = f"{motor.versao}-{hashlib.sha256(canonico.encode()).hexdigest()[:16]}"
+
+    def gerar_corpo():
+        with span("quote.memo"):
+            response = memo_respostas.obter(items, None, motor) if MEMO_ATIVO else None
+        if response is None:
+            # Sem prazo: a resposta tem de ser sempre a mesma (o ótimo exato)
+            with span("quote.solver"):
+                response = solver_executor.submit(
+                    partial(gpt_optimize_handler, motor=motor), items
+                )
+            if MEMO_ATIVO:
+                with span("quote.memo"):
+                    memo_respostas.guardar(items, None, response, motor)
+        if response["status"] != "sucesso":
+            return jsonify(response), 400
+        return _json_canonico(dict(response, catalogo=motor.versao))
+
+    try:
+        return _resposta_cacheavel(
+            etag, f"/quote?{canonico}",
+            imutavel=versao is not None, max_age=QUOTE_MAX_AGE, gerar_corpo=gerar_corpo
+        )
+    except (SolverOcupado, SolverTempoEsgotado) as e:
+        return _solver_unavailable_response(e)
+    except Exception as e:
+        app.logger.exception("Erro fatal no orçamento: %s", e)
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Erro interno no servidor: {str(e)}"
+        }), 500
+
+@app.route('/pricing_table', methods=['GET'])
+def pricing_table():
+    """
+    Tabela de preços pré-calculada para o front end orçamentar sem servidor
+    (ver TabelaCustos.exportar): para cada par (peca_variada, camisa) até
+    LAUNDRY_TABELA_PECAS x LAUNDRY_TABELA_CAMISAS, a mistura ótima de packs,
+    mais os preços avulsos. Parâmetros: ``cliente`` (catálogo do cliente,
+    como em /optimize) ou ``catalogo=<versão>`` (resposta imutável).
+
+    Recibos e pedidos fora da tabela continuam a ser calculados no servidor.
+    """
+    versao = request.args.get('catalogo') or None
+    motor = _motor_get(versao, (request.args.get('cliente') or '').strip())
+    if motor is None:
+        return _catalogo_desconhecido(versao)
+
+    etag = f"{motor.versao}-{TABELA_PECAS}x{TABELA_CAMISAS}-f{FORMATO_TABELA_PRECOS}"
+
+    def gerar_corpo():
+        with span("pricing_table.exportar"):
+            return _json_canonico(motor.tabela_precos(TABELA_PECAS, TABELA_CAMISAS))
+
+    return _resposta_cacheavel(
+        etag, f"/pricing_table?{urlencode({'catalogo': motor.versao})}",
+        imutavel=versao is not None, max_age=PRICING_TABLE_MAX_AGE,
+        gerar_corpo=gerar_corpo, cache=tabelas_cache
+    )
+
 @app.route('/download_pdf/<receipt_id>', methods=['GET'])
 def download_pdf(receipt_id):
     """Endpoint GET para download direto do PDF"""
     try:
-        # Recuperar resultado do cache
-        with cache_lock:
-            if receipt_id not in result_cache:
-                return jsonify({
-                    "status": "erro",
-                    "mensagem": "Recibo expirado ou inválido"
-                }), 404
-                
-            resultado = result_cache[receipt_id]["result"]
-            cliente_nome = result_cache[receipt_id]["cliente"]
-        
-        # Gerar PDF com nome do cliente
-        filename = generate_receipt_pdf(resultado, cliente_nome)
+        # Recuperar resultado do store (qualquer worker o pode servir)
+        with span("download_pdf.result_store"):
+            entrada = result_store.get(receipt_id)
+        if entrada is None:
+            return jsonify({
+                "status": "erro",
+                "mensagem": "Recibo expirado ou inválido"
+            }), 404
+            
+        resultado = entrada["result"]
+        cliente_nome = entrada["cliente"]
         
-        return send_file(
-            filename,
+        # PDF já renderizado? Senão gerar com nome do cliente e guardar
+        chave = _chave_pdf(receipt_id, entrada)
+        cached = pdf_cache.get(chave)
+        if cached is None:
+            with span("download_pdf.render"):
+                from receipt_pdf import render_receipt_pdf
+                pdf_bytes = render_receipt_pdf(
+                    resultado, cliente_nome,
+                    catalogo=entrada.get("catalogo"), precos=entrada.get("precos")
+                )
+            cached = (pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest()[:32])
+            pdf_cache.put(chave, cached, len(pdf_bytes))
+        pdf_bytes, etag = cached
+
+        response = send_file(
+            io.BytesIO(pdf_bytes),
             as_attachment=True,
             download_name=f"recibo_engomadoria_teresa_{receipt_id[:8]}.pdf",
-            mimetype='application/pdf'
+            mimetype='application/pdf',
+            etag=etag,
+            max_age=RESULT_TTL,
+            conditional=True
         )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        # Responde 304 se o If-None-Match coincidir com o ETag
+        return response.make_conditional(request)
             
     except Exception as e:
         return jsonify({"status": "erro", "mensagem": str(e)}), 500
 
+@app.route('/export_pdf', methods=['POST'])
+def export_pdf():
+    """
+    Exporta vários recibos do cache de uma vez.
+
+    Corpo: {"receipt_ids": [...], "formato": "pdf" | "zip", "cliente": ""}.
+    "pdf" devolve um único extrato multi-página; "zip" devolve um PDF por
+    recibo, renderizados num pool de processos e enviados em streaming.
+    """
+    data = request.get_json(silent=True) or {}
+    receipt_ids = data.get('receipt_ids') if isinstance(data, dict) else None
+    formato = data.get('formato', 'pdf') if isinstance(data, dict) else None
+    if not isinstance(receipt_ids, list) or not receipt_ids or formato not in ('pdf', 'zip'):
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Formato inválido: esperado {'receipt_ids': [...], 'formato': 'pdf' | 'zip'}"
+        }), 400
+    if len(receipt_ids) > MAX_EXPORT_SIZE:
+        return jsonify({
+            "status": "erro",
+            "mensagem": f"Demasiados recibos ({len(receipt_ids)}). Máximo: {MAX_EXPORT_SIZE}"
+        }), 400
+
+    entradas = [result_store.get(receipt_id) for receipt_id in receipt_ids]
+    em_falta = [r for r, e in zip(receipt_ids, entradas) if e is None]
+    if em_falta:
+        return jsonify({
+            "status": "erro",
+            "mensagem": "Recibo expirado ou inválido",
+            "receipt_ids": em_falta
+        }), 404
+
+    try:
+        data_hoje = time.strftime('%Y%m%d')
+        if formato == 'zip':
+            from receipt_pdf import iter_zip
+            documentos = []
+            for receipt_id, entrada in zip(receipt_ids, entradas):
+                cached = pdf_cache.get(_chave_pdf(receipt_id, entrada))
+                conteudo = cached[0] if cached else ([entrada], entrada["cliente"])
+                documentos.append((f"recibo_engomadoria_teresa_{receipt_id[:8]}.pdf", conteudo))
+            return Response(
+                stream_with_context(iter_zip(documentos)),
+                mimetype='application/zip',
+                headers={
+                    "Content-Disposition":
+                        f"attachment; filename=recibos_engomadoria_teresa_{data_hoje}.zip"
+                }
+            )
+
+        cliente_nome = str(data.get('cliente') or '').strip()
+        if not cliente_nome:
+            clientes = {e["cliente"] for e in entradas}
+            cliente_nome = clientes.pop() if len(clientes) == 1 else ""
+        from receipt_pdf import render_statement_pdf
+        pdf_bytes = render_statement_pdf(entradas, cliente_nome)
+        return send_file(
+            io.BytesIO(pdf_bytes),
+            as_attachment=True,
+            download_name=f"extrato_engomadoria_teresa_{data_hoje}.pdf",
+            mimetype='application/pdf'
+        )
+
+    except Exception as e:
+        app.logger.exception("Erro na exportação de PDFs: %s", e)
+        return jsonify({"status": "erro", "mensagem": str(e)}), 500
+
+# Pedidos HTTP a decorrer neste processo (para /metrics)
+_em_curso = 0
+_em_curso_lock = threading.Lock()
+
+if METRICAS_ATIVAS:
+    @app.before_request
+    def _inicio_pedido():
+        global _em_curso
+        with _em_curso_lock:
+            _em_curso += 1
+
+    @app.teardown_request
+    def _fim_pedido(exc=None):
+        global _em_curso
+        with _em_curso_lock:
+            _em_curso -= 1
+
+@app.route('/relatorios/<tipo>', methods=['GET'])
+def relatorio(tipo):
+    """
+    Relatórios do livro de pedidos (GET, parâmetros de query):
+
+        /relatorios/receita?de=2025-01&ate=2025-12[&cliente=...]
+        /relatorios/itens?de=...&ate=...[&cliente=...][&limite=10]
+        /relatorios/packs?de=...&ate=...[&cliente=...]
+        /relatorios/historico?cliente=...[&limite=50][&antes=<ts>]
+    """
+    if not livro_pedidos.stats()["ativo"]:
+        return jsonify({"status": "erro", "mensagem": "Livro de pedidos desligado"}), 404
+    try:
+        de, ate = mes_de(request.args.get('de')), mes_de(request.args.get('ate'))
+        cliente = request.args.get('cliente')
+        limite = request.args.get('limite', type=int)
+        if limite is not None and not 1 <= limite <= 1000:
+            raise ValueError("Parâmetro 'limite' deve estar entre 1 e 1000")
+
+        with span("relatorio.consulta"):
+            if tipo == 'receita':
+                dados = livro_pedidos.receita(de, ate, cliente)
+            elif tipo == 'itens':
+                dados = livro_pedidos.uso("item", de, ate, cliente, limite or 10)
+            elif tipo == 'packs':
+                dados = {
+                    categoria: livro_pedidos.uso(categoria, de, ate, cliente)
+                    for categoria in CATEGORIAS if categoria != "item"
+                }
+            elif tipo == 'historico':
+                if not cliente:
+                    raise ValueError("Parâmetro 'cliente' em falta")
+                dados = livro_pedidos.historico(
+                    cliente, limite or 50, request.args.get('antes', type=float)
+                )
+            else:
+                return jsonify({"status": "erro", "mensagem": "Relatório desconhecido"}), 404
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+
+    return _corsify_actual_response(jsonify({"status": "sucesso", "relatorio": tipo, "dados": dados}))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas em formato de texto Prometheus (desligado com METRICS_ENABLED=0)."""
+    if not METRICAS_ATIVAS:
+        return jsonify({"status": "erro", "mensagem": "Métricas desativadas"}), 404
+
+    memo = memo_respostas.stats()
+    pdfs = pdf_cache.stats()
+    store = result_store.stats()
+    solver = solver_executor.metrics()
+    pdf_total = pdfs["hits"] + pdfs["misses"]
+    texto = exportar_metricas({
+        "engomadoria_pedidos_em_curso": (
+            "gauge", "Pedidos HTTP em curso neste processo", {"": _em_curso}, None),
+        "engomadoria_cache_hits_total": (
+            "counter", "Acertos por cache",
+            {"memo": memo["hits"], "pdf": pdfs["hits"]}, "cache"),
+        "engomadoria_cache_misses_total": (
+            "counter", "Falhas por cache",
+            {"memo": memo["misses"], "pdf": pdfs["misses"]}, "cache"),
+        "engomadoria_cache_taxa_acerto": (
+            "gauge", "Taxa de acerto por cache", {
+                "memo": memo["taxa_acerto"],
+                "pdf": round(pdfs["hits"] / pdf_total, 4) if pdf_total else 0.0,
+            }, "cache"),
+        "engomadoria_cache_entradas": (
+            "gauge", "Entradas por cache",
+            {"memo": memo["entradas"], "pdf": pdfs["entradas"],
+             "result_store": store["entradas"]}, "cache"),
+        "engomadoria_cache_bytes": (
+            "gauge", "Bytes ocupados por cache",
+            {"pdf": pdfs["bytes"], "result_store": store["bytes"]}, "cache"),
+        "engomadoria_solver_fila": (
+            "gauge", "Solves pendentes no pool", {"": solver["fila"]}, None),
+        "engomadoria_solver_total": (
+            "counter", "Solves por resultado", {
+                "concluidos": solver["concluidos"],
+                "rejeitados": solver["rejeitados"],
+                "tempos_esgotados": solver["tempos_esgotados"],
+                "atrasados": solver["atrasados"],
+                "erros": solver["erros"],
+            }, "resultado"),
+    })
+    return Response(texto, mimetype="text/plain; version=0.0.4")
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint para verificação de saúde da API"""
-    return jsonify({
+    return jsonify(estado_servico())
+
+def estado_servico():
+    """Conteúdo de /health (partilhado com o modo ASGI)."""
+    return {
         "status": "online",
         "versao": "2.0.1",
-        "mensagem": "API com PDF dinâmico A4 e suporte a cliente"
-    })
+        "mensagem": "API com PDF dinâmico A4 e suporte a cliente",
+        "solver": solver_executor.metrics(),
+        "memo": memo_respostas.stats(),
+        "catalogos": registo_catalogos.stats(),
+        "result_store": result_store.stats(),
+        "pdf_cache": pdf_cache.stats(),
+        "livro_pedidos": livro_pedidos.stats()
+    }
+
+# ========================================================================== #
+#  VALIDAÇÃO E RECIBOS
+# ========================================================================== #
+def _validate_order(data):
+    """
+    Valida um pedido e devolve (itens limpos, nome do cliente, motor de
+    preços). O motor é o do catálogo do cliente (ver catalogos.py), e os
+    itens válidos são os desse catálogo.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Formato inválido: esperado objeto com itens")
+
+    # Aceitar tanto o formato direto (novo) quanto o formato com "items" (antigo)
+    if 'items' in data:
+        items = data['items']
+    else:
+        items = data
+
+    # Validação básica
+    if not items or not isinstance(items, dict):
+        raise ValueError("Formato inválido: esperado objeto com itens")
+        
+    # Capturar nome do cliente se fornecido
+    cliente_nome = data.get('cliente', '').strip()
+    _, motor = registo_catalogos.selecionar(cliente_nome)
+    _validar_itens(items, motor)
+        
+    # Converter valores para inteiros e validar
+    clean_items = {}
+    for item, qty in items.items():
+        try:
+            clean_qty = int(qty)
+            if clean_qty < 0:
+                raise ValueError(f"Quantidade negativa para '{item}': {qty}")
+            clean_items[item] = clean_qty
+        except (TypeError, ValueError):
+            raise ValueError(f"Quantidade inválida para '{item}': {qty} - deve ser número inteiro")
+
+    return clean_items, cliente_nome, motor
+
+def _validate_prazo(data):
+    """
+    Prazo do solve em segundos: campo "prazo_ms" (formato com "items") ou
+    SOLVER_PRAZO_MS; None se não houver prazo além do tempo limite.
+    """
+    prazo_ms = data.get('prazo_ms', SOLVER_PRAZO_MS) if 'items' in data else SOLVER_PRAZO_MS
+    if isinstance(prazo_ms, bool) or not isinstance(prazo_ms, (int, float)) or prazo_ms < 0:
+        raise ValueError(f"Prazo inválido: {prazo_ms} - deve ser um número de ms >= 0")
+    return prazo_ms / 1000 if prazo_ms else None
+
+def _validar_itens(items, motor):
+    """Levanta ValueError se algum item não existir no catálogo do motor."""
+    for item in items:
+        if item not in motor.precos:
+            raise ValueError(f"Item desconhecido: '{item}'. Itens válidos: {', '.join(motor.itens)}")
+
+def _validate_delta(data):
+    """Valida um pedido de /optimize/delta e devolve (receipt_id, delta)."""
+    if not isinstance(data, dict):
+        raise ValueError("Formato inválido: esperado objeto com 'receipt_id' e 'delta'")
+    receipt_id = data.get('receipt_id')
+    delta = data.get('delta')
+    if not isinstance(receipt_id, str) or not receipt_id:
+        raise ValueError("Campo 'receipt_id' em falta")
+    if not delta or not isinstance(delta, dict):
+        raise ValueError("Formato inválido: 'delta' deve ser um objeto com itens")
+
+    clean_delta = {}
+    for item, qty in delta.items():
+        if isinstance(qty, bool) or not isinstance(qty, int):
+            raise ValueError(f"Variação inválida para '{item}': {qty} - deve ser número inteiro")
+        clean_delta[item] = qty
+    return receipt_id, clean_delta
+
+def _validate_curve(data):
+    """Valida um pedido de /price_curve e devolve (peças, camisas, nome do cliente)."""
+    if not isinstance(data, dict):
+        raise ValueError("Formato inválido: esperado objeto com 'peca_variada' e 'camisa'")
+
+    intervalos = []
+    for eixo in ("peca_variada", "camisa"):
+        valor = data.get(eixo, 0)
+        limites = valor if isinstance(valor, list) else [valor, valor]
+        if (
+            len(limites) != 2
+            or any(isinstance(v, bool) or not isinstance(v, int) or v < 0 for v in limites)
+            or limites[0] > limites[1]
+        ):
+            raise ValueError(
+                f"Intervalo inválido para '{eixo}': {valor} - esperado [mínimo, máximo] inteiros"
+            )
+        intervalos.append(tuple(limites))
+
+    cliente_nome = str(data.get('cliente') or '').strip()
+    return intervalos[0], intervalos[1], cliente_nome
+
+def _validate_quote(args):
+    """
+    Valida a query string de /quote e devolve (itens, versão do catálogo ou
+    None, nome do cliente). Os itens são os restantes parâmetros, com
+    quantidades inteiras >= 0 escritas só com dígitos.
+    """
+    items = {}
+    for item, valores in args.lists():
+        if len(valores) != 1:
+            raise ValueError(f"Parâmetro repetido: '{item}'")
+        if item in ('cliente', 'catalogo'):
+            continue
+        if not (valores[0].isascii() and valores[0].isdigit()):
+            raise ValueError(
+                f"Quantidade inválida para '{item}': {valores[0]} - deve ser número inteiro"
+            )
+        items[item] = int(valores[0])
+    if not any(items.values()):
+        raise ValueError("Pedido vazio: indique as quantidades na query string")
+
+    versao = args.get('catalogo') or None
+    cliente_nome = (args.get('cliente') or '').strip()
+    return items, versao, cliente_nome
+
+def _store_receipt(response, cliente_nome, receipt_id=None, items=None, motor=None,
+                   substitui=None):
+    """
+    Guarda o resultado no cache e no livro de pedidos e devolve o URL de
+    download do PDF. ``substitui`` é o recibo que este re-otimiza (delta).
+    """
+    # Gerar ID único para o resultado (em /optimize vem o ID do pedido)
+    receipt_id = receipt_id or str(uuid.uuid4())
+    
+    # Armazenar resultado no store
+    entrada = {
+        "result": response,
+        "cliente": cliente_nome,  # Armazenar nome do cliente
+        "timestamp": time.time()
+    }
+    if motor is not None:
+        # Versão do catálogo (re-otimização) e preços cobrados (PDF), que
+        # não dependem de o catálogo continuar registado
+        entrada["catalogo"] = motor.versao
+        if response.get("status") == "sucesso":
+            entrada["precos"] = motor.precos_recibo(response.get("detalhes") or {})
+    if items is not None:
+        # Pedido original: permite re-otimizar (/optimize/delta)
+        entrada["items"] = items
+    result_store.put(receipt_id, entrada)
+    livro_pedidos.registar(
+        receipt_id, cliente_nome, response, items, entrada.get("catalogo"), substitui
+    )
+
+    base_url = "https://lavanderia-teresa.onrender.com"
+    return f"{base_url}/download_pdf/{receipt_id}"
+
+def _chave_pdf(receipt_id, entrada):
+    """Chave na cache de PDFs: muda quando o recibo é revisto (ver _refinar_recibo)."""
+    revisao = entrada.get("revisao")
+    return f"{receipt_id}#{revisao}" if revisao else receipt_id
+
+def _refinar_recibo(receipt_id, items, motor, response):
+    """
+    Chamado quando o solve exato que passou o prazo termina: substitui no
+    recibo a resposta heurística pelo ótimo, para o PDF o mostrar.
+    """
+    if response.get("status") != "sucesso":
+        return
+    if MEMO_ATIVO:
+        memo_respostas.guardar(items, None, response, motor)
+    entrada = result_store.get(receipt_id)
+    if entrada is None:
+        return  # recibo já expirado
+    anterior = entrada["result"]
+    entrada["result"] = dict(response, pdf_url=anterior.get("pdf_url"))
+    entrada["precos"] = motor.precos_recibo(response.get("detalhes") or {})
+    entrada["revisao"] = entrada.get("revisao", 0) + 1
+    result_store.put(receipt_id, entrada)
+    pdf_cache.discard(receipt_id)
+    livro_pedidos.registar(
+        receipt_id, entrada["cliente"], response, items, motor.versao, substitui=receipt_id
+    )
+    app.logger.info(
+        "Recibo %s revisto: %.2f (heurística) -> %.2f (ótimo)",
+        receipt_id, anterior.get("custo_total", 0.0), response["custo_total"]
+    )
+
+def _solver_unavailable_response(e):
+    """503 + Retry-After quando a fila está cheia; 504 se o solve expirou."""
+    app.logger.warning("Solver indisponível: %s", e)
+    response = jsonify({"status": "erro", "mensagem": str(e)})
+    if isinstance(e, SolverOcupado):
+        response.headers["Retry-After"] = str(e.retry_after)
+        return _corsify_actual_response(response, 503)
+    return _corsify_actual_response(response, 504)
 
 # ========================================================================== #
 #  CORS HELPER FUNCTIONS
@@ -431,20 +1098,34 @@ if __name__ == '__main__':
                 def load(self):
                     return self.application
             
+            def post_fork(server, worker):
+                # Sem preload, cada worker aquece-se a si próprio
+                if not PRELOAD_APP:
+                    aquecer_servico()
+                # Cada worker arranca o seu pool de solvers já aquecido
+                solver_executor.aquecer()
+
             options = {
                 'bind': f'0.0.0.0:{port}',
                 'workers': 4,
-                'timeout': 120
+                'timeout': 120,
+                'preload_app': PRELOAD_APP,
+                'post_fork': post_fork
             }
+            if PRELOAD_APP:
+                # Tabela e template ficam em memória partilhada (copy-on-write)
+                aquecer_servico()
             app.logger.info(f"Iniciando servidor Gunicorn na porta {port}")
             FlaskApplication(app, options).run()
             
         except ImportError:
             # Fallback para Waitress se Gunicorn não estiver disponível
             from waitress import serve
+            aquecer_servico()
             app.logger.info(f"Iniciando servidor Waitress na porta {port}")
             serve(app, host='0.0.0.0', port=port)
     else:
         # Modo de desenvolvimento
         app.logger.info(f"Iniciando servidor de desenvolvimento na porta {port}")
+        aquecer_servico()
         app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,327 @@
+"""
+asgi.py
+=======
+Ponto de entrada ASGI da API, alternativo ao Flask/WSGI de ``app.py``.
+
+Mesmo contrato para ``/optimize`` (POST, OPTIONS), ``/download_pdf/<id>``
+(GET, com ETag/304) e ``/health``, partilhando a validação, o result store,
+a memoização e as caches de ``app.py``. A diferença está na concorrência:
+
+    - os solves esperam no event loop (``SolverExecutor.submit_async``) em
+      vez de ocuparem um worker inteiro
+    - a renderização dos PDFs corre num executor à parte: threads por
+      omissão (mesma memória que o modo WSGI) ou, com ``ASGI_PDF_WORKERS`` > 0,
+      processos próprios, que não disputam o GIL com o event loop
+    - o corpo dos pedidos é lido e os PDFs enviados aos blocos, pelo que
+      clientes lentos não bloqueiam os restantes
+
+Execução (requer ``uvicorn``):
+
+    uvicorn asgi:app --port 10000 [--workers N]
+    python asgi.py
+"""
+
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from app import (
+    MEMO_ATIVO, RESULT_TTL, SOLVER_HEURISTICO, _chave_pdf, _refinar_recibo,
+    _store_receipt, _validate_order, _validate_prazo, aquecer_servico,
+    estado_servico, gpt_optimize_handler, memo_respostas, pdf_cache,
+    result_store, solver_executor,
+)
+from metricas import span
+from request_log import novo_request_id, registar_pedido
+from solver_pool import SolverAtrasado, SolverOcupado, SolverTempoEsgotado
+
+log = logging.getLogger(__name__)
+
+ORIGEM_CORS = "https://jcristovao99.github.io"
+
+# Processos para renderizar PDFs (0 = threads do próprio worker)
+ASGI_PDF_WORKERS = int(os.environ.get("ASGI_PDF_WORKERS", 0))
+
+# Tamanho máximo do corpo de um pedido e dos blocos enviados
+MAX_CORPO = 1024 * 1024
+BLOCO_PDF = 64 * 1024
+
+_Cabecalhos = List[Tuple[bytes, bytes]]
+
+_pdf_executor: Executor | None = None
+
+
+def _aquecer_renderizador() -> None:
+    from receipt_pdf import obter_template
+    obter_template()
+
+
+def _render_pdf(resultado: Dict[str, Any], cliente_nome: str, catalogo: str | None,
+                precos: Dict[str, Any] | None) -> bytes:
+    from receipt_pdf import render_receipt_pdf
+    return render_receipt_pdf(resultado, cliente_nome, catalogo=catalogo, precos=precos)
+
+
+def _obter_pdf_executor() -> Executor:
+    global _pdf_executor
+    if _pdf_executor is None:
+        if ASGI_PDF_WORKERS > 0:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=ASGI_PDF_WORKERS, initializer=_aquecer_renderizador
+            )
+        else:
+            # A renderização disputa o GIL: mais threads só gastariam memória
+            _pdf_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf")
+    return _pdf_executor
+
+
+# --------------------------------------------------------------------------- #
+#  RESPOSTAS
+# --------------------------------------------------------------------------- #
+async def _enviar(send, estado: int, corpo: bytes, cabecalhos: _Cabecalhos) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": estado,
+        "headers": [(b"content-length", str(len(corpo)).encode()), *cabecalhos],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _enviar_json(send, estado: int, dados: Any, cabecalhos: _Cabecalhos = ()) -> None:
+    corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+    await _enviar(send, estado, corpo, [(b"content-type", b"application/json"), *cabecalhos])
+
+
+async def _enviar_pdf(send, pdf_bytes: bytes, cabecalhos: _Cabecalhos) -> None:
+    """Envia o PDF aos blocos, cedendo o event loop entre eles."""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-length", str(len(pdf_bytes)).encode()), *cabecalhos],
+    })
+    vista = memoryview(pdf_bytes)
+    for inicio in range(0, len(pdf_bytes), BLOCO_PDF):
+        fim = inicio + BLOCO_PDF
+        await send({
+            "type": "http.response.body",
+            "body": bytes(vista[inicio:fim]),
+            "more_body": fim < len(pdf_bytes),
+        })
+
+
+async def _ler_corpo(receive) -> bytes | None:
+    """Lê o corpo completo; None se exceder ``MAX_CORPO``."""
+    partes = []
+    tamanho = 0
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "http.disconnect":
+            return None
+        partes.append(mensagem.get("body", b""))
+        tamanho += len(partes[-1])
+        if tamanho > MAX_CORPO:
+            return None
+        if not mensagem.get("more_body"):
+            return b"".join(partes)
+
+
+# --------------------------------------------------------------------------- #
+#  ENDPOINTS
+# --------------------------------------------------------------------------- #
+async def optimize(receive, send, request_id: str) -> int:
+    corpo = await _ler_corpo(receive)
+    if corpo is None:
+        await _enviar_json(send, 413, {"status": "erro", "mensagem": "Pedido demasiado grande"})
+        return 413
+
+    try:
+        with span("optimize.validacao"):
+            data = json.loads(corpo or b"{}")
+            clean_items, cliente_nome, motor = _validate_order(data or {})
+            prazo = _validate_prazo(data or {})
+    except Exception as e:
+        log.info("Erro na validação: %s", e)
+        await _enviar_json(send, 400, {"status": "erro", "mensagem": str(e)})
+        return 400
+
+    cors = [(b"access-control-allow-origin", ORIGEM_CORS.encode())]
+    loop = asyncio.get_running_loop()
+    try:
+        with span("optimize.memo"):
+            response = memo_respostas.obter(clean_items, None, motor) if MEMO_ATIVO else None
+        pendente = None
+        if response is None:
+            try:
+                with span("optimize.solver"):
+                    response = await solver_executor.submit_async(
+                        partial(gpt_optimize_handler, motor=motor), clean_items, prazo=prazo
+                    )
+            except SolverAtrasado as e:
+                log.warning("%s: resposta heurística", e)
+                pendente = e.pendente
+                # A heurística e o result store (SQLite, livro de pedidos)
+                # bloqueiam: fora do event loop
+                with span("optimize.heuristico"):
+                    response = await loop.run_in_executor(None, partial(
+                        gpt_optimize_handler, clean_items, SOLVER_HEURISTICO, False, motor
+                    ))
+            if MEMO_ATIVO:
+                with span("optimize.memo"):
+                    memo_respostas.guardar(clean_items, None, response, motor)
+
+        with span("optimize.result_store"):
+            response["pdf_url"] = await loop.run_in_executor(None, partial(
+                _store_receipt, response, cliente_nome, request_id, clean_items, motor
+            ))
+        if pendente is not None:
+            # Corre na thread do executor que espera pelo solve exato
+            pendente.quando_concluir(partial(_refinar_recibo, request_id, clean_items, motor))
+        await _enviar_json(send, 200, response, cors)
+        return 200
+
+    except SolverOcupado as e:
+        log.warning("Solver indisponível: %s", e)
+        await _enviar_json(send, 503, {"status": "erro", "mensagem": str(e)},
+                           [(b"retry-after", str(e.retry_after).encode()), *cors])
+        return 503
+    except SolverTempoEsgotado as e:
+        log.warning("Solver indisponível: %s", e)
+        await _enviar_json(send, 504, {"status": "erro", "mensagem": str(e)}, cors)
+        return 504
+    except Exception as e:
+        log.exception("Erro fatal na otimização: %s", e)
+        await _enviar_json(send, 500, {
+            "status": "erro",
+            "mensagem": f"Erro interno no servidor: {str(e)}"
+        }, cors)
+        return 500
+
+
+async def download_pdf(send, receipt_id: str, cabecalhos: Dict[bytes, bytes]) -> int:
+    with span("download_pdf.result_store"):
+        entrada = result_store.get(receipt_id)
+    if entrada is None:
+        await _enviar_json(send, 404, {"status": "erro", "mensagem": "Recibo expirado ou inválido"})
+        return 404
+
+    try:
+        chave = _chave_pdf(receipt_id, entrada)
+        cached = pdf_cache.get(chave)
+        if cached is None:
+            with span("download_pdf.render"):
+                pdf_bytes = await asyncio.get_running_loop().run_in_executor(
+                    _obter_pdf_executor(), _render_pdf,
+                    entrada["result"], entrada["cliente"], entrada.get("catalogo"),
+                    entrada.get("precos")
+                )
+            cached = (pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest()[:32])
+            pdf_cache.put(chave, cached, len(pdf_bytes))
+        pdf_bytes, etag = cached
+    except Exception as e:
+        log.exception("Erro ao gerar PDF: %s", e)
+        await _enviar_json(send, 500, {"status": "erro", "mensagem": str(e)})
+        return 500
+
+    comuns = [
+        (b"etag", f'"{etag}"'.encode()),
+        (b"cache-control", f"private, max-age={RESULT_TTL}".encode()),
+        (b"access-control-allow-origin", ORIGEM_CORS.encode()),
+    ]
+    # Responde 304 se o If-None-Match coincidir com o ETag
+    if_none_match = cabecalhos.get(b"if-none-match", b"").decode("latin-1")
+    if etag in {t.strip().strip('"').removeprefix("W/").strip('"') for t in if_none_match.split(",")}:
+        await _enviar(send, 304, b"", comuns)
+        return 304
+
+    await _enviar_pdf(send, pdf_bytes, [
+        (b"content-type", b"application/pdf"),
+        (b"content-disposition",
+         f"attachment; filename=recibo_engomadoria_teresa_{receipt_id[:8]}.pdf".encode()),
+        *comuns,
+    ])
+    return 200
+
+
+async def _preflight(send) -> int:
+    await _enviar_json(send, 200, {"status": "preflight"}, [
+        (b"access-control-allow-origin", ORIGEM_CORS.encode()),
+        (b"access-control-allow-headers", b"Content-Type"),
+        (b"access-control-allow-methods", b"POST, OPTIONS"),
+    ])
+    return 200
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, aquecer_servico)
+            solver_executor.aquecer()
+            if ASGI_PDF_WORKERS > 0:
+                _obter_pdf_executor().submit(_aquecer_renderizador)
+            await send({"type": "lifespan.startup.complete"})
+        elif mensagem["type"] == "lifespan.shutdown":
+            solver_executor.shutdown()
+            if _pdf_executor is not None:
+                _pdf_executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send_original) -> None:
+    """Aplicação ASGI 3."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send_original)
+        return
+    if scope["type"] != "http":
+        return
+
+    inicio = time.perf_counter()
+    metodo = scope["method"]
+    rota = scope["path"]
+    # /download_pdf/<id>: o ID de correlação é o próprio receipt_id
+    if rota.startswith("/download_pdf/"):
+        request_id = rota.removeprefix("/download_pdf/")
+    else:
+        request_id = novo_request_id()
+
+    async def send(mensagem):
+        # Todas as respostas levam o X-Request-ID
+        if mensagem["type"] == "http.response.start":
+            mensagem["headers"].append((b"x-request-id", request_id.encode()))
+        await send_original(mensagem)
+
+    if rota == "/optimize" and metodo == "POST":
+        estado = await optimize(receive, send, request_id)
+    elif rota == "/optimize" and metodo == "OPTIONS":
+        estado = await _preflight(send)
+    elif rota.startswith("/download_pdf/") and metodo == "GET":
+        estado = await download_pdf(send, request_id, dict(scope["headers"]))
+    elif rota == "/health" and metodo == "GET":
+        estado = 200
+        await _enviar_json(send, 200, estado_servico(), [(b"access-control-allow-origin", b"*")])
+    else:
+        estado = 404
+        await _enviar_json(send, 404, {"status": "erro", "mensagem": "Endpoint não encontrado"})
+
+    registar_pedido(metodo, rota, estado, inicio, request_id)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "asgi:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", 10000)),
+        workers=int(os.environ.get("ASGI_WORKERS", 1)),
+        log_level="warning",
+    )
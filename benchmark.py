@@ -0,0 +1,615 @@
+"""
+benchmark.py
+============
+Benchmarks do serviço, executáveis offline (sem rede nem gunicorn).
+
+    python benchmark.py pdf [-n 50]
+    python benchmark.py suite [-n 200] [--seed 0] [--solvers tabela,nativo,pulp]
+                              [--saida resultados.json]
+    python benchmark.py diff antes.json depois.json
+    python benchmark.py arranque [-n 3] [--orcamento-import-ms 400]
+    python benchmark.py carga [--servidores wsgi,asgi] [--clientes 16] [--lentos 4]
+                              [--duracao 10]
+
+A suite gera distribuições reprodutíveis de pedidos (pequenos, médios e
+patológicos, acima da tabela) e mede, por etapa, débito e percentis
+p50/p95/p99: ``optimize_order`` por solver e por tamanho de pedido (10^2 a
+10^6 itens), ``gpt_optimize_handler``
+com e sem memoização, renderização do recibo e as rotas ``/optimize`` e
+``/download_pdf`` através do cliente de testes do Flask. O JSON gravado tem
+chaves ordenadas para poder ser comparado entre commits (``diff``).
+
+``arranque`` mede, num interpretador novo, o tempo de importar ``app``, o
+pré-aquecimento opcional (``aquecer_servico``, como no preload do gunicorn)
+e o tempo até à primeira resposta de sucesso de ``/optimize``.
+
+``carga`` é a exceção a "offline": arranca a API em gunicorn (sync, 1 worker,
+``app:app``) e em uvicorn (1 processo, ``asgi:app``) numa porta local e
+compara débito, p50/p99 e RSS sob os mesmos clientes concorrentes, incluindo
+clientes lentos que enviam o corpo aos bocados.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from laundry_optimizer_final import (
+    CATALOG, LaundryOptimizer, gpt_optimize_handler,
+    SOLVER_TABELA, SOLVER_NATIVO, SOLVER_PULP,
+)
+
+# Pedido representativo: packs mistos, camisas e itens especiais
+PEDIDO_EXEMPLO = {
+    "peca_variada": 30,
+    "camisa": 13,
+    "toalha_ou_lencol": 4,
+    "blazer": 2,
+}
+
+DISTRIBUICOES = ["pequenos", "medios", "patologicos"]
+
+# Pedidos por distribuição para o solver ILP (ordens de grandeza mais lento)
+PULP_MAX_PEDIDOS = 20
+
+
+def _cronometrar(fn, n: int) -> float:
+    """Executa ``fn`` n vezes e devolve execuções por segundo."""
+    inicio = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - inicio)
+
+
+# --------------------------------------------------------------------------- #
+#  DISTRIBUIÇÕES DE PEDIDOS
+# --------------------------------------------------------------------------- #
+def capacidade_maxima(catalog: dict = CATALOG) -> int:
+    """
+    Antigo limite de peças + camisas de ``optimize_order`` (10x a capacidade
+    dos packs). Já não existe, mas continua a definir a distribuição
+    ``patologicos`` para os resultados serem comparáveis entre commits.
+    """
+    return 10 * sum(
+        p["capacidade"] for p in catalog["packs_mistos"] + catalog["packs_camisas"]
+    )
+
+
+def gerar_pedidos(distribuicao: str, n: int, seed: int = 0) -> List[Dict[str, int]]:
+    """
+    Pedidos aleatórios mas reprodutíveis (mesma seed, mesmos pedidos):
+
+        - pequenos: até 10 peças/camisas, por vezes um item especial
+        - medios: 10-80 peças, 0-40 camisas e alguns especiais
+        - patologicos: 85-100% do antigo limite de capacidade, fora da tabela
+    """
+    rng = random.Random(f"{distribuicao}:{seed}")
+    especiais = LaundryOptimizer._SPECIALS
+    limite = capacidade_maxima()
+    pedidos = []
+    for _ in range(n):
+        if distribuicao == "pequenos":
+            pedido = {"peca_variada": rng.randint(0, 10), "camisa": rng.randint(0, 10)}
+            if rng.random() < 0.3:
+                pedido[rng.choice(especiais)] = 1
+        elif distribuicao == "medios":
+            pedido = {"peca_variada": rng.randint(10, 80), "camisa": rng.randint(0, 40)}
+            for item in rng.sample(especiais, rng.randint(0, 3)):
+                pedido[item] = rng.randint(1, 4)
+        elif distribuicao == "patologicos":
+            total = rng.randint(int(0.85 * limite), limite)
+            camisas = rng.randint(0, total // 3)
+            pedido = {"peca_variada": total - camisas, "camisa": camisas}
+        else:
+            raise ValueError(f"Distribuição desconhecida: {distribuicao}")
+        if not any(pedido.values()):
+            pedido["camisa"] = 1
+        pedidos.append(pedido)
+    return pedidos
+
+
+# --------------------------------------------------------------------------- #
+#  MEDIÇÃO
+# --------------------------------------------------------------------------- #
+def _percentil(ordenados: List[float], q: float) -> float:
+    # Interpolação linear entre vizinhos, como numpy.percentile
+    pos = (len(ordenados) - 1) * q
+    base = int(pos)
+    topo = min(base + 1, len(ordenados) - 1)
+    return ordenados[base] + (ordenados[topo] - ordenados[base]) * (pos - base)
+
+
+def medir(fn: Callable[[Any], Any], entradas: List[Any], aquecimento: int = 3) -> Dict[str, float]:
+    """Chama ``fn`` uma vez por entrada; devolve débito e percentis em ms."""
+    for entrada in entradas[:aquecimento]:
+        fn(entrada)
+    tempos = []
+    inicio = time.perf_counter()
+    for entrada in entradas:
+        t0 = time.perf_counter()
+        fn(entrada)
+        tempos.append(time.perf_counter() - t0)
+    total = time.perf_counter() - inicio
+    tempos.sort()
+    return {
+        "n": len(tempos),
+        "por_segundo": round(len(tempos) / total, 1),
+        "media_ms": round(1000 * sum(tempos) / len(tempos), 4),
+        "p50_ms": round(1000 * _percentil(tempos, 0.50), 4),
+        "p95_ms": round(1000 * _percentil(tempos, 0.95), 4),
+        "p99_ms": round(1000 * _percentil(tempos, 0.99), 4),
+        "max_ms": round(1000 * tempos[-1], 4),
+    }
+
+
+# --------------------------------------------------------------------------- #
+#  ETAPAS
+# --------------------------------------------------------------------------- #
+def bench_solvers(pedidos: Dict[str, List[dict]], solvers: List[str]) -> Dict[str, Any]:
+    """``optimize_order`` por solver e distribuição."""
+    optimizer = LaundryOptimizer()
+    resultados = {}
+    for solver in solvers:
+        for distribuicao, lista in pedidos.items():
+            if solver == SOLVER_PULP:
+                lista = lista[:PULP_MAX_PEDIDOS]
+            resultados[f"{solver}/{distribuicao}"] = medir(
+                lambda p: optimizer.optimize_order(p, solver), lista
+            )
+    return resultados
+
+
+# Tamanhos de pedido (peças + camisas) e proporção de camisas em ``tamanhos``
+TAMANHOS = [10 ** e for e in range(2, 7)]
+PROPORCOES_CAMISAS = {"camisas_10": 0.1, "camisas_50": 0.5, "camisas_90": 0.9}
+# O solver nativo enumera os packs mistos: só é medido em pedidos pequenos
+NATIVO_MAX_ITENS = 1000
+
+
+def bench_tamanhos(solvers: List[str], n: int) -> Dict[str, Any]:
+    """
+    Tempo de ``optimize_order`` em função do tamanho do pedido (10^2 a 10^6
+    itens). Acima da tabela o solver por omissão reduz o pedido a blocos a
+    granel + resto; o ILP serve de referência.
+    """
+    optimizer = LaundryOptimizer()
+    resultados = {}
+    for solver in solvers:
+        for tamanho in TAMANHOS:
+            if solver == SOLVER_NATIVO and tamanho > NATIVO_MAX_ITENS:
+                continue
+            for nome, proporcao in PROPORCOES_CAMISAS.items():
+                camisas = int(tamanho * proporcao)
+                # Pequenas variações para não medir sempre a mesma célula
+                pedidos = [
+                    {"peca_variada": tamanho - camisas + i % 7, "camisa": camisas + i % 5}
+                    for i in range(n if solver != SOLVER_PULP else min(n, PULP_MAX_PEDIDOS))
+                ]
+                resultados[f"{solver}/{tamanho}/{nome}"] = medir(
+                    lambda p: optimizer.optimize_order(p, solver), pedidos
+                )
+    return resultados
+
+
+def bench_handler(pedidos: Dict[str, List[dict]]) -> Dict[str, Any]:
+    """``gpt_optimize_handler`` sem memoização e com a cache já quente."""
+    resultados = {}
+    for distribuicao, lista in pedidos.items():
+        resultados[f"sem_cache/{distribuicao}"] = medir(
+            lambda p: gpt_optimize_handler(p, usar_cache=False), lista
+        )
+        resultados[f"com_cache/{distribuicao}"] = medir(
+            lambda p: gpt_optimize_handler(p, usar_cache=True), lista, aquecimento=len(lista)
+        )
+    return resultados
+
+
+def bench_pdf(n: int) -> dict:
+    """Recibos/s: template refeito por recibo (logo original) vs partilhado."""
+    from receipt_pdf import ReceiptTemplate, render_receipt_pdf, obter_template
+
+    resultado = gpt_optimize_handler(PEDIDO_EXEMPLO)
+
+    def sem_template():
+        render_receipt_pdf(resultado, "Cliente", ReceiptTemplate(redimensionar=False))
+
+    template = obter_template()
+
+    def com_template():
+        render_receipt_pdf(resultado, "Cliente", template)
+
+    return {
+        "antes_recibos_s": round(_cronometrar(sem_template, n), 1),
+        "depois_recibos_s": round(_cronometrar(com_template, n), 1),
+    }
+
+
+def bench_recibo(pedidos: Dict[str, List[dict]], n: int) -> Dict[str, Any]:
+    """Renderização do recibo (template partilhado) para pedidos médios."""
+    from receipt_pdf import render_receipt_pdf, obter_template
+
+    template = obter_template()
+    respostas = [gpt_optimize_handler(p) for p in pedidos["medios"][:n]]
+    return {
+        "render_receipt_pdf": medir(
+            lambda r: render_receipt_pdf(r, "Cliente", template), respostas
+        )
+    }
+
+
+def bench_http(pedidos: Dict[str, List[dict]], n: int) -> Dict[str, Any]:
+    """Rotas /optimize e /download_pdf através do cliente de testes do Flask."""
+    import app as servico
+
+    servico.app.logger.setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    cliente = servico.app.test_client()
+    resultados = {}
+    try:
+        urls: Dict[str, List[str]] = {}
+        for distribuicao, lista in pedidos.items():
+            servico.memo_respostas.limpar()
+            urls[distribuicao] = []
+
+            def optimize(pedido):
+                r = cliente.post("/optimize", json={"items": pedido, "cliente": "Benchmark"})
+                urls[distribuicao].append(r.get_json()["pdf_url"])
+
+            resultados[f"/optimize/{distribuicao}"] = medir(optimize, lista, aquecimento=0)
+
+        # Recibos acabados de criar: o primeiro download ainda não está em cache
+        urls = urls["medios"][:n]
+        resultados["/download_pdf/frio"] = medir(
+            lambda url: cliente.get(url), urls, aquecimento=0
+        )
+        resultados["/download_pdf/cache"] = medir(lambda url: cliente.get(url), urls)
+        etags = {url: cliente.get(url).headers.get("ETag") for url in urls}
+        resultados["/download_pdf/304"] = medir(
+            lambda url: cliente.get(url, headers={"If-None-Match": etags[url]}), urls
+        )
+    finally:
+        servico.solver_executor.shutdown()
+    return resultados
+
+
+# Corre num processo novo: importa a app e faz o primeiro /optimize
+_SCRIPT_ARRANQUE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+pesados = sorted(m for m in ("numpy", "pulp", "reportlab") if m in sys.modules)
+if {aquecer}:
+    app.aquecer_servico()
+t2 = time.perf_counter()
+r = app.app.test_client().post("/optimize", json={{"items": {pedido}}})
+t3 = time.perf_counter()
+assert r.status_code == 200 and r.get_json()["status"] == "sucesso", r.data
+app.solver_executor.shutdown()
+print(json.dumps({{
+    "import_ms": 1000 * (t1 - t0),
+    "aquecimento_ms": 1000 * (t2 - t1),
+    "primeiro_optimize_ms": 1000 * (t3 - t2),
+    "modulos_pesados_apos_import": pesados,
+}}))
+"""
+
+
+def bench_arranque(n: int) -> Dict[str, Any]:
+    """
+    Tempo até à primeira resposta de /optimize num processo novo, sem e com
+    pré-aquecimento. ``total_ms`` inclui o arranque do interpretador.
+    """
+    ambiente = dict(os.environ, LOG_LEVEL="WARNING")
+    resultados = {}
+    for modo, aquecer in (("frio", False), ("aquecido", True)):
+        medicoes = []
+        for _ in range(n):
+            script = _SCRIPT_ARRANQUE.format(aquecer=aquecer, pedido=repr(PEDIDO_EXEMPLO))
+            inicio = time.perf_counter()
+            saida = subprocess.run(
+                [sys.executable, "-c", script], capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)), env=ambiente, check=True
+            )
+            medicao = json.loads(saida.stdout.strip().splitlines()[-1])
+            medicao["total_ms"] = 1000 * (time.perf_counter() - inicio)
+            medicoes.append(medicao)
+        # Mediana de cada tempo entre as n execuções
+        resultados[modo] = {
+            chave: round(sorted(m[chave] for m in medicoes)[len(medicoes) // 2], 1)
+            for chave in ("import_ms", "aquecimento_ms", "primeiro_optimize_ms", "total_ms")
+        }
+        resultados[modo]["modulos_pesados_apos_import"] = medicoes[0]["modulos_pesados_apos_import"]
+    return resultados
+
+
+# Servidores comparados em ``carga``: um processo web cada (+ pool de solvers)
+SERVIDORES_CARGA = {
+    "wsgi": ["-m", "gunicorn", "-w", "1", "--timeout", "60", "-b", "127.0.0.1:{porta}", "app:app"],
+    "asgi": ["-m", "uvicorn", "--workers", "1", "--log-level", "warning", "--port", "{porta}",
+             "asgi:app"],
+}
+
+
+def _porta_livre() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_arvore_kb(pid: int) -> int | None:
+    """RSS do processo ``pid`` e descendentes (Linux, via /proc)."""
+    if not os.path.isdir("/proc"):
+        return None
+    filhos: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/status") as f:
+                campos = dict(linha.split(":", 1) for linha in f if ":" in linha)
+        except OSError:
+            continue
+        filhos.setdefault(int(campos["PPid"]), []).append(int(entrada))
+        rss[int(entrada)] = int(campos.get("VmRSS", "0 kB").split()[0])
+    total, pendentes = 0, [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        total += rss.get(atual, 0)
+        pendentes.extend(filhos.get(atual, []))
+    return total
+
+
+def _cliente_lento(porta: int, corpo: bytes, fim: float, pausa: float) -> None:
+    """Envia o pedido aos bocados (cliente com rede lenta) até ao ``fim``."""
+    import socket
+
+    cabecalho = (
+        f"POST /optimize HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(corpo)}\r\nConnection: close\r\n\r\n"
+    ).encode()
+    while time.perf_counter() < fim:
+        try:
+            with socket.create_connection(("127.0.0.1", porta), timeout=30) as s:
+                s.sendall(cabecalho)
+                for i in range(len(corpo)):
+                    if time.perf_counter() >= fim:
+                        return
+                    s.sendall(corpo[i:i + 1])
+                    time.sleep(pausa)
+                s.recv(65536)
+        except OSError:
+            time.sleep(pausa)
+
+
+def bench_carga(servidor: str, clientes: int, lentos: int, duracao: float,
+                seed: int = 0) -> Dict[str, Any]:
+    """
+    Serve a API num processo à parte (gunicorn sync ou uvicorn) e mede, com
+    ``clientes`` clientes rápidos em paralelo e ``lentos`` clientes a enviar
+    o corpo aos bocados, o débito e a latência de /optimize (um em cada dez
+    inclui o download do recibo) e a memória (RSS do servidor e do pool de
+    solvers) no fim da carga.
+    """
+    import http.client
+    import threading
+
+    porta = _porta_livre()
+    ambiente = dict(os.environ, LOG_LEVEL="WARNING", LAUNDRY_MEMO="0", SOLVER_POOL_WORKERS="2")
+    processo = subprocess.Popen(
+        [sys.executable, *(a.format(porta=porta) for a in SERVIDORES_CARGA[servidor])],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=ambiente,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        limite = time.perf_counter() + 30
+        while True:
+            try:
+                ligacao = http.client.HTTPConnection("127.0.0.1", porta, timeout=5)
+                ligacao.request("GET", "/health")
+                if ligacao.getresponse().status == 200:
+                    break
+            except OSError:
+                if time.perf_counter() > limite or processo.poll() is not None:
+                    raise RuntimeError(f"O servidor {servidor} não arrancou")
+                time.sleep(0.2)
+
+        pedidos = [
+            json.dumps({"items": p, "cliente": "Carga"}).encode()
+            for p in gerar_pedidos("medios", 200, seed)
+        ]
+        fim = time.perf_counter() + duracao
+        latencias: List[float] = []
+        erros = [0]
+        lock = threading.Lock()
+
+        def cliente_rapido(indice: int) -> None:
+            ligacao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+            i = indice
+            while time.perf_counter() < fim:
+                corpo = pedidos[i % len(pedidos)]
+                i += clientes
+                inicio = time.perf_counter()
+                try:
+                    ligacao.request("POST", "/optimize", body=corpo,
+                                    headers={"Content-Type": "application/json"})
+                    resposta = ligacao.getresponse()
+                    dados = resposta.read()
+                    ok = resposta.status == 200
+                    if ok and (i // clientes) % 10 == 0:
+                        # Um em cada dez pedidos descarrega também o recibo
+                        url = json.loads(dados)["pdf_url"]
+                        ligacao.request("GET", url[url.index("/download_pdf/"):])
+                        resposta = ligacao.getresponse()
+                        resposta.read()
+                        ok = resposta.status == 200
+                except OSError:
+                    ligacao.close()
+                    ligacao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+                    ok = False
+                with lock:
+                    if ok:
+                        latencias.append(time.perf_counter() - inicio)
+                    else:
+                        erros[0] += 1
+            ligacao.close()
+
+        threads = [threading.Thread(target=cliente_rapido, args=(i,)) for i in range(clientes)]
+        threads += [
+            threading.Thread(target=_cliente_lento, args=(porta, pedidos[i], fim, 0.05), daemon=True)
+            for i in range(lentos)
+        ]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads[:clientes]:
+            t.join()
+        decorrido = time.perf_counter() - inicio
+        rss_kb = _rss_arvore_kb(processo.pid)
+    finally:
+        processo.terminate()
+        try:
+            processo.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+
+    latencias.sort()
+    return {
+        "servidor": servidor,
+        "clientes": clientes,
+        "lentos": lentos,
+        "pedidos_ok": len(latencias),
+        "erros": erros[0],
+        "por_segundo": round(len(latencias) / decorrido, 1),
+        "p50_ms": round(1000 * _percentil(latencias, 0.50), 2) if latencias else None,
+        "p99_ms": round(1000 * _percentil(latencias, 0.99), 2) if latencias else None,
+        "rss_mb": round(rss_kb / 1024, 1) if rss_kb is not None else None,
+    }
+
+
+def _metadados(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "n": args.n,
+        "seed": args.seed,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def executar_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    pedidos = {d: gerar_pedidos(d, args.n, args.seed) for d in DISTRIBUICOES}
+    etapas = args.etapas.split(",")
+    resultados: Dict[str, Any] = {"meta": _metadados(args)}
+    if "solvers" in etapas:
+        resultados["optimize_order"] = bench_solvers(pedidos, args.solvers.split(","))
+    if "handler" in etapas:
+        resultados["gpt_optimize_handler"] = bench_handler(pedidos)
+    if "tamanhos" in etapas:
+        resultados["tamanhos"] = bench_tamanhos(args.solvers.split(","), min(args.n, 50))
+    if "pdf" in etapas:
+        resultados["recibo"] = bench_recibo(pedidos, min(args.n, 50))
+    if "http" in etapas:
+        resultados["http"] = bench_http(pedidos, min(args.n, 50))
+    return resultados
+
+
+def comparar_resultados(antes: Dict[str, Any], depois: Dict[str, Any]) -> List[str]:
+    """Linhas com a variação de p50/p95/p99 para cada etapa comum."""
+    linhas = []
+    for grupo, etapas in depois.items():
+        if grupo == "meta" or grupo not in antes:
+            continue
+        for etapa, valores in etapas.items():
+            anterior = antes[grupo].get(etapa)
+            if anterior is None:
+                continue
+            variacoes = []
+            for chave in ("p50_ms", "p95_ms", "p99_ms"):
+                a, d = anterior[chave], valores[chave]
+                pct = 100 * (d - a) / a if a else 0.0
+                variacoes.append(f"{chave[:3]} {a:.3f}->{d:.3f} ({pct:+.0f}%)")
+            linhas.append(f"{grupo}/{etapa}: " + "  ".join(variacoes))
+    return linhas
+
+
+def _imprimir(resultados: Dict[str, Any]) -> None:
+    for grupo, etapas in resultados.items():
+        if grupo == "meta":
+            continue
+        print(f"\n[{grupo}]")
+        for etapa, v in etapas.items():
+            print(f"  {etapa:<28} {v['por_segundo']:>10.1f}/s  p50 {v['p50_ms']:.3f}  "
+                  f"p95 {v['p95_ms']:.3f}  p99 {v['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Benchmarks da Engomadoria Teresa")
+    parser.add_argument("alvo", choices=["pdf", "suite", "diff", "arranque", "carga"], help="O que medir")
+    parser.add_argument("ficheiros", nargs="*", help="Para diff: antes.json depois.json")
+    parser.add_argument("-n", type=int, default=50, help="Repetições / pedidos por distribuição")
+    parser.add_argument("--seed", type=int, default=0, help="Semente das distribuições")
+    parser.add_argument("--solvers", default=f"{SOLVER_TABELA},{SOLVER_NATIVO},{SOLVER_PULP}",
+                        help="Solvers a comparar (separados por vírgulas)")
+    parser.add_argument("--etapas", default="solvers,tamanhos,handler,pdf,http",
+                        help="Etapas da suite (separadas por vírgulas)")
+    parser.add_argument("--saida", help="Gravar os resultados da suite em JSON")
+    parser.add_argument("--orcamento-import-ms", type=float,
+                        help="Arranque: falhar se importar a app demorar mais do que isto")
+    parser.add_argument("--servidores", default="wsgi,asgi",
+                        help="Carga: servidores a comparar (wsgi, asgi)")
+    parser.add_argument("--clientes", type=int, default=16, help="Carga: clientes rápidos")
+    parser.add_argument("--lentos", type=int, default=4, help="Carga: clientes lentos")
+    parser.add_argument("--duracao", type=float, default=10.0, help="Carga: segundos por servidor")
+    args = parser.parse_args()
+
+    if args.alvo == "pdf":
+        for chave, valor in bench_pdf(args.n).items():
+            print(f"{chave}: {valor}")
+    elif args.alvo == "arranque":
+        resultados = bench_arranque(args.n if args.n != parser.get_default("n") else 3)
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        if args.orcamento_import_ms is not None:
+            import_ms = resultados["frio"]["import_ms"]
+            if import_ms > args.orcamento_import_ms:
+                print(f"Orçamento excedido: import {import_ms} ms > {args.orcamento_import_ms} ms")
+                raise SystemExit(1)
+    elif args.alvo == "carga":
+        for servidor in args.servidores.split(","):
+            resultado = bench_carga(servidor, args.clientes, args.lentos, args.duracao, args.seed)
+            print(json.dumps(resultado, ensure_ascii=False))
+    elif args.alvo == "suite":
+        resultados = executar_suite(args)
+        _imprimir(resultados)
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(resultados, f, indent=2, sort_keys=True, ensure_ascii=False)
+            print(f"\nResultados gravados em {args.saida}")
+    else:
+        if len(args.ficheiros) != 2:
+            parser.error("diff precisa de dois ficheiros JSON")
+        with open(args.ficheiros[0], encoding="utf-8") as f:
+            antes = json.load(f)
+        with open(args.ficheiros[1], encoding="utf-8") as f:
+            depois = json.load(f)
+        print("\n".join(comparar_resultados(antes, depois)))
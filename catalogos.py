@@ -0,0 +1,247 @@
+"""
+catalogos.py
+============
+Registo de catálogos de preços: tabelas por cliente e por época.
+
+Cada catálogo é validado e compilado uma única vez num ``MotorPrecos``
+imutável (ver ``laundry_optimizer_final``), guardado pela versão do
+conteúdo: recarregar um ficheiro em que um catálogo não mudou reaproveita o
+motor, com a tabela de custos já calculada.
+
+O ficheiro (``LAUNDRY_CATALOGOS_PATH``) é um JSON:
+
+    {
+      "padrao": "geral",
+      "catalogos": {"geral": {...}, "hotelaria": {...}, "natal": {...}},
+      "clientes": {"Hotel Avenida": "hotelaria"},
+      "epocas": [{"catalogo": "natal", "inicio": "2025-12-01", "fim": "2025-12-31"}]
+    }
+
+em que cada catálogo tem o formato de ``CATALOG``. Por pedido, o campo
+``cliente`` escolhe o catálogo do cliente (sem distinguir maiúsculas); sem
+catálogo próprio vale o da época em curso (datas inclusivas) e, fora das
+épocas, o ``padrao``. Sem ficheiro, ou se o ficheiro não definir o catálogo
+``padrao``, este é o ``CATALOG`` embutido.
+
+O ficheiro é relido quando o mtime muda (verificado no máximo a cada
+``LAUNDRY_CATALOGOS_INTERVALO`` segundos), em cada processo, sem reiniciar os
+workers. Um ficheiro inválido é rejeitado por inteiro e fica o registo
+anterior; no arranque, é um erro.
+
+    python catalogos.py catalogos.json     # valida e mostra as versões
+"""
+
+from __future__ import annotations
+from datetime import date
+from typing import Any, Dict, List, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+from laundry_optimizer_final import CATALOG, MotorPrecos, motor_por_versao, motor_precos
+
+log = logging.getLogger(__name__)
+
+CATALOGOS_PATH = os.environ.get("LAUNDRY_CATALOGOS_PATH")
+CATALOGOS_INTERVALO = float(os.environ.get("LAUNDRY_CATALOGOS_INTERVALO", 2))
+
+# Nome do catálogo embutido quando o ficheiro não indica outro
+PADRAO = "padrao"
+
+
+class _Registo:
+    """Conteúdo de um ficheiro de catálogos já compilado (nunca é alterado)."""
+    __slots__ = ("motores", "padrao", "clientes", "epocas")
+
+    def __init__(self, motores: Dict[str, MotorPrecos], padrao: str,
+                 clientes: Dict[str, str], epocas: List[Tuple[date, date, str]]):
+        self.motores = motores
+        self.padrao = padrao
+        self.clientes = clientes
+        self.epocas = epocas
+
+
+def _data(valor: Any, campo: str) -> date:
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Época inválida: '{campo}' deve ser uma data AAAA-MM-DD") from None
+
+
+def compilar_registo(dados: Any) -> _Registo:
+    """Valida o conteúdo de um ficheiro de catálogos e compila os motores."""
+    if not isinstance(dados, dict) or not isinstance(dados.get("catalogos", {}), dict):
+        raise ValueError("Formato inválido: esperado objeto com 'catalogos'")
+
+    motores = {}
+    for nome, catalog in dados.get("catalogos", {}).items():
+        try:
+            motores[nome] = motor_precos(catalog)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"{e} (catálogo '{nome}')") from None
+
+    padrao = dados.get("padrao", PADRAO)
+    if not isinstance(padrao, str):
+        raise ValueError("Formato inválido: 'padrao' deve ser o nome de um catálogo")
+    if padrao not in motores:
+        if padrao != PADRAO:
+            raise ValueError(f"Catálogo por omissão desconhecido: '{padrao}'")
+        motores[PADRAO] = motor_precos(CATALOG)
+
+    clientes = {}
+    if not isinstance(dados.get("clientes", {}), dict):
+        raise ValueError("Formato inválido: 'clientes' deve ser um objeto")
+    for cliente, nome in dados.get("clientes", {}).items():
+        if nome not in motores:
+            raise ValueError(f"Cliente '{cliente}': catálogo desconhecido '{nome}'")
+        clientes[cliente.strip().casefold()] = nome
+
+    epocas = []
+    if not isinstance(dados.get("epocas", []), list):
+        raise ValueError("Formato inválido: 'epocas' deve ser uma lista")
+    for epoca in dados.get("epocas", []):
+        if not isinstance(epoca, dict) or epoca.get("catalogo") not in motores:
+            raise ValueError(f"Época com catálogo desconhecido: {epoca}")
+        inicio = _data(epoca.get("inicio"), "inicio")
+        fim = _data(epoca.get("fim"), "fim")
+        if fim < inicio:
+            raise ValueError(f"Época '{epoca['catalogo']}' termina antes de começar")
+        epocas.append((inicio, fim, epoca["catalogo"]))
+
+    return _Registo(motores, padrao, clientes, epocas)
+
+
+class RegistoCatalogos:
+    """
+    Catálogos em uso por este processo, com recarga a quente do ficheiro.
+    As consultas leem um ``_Registo`` imutável, substituído de uma só vez
+    após uma recarga bem-sucedida: não há locks no caminho dos pedidos.
+    """
+
+    def __init__(self, path: str | None = CATALOGOS_PATH,
+                 intervalo: float = CATALOGOS_INTERVALO):
+        self.path = path
+        self.intervalo = intervalo
+        self.recargas = 0
+        self.erros = 0
+        self._mtime: float | None = None
+        self._verificado = 0.0
+        self._lock = threading.Lock()
+        self._registo = compilar_registo({})
+        if path:
+            # No arranque, um ficheiro inválido ou em falta é um erro
+            self._mtime = os.stat(path).st_mtime
+            self._registo = self._ler()
+
+    def _ler(self) -> _Registo:
+        with open(self.path, encoding="utf-8") as f:
+            return compilar_registo(json.load(f))
+
+    def verificar(self) -> None:
+        """Recarrega o ficheiro se o mtime mudou (no máximo a cada ``intervalo`` s)."""
+        agora = time.monotonic()
+        if not self.path or agora - self._verificado < self.intervalo:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # outra thread já está a verificar
+        try:
+            self._verificado = agora
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as e:
+                log.error("Ficheiro de catálogos inacessível (%s): mantém-se o registo atual", e)
+                return
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            try:
+                registo = self._ler()
+            except (OSError, ValueError) as e:
+                self.erros += 1
+                log.error("Catálogos não recarregados (%s): mantém-se o registo atual", e)
+                return
+            self._registo = registo
+            self.recargas += 1
+            log.info("Catálogos recarregados: %s", {
+                nome: motor.versao for nome, motor in registo.motores.items()
+            })
+        finally:
+            self._lock.release()
+
+    def selecionar(self, cliente: str | None = None, hoje: date | None = None) -> Tuple[str, MotorPrecos]:
+        """(nome, motor) do catálogo a aplicar ao pedido deste cliente."""
+        self.verificar()
+        registo = self._registo
+        nome = registo.clientes.get((cliente or "").strip().casefold())
+        if nome is None:
+            hoje = hoje or date.today()
+            nome = next(
+                (n for inicio, fim, n in registo.epocas if inicio <= hoje <= fim),
+                registo.padrao
+            )
+        return nome, registo.motores[nome]
+
+    def procurar(self, versao: str) -> MotorPrecos | None:
+        """Motor de uma versão já compilada ou registada (None se não existir)."""
+        motor = motor_por_versao(versao)
+        if motor is None:
+            self.verificar()
+            motor = next((m for m in self._registo.motores.values() if m.versao == versao), None)
+        return motor
+
+    def motor(self, versao: str | None) -> MotorPrecos:
+        """
+        Motor de uma versão gravada (ex.: ``catalogo`` de um recibo). Sem
+        versão é o ``CATALOG`` embutido (recibos anteriores ao registo). Uma
+        versão que já não existe levanta LookupError: outro catálogo daria
+        preços diferentes dos cobrados.
+        """
+        if versao is None:
+            return motor_precos(CATALOG)
+        motor = self.procurar(versao)
+        if motor is None:
+            raise LookupError(f"Catálogo {versao} já não existe")
+        return motor
+
+    def aquecer(self, completo: bool = True) -> None:
+        """
+        Constrói as tabelas de todos os catálogos registados: no tamanho
+        máximo e com a redução por blocos, ou (``completo=False``) só no
+        tamanho inicial, que cresce a pedido.
+        """
+        for motor in {m.versao: m for m in self._registo.motores.values()}.values():
+            if completo:
+                motor.aquecer()
+            else:
+                motor.tabela()
+
+    def stats(self) -> Dict[str, Any]:
+        registo = self._registo
+        return {
+            "ficheiro": self.path,
+            "padrao": registo.padrao,
+            "catalogos": {nome: motor.versao for nome, motor in registo.motores.items()},
+            "clientes": len(registo.clientes),
+            "epocas": len(registo.epocas),
+            "recargas": self.recargas,
+            "erros": self.erros,
+        }
+
+
+registo_catalogos = RegistoCatalogos()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validar um ficheiro de catálogos")
+    parser.add_argument("ficheiro", help="JSON de catálogos (formato em catalogos.py)")
+    args = parser.parse_args()
+
+    try:
+        registo = RegistoCatalogos(args.ficheiro)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Inválido: {e}")
+    print(json.dumps(registo.stats(), indent=2, ensure_ascii=False))
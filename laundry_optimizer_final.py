@@ -4,15 +4,46 @@ laundry_optimizer_final.py
 Otimizador de custos para lavanderia com precário atualizado (Julho 2025)
 Calcula a combinação mais económica de packs e peças avulsas.
 
-Requer: pulp (pip install pulp)
+Solvers disponíveis (``solver_name``):
+    - "tabela" (por omissão): consulta O(1) numa tabela pré-calculada de
+      custos ótimos; acima dela, a redução por blocos ou, em catálogos sem
+      ela, o modelo ILP (HiGHS ou CBC)
+    - "nativo": enumeração exata sem dependências externas
+    - "pulp": modelo ILP original resolvido pelo CBC do PuLP
+    - "highs": o mesmo modelo ILP resolvido em processo pelo HiGHS
+    - "heuristico": arredondamento da relaxação linear, em tempo limitado;
+      não garante o ótimo (``exato``/``limite_inferior`` no resultado)
+    - qualquer outro nome aceite por ``pulp.getSolver`` (ex.: "PULP_CBC_CMD")
+
+O modelo ILP é construído uma vez por catálogo (``ModeloILP``) e reutilizado;
+por pedido só mudam os lados direitos das restrições de cobertura.
+
+Cada catálogo é validado e compilado num ``MotorPrecos`` (índices de preços,
+otimizador, tabela e redução por blocos), partilhado por versão do conteúdo
+(``motor_precos``). O ``CATALOG`` abaixo é o catálogo por omissão; os
+catálogos por cliente e por época vêm do registo em ``catalogos.py``.
+
+Requer: pulp (pip install pulp) apenas para os solvers ILP; highspy
+(pip install highspy) apenas para o solver "highs". NumPy e PuLP só são
+importados na primeira utilização (tabela de custos / solver ILP), para que
+importar este módulo seja rápido.
 """
 
 from __future__ import annotations
-from typing import Dict, Tuple, Any
-from pulp import LpProblem, LpMinimize, LpInteger, LpVariable, lpSum, LpStatus
+from typing import TYPE_CHECKING, Dict, List, Tuple, Any
+from collections import OrderedDict
+import hashlib
+import importlib.util
 import json
 import logging
-import numpy as np
+import math
+import os
+import threading
+
+if TYPE_CHECKING:
+    import numpy as np
+
+from metricas import span
 
 # --------------------------------------------------------------------------- #
 #  CATALOGO ATUALIZADO (JULHO 2025)
@@ -47,11 +78,556 @@ CATALOG = {
     }
 }
 
+# --------------------------------------------------------------------------- #
+#  SOLVERS
+# --------------------------------------------------------------------------- #
+SOLVER_TABELA = "tabela"
+SOLVER_NATIVO = "nativo"
+SOLVER_PULP = "pulp"
+SOLVER_HIGHS = "highs"
+SOLVER_HEURISTICO = "heuristico"
+
+# Pedidos acima da tabela num catálogo sem redução por blocos: o ILP compilado
+# (tempo quase independente do tamanho), nunca a enumeração nativa. HiGHS em
+# processo se o highspy estiver instalado; senão o CBC do PuLP
+SOLVER_ILP_GRANDES = SOLVER_HIGHS if importlib.util.find_spec("highspy") else SOLVER_PULP
+
+# Tempo máximo (s) de um solve ILP (CBC/HiGHS), além do qual falha: soluções
+# não provadas ótimas (a menos de ILP_GAP_ABSOLUTO) nunca são devolvidas
+ILP_TEMPO_LIMITE = float(os.environ.get("LAUNDRY_ILP_TEMPO_LIMITE", 10))
+# Diferença máxima (€) entre a solução ILP e o limite inferior provado
+ILP_GAP_ABSOLUTO = 1e-3
+
+# (packs_mistos, camisas_em_packs_mistos, packs_camisas, itens_avulsos)
+_SolucaoPacks = Tuple[Dict[str, int], Dict[str, int], Dict[str, int], Dict[str, int]]
+
+
+def _cents(valor: float) -> int:
+    """Converte um preço em euros para cêntimos inteiros."""
+    return int(round(valor * 100))
+
+
+def _mochila_camisas(packs_camisas: list, pc: int, max_camisas: int) -> Tuple[list, list]:
+    """
+    Mochila de cobertura 1-D: ``h[j]`` é o custo mínimo (cêntimos) para
+    cobrir ``j`` camisas só com packs de camisas e camisas avulsas.
+    ``escolha[j]`` é o índice do pack usado no último passo (-1 = avulsa).
+    """
+    h = [0] * (max_camisas + 1)
+    escolha = [-1] * (max_camisas + 1)
+    for j in range(1, max_camisas + 1):
+        minimo, arg = h[j - 1] + pc, -1
+        for k, p in enumerate(packs_camisas):
+            v = _cents(p["preco"]) + h[max(0, j - p["capacidade"])]
+            if v < minimo:
+                minimo, arg = v, k
+        h[j], escolha[j] = minimo, arg
+    return h, escolha
+
+
+def _distribuir_camisas(packs_mistos: list, contagens: Dict[str, int], S: int) -> Dict[str, int]:
+    """Reparte ``S`` camisas pelos packs mistos usados, pela ordem do catálogo."""
+    camisas_em_mistos = {}
+    for p in packs_mistos:
+        colocadas = min(S, p["limite_camisas"] * contagens.get(p["tipo"], 0))
+        if colocadas > 0:
+            camisas_em_mistos[p["tipo"]] = colocadas
+            S -= colocadas
+    return camisas_em_mistos
+
+
+def _folga_mistos(packs_mistos: list, pc: int) -> float:
+    """
+    Se nenhum pack misto compensa só com camisas (preço > camisas avulsas
+    que comporta), numa solução ótima a folga dos mistos é menor que um
+    pack: senão as peças desse pack cabiam nos outros e retirá-lo
+    (pagando as suas camisas avulsas) baixava o custo. Logo
+    T < P + min(L, C) + capacidade máxima, o que limita a enumeração.
+    """
+    if packs_mistos and all(_cents(p["preco"]) > pc * p["limite_camisas"] for p in packs_mistos):
+        return max(p["capacidade"] for p in packs_mistos)
+    return float("inf")
+
+
+class _ColunaLP:
+    """Forma de cobrir itens na relaxação linear: por unidade, o que cobre e custa."""
+    __slots__ = ("pecas", "camisas", "preco", "grupo", "chave")
+
+    def __init__(self, pecas: int, camisas: int, preco: int, grupo: str, chave: str):
+        self.pecas = pecas
+        self.camisas = camisas
+        self.preco = preco  # cêntimos
+        self.grupo = grupo  # packs_mistos | packs_camisas | avulso
+        self.chave = chave
+
+
+def _colunas_lp(catalog: dict) -> List[_ColunaLP]:
+    """
+    Vértices das escolhas do modelo: cada pack misto só com peças ou com
+    camisas até ao limite, cada pack de camisas e as peças/camisas avulsas.
+    """
+    colunas = []
+    for p in catalog["packs_mistos"]:
+        colunas.append(_ColunaLP(p["capacidade"], 0, _cents(p["preco"]), "packs_mistos", p["tipo"]))
+        if p["limite_camisas"] > 0:
+            colunas.append(_ColunaLP(
+                p["capacidade"] - p["limite_camisas"], p["limite_camisas"],
+                _cents(p["preco"]), "packs_mistos", p["tipo"]
+            ))
+    for p in catalog["packs_camisas"]:
+        colunas.append(_ColunaLP(0, p["capacidade"], _cents(p["preco"]), "packs_camisas", p["tipo"]))
+    colunas.append(_ColunaLP(1, 0, _cents(catalog["avulso"]["peca_variada"]), "avulso", "peca_variada"))
+    colunas.append(_ColunaLP(0, 1, _cents(catalog["avulso"]["camisa"]), "avulso", "camisa"))
+    return colunas
+
+
+def _relaxacao_lp(colunas: List[_ColunaLP], P: int, C: int) -> Tuple[float, List[Tuple[_ColunaLP, float]]]:
+    """
+    Ótimo da relaxação linear (cêntimos) e a base que o atinge. Com só duas
+    restrições de cobertura, uma solução básica usa no máximo duas colunas:
+    basta enumerar as colunas isoladas e os pares, sem solver.
+    """
+    melhor: Tuple[float, List[Tuple[_ColunaLP, float]]] = (float("inf"), [])
+    for col in colunas:
+        if (P and not col.pecas) or (C and not col.camisas):
+            continue
+        lam = max(P / col.pecas if P else 0.0, C / col.camisas if C else 0.0)
+        if lam * col.preco < melhor[0]:
+            melhor = (lam * col.preco, [(col, lam)])
+    for i, a in enumerate(colunas):
+        for b in colunas[i + 1:]:
+            det = a.pecas * b.camisas - a.camisas * b.pecas
+            if det == 0:
+                continue
+            lam_a = (P * b.camisas - C * b.pecas) / det
+            lam_b = (a.pecas * C - a.camisas * P) / det
+            if lam_a >= 0 and lam_b >= 0 and lam_a * a.preco + lam_b * b.preco < melhor[0]:
+                melhor = (lam_a * a.preco + lam_b * b.preco, [(a, lam_a), (b, lam_b)])
+    return melhor
+
+# --------------------------------------------------------------------------- #
+#  RESULTADOS
+# --------------------------------------------------------------------------- #
+class DetalheCustos:
+    """Custos em euros por componente, arredondados ao cêntimo."""
+    __slots__ = (
+        "custos_fixos", "packs_mistos", "packs_camisas",
+        "itens_avulsos", "total_variavel", "total",
+    )
+
+    def __init__(self, custos_fixos: float, packs_mistos: float, packs_camisas: float,
+                 itens_avulsos: float, total_variavel: float, total: float):
+        self.custos_fixos = round(float(custos_fixos), 2)
+        self.packs_mistos = round(float(packs_mistos), 2)
+        self.packs_camisas = round(float(packs_camisas), 2)
+        self.itens_avulsos = round(float(itens_avulsos), 2)
+        self.total_variavel = round(float(total_variavel), 2)
+        self.total = round(float(total), 2)
+
+    @classmethod
+    def de_dict(cls, dados: Dict[str, float]) -> "DetalheCustos":
+        return cls(**dados)
+
+    def para_dict(self) -> Dict[str, float]:
+        return {
+            "custos_fixos": self.custos_fixos,
+            "packs_mistos": self.packs_mistos,
+            "packs_camisas": self.packs_camisas,
+            "itens_avulsos": self.itens_avulsos,
+            "total_variavel": self.total_variavel,
+            "total": self.total,
+        }
+
+
+class DetalhesPedido:
+    """
+    Composição da solução. Pedidos sem peças nem camisas só têm
+    ``itens_fixos`` (e o JSON também só tem essa chave).
+    """
+    __slots__ = (
+        "itens_fixos", "packs_mistos", "packs_camisas",
+        "itens_avulsos", "camisas_em_packs_mistos", "detalhe_custos",
+    )
+
+    def __init__(
+        self,
+        itens_fixos: Dict[str, int],
+        packs_mistos: Dict[str, int] | None = None,
+        packs_camisas: Dict[str, int] | None = None,
+        itens_avulsos: Dict[str, int] | None = None,
+        camisas_em_packs_mistos: Dict[str, int] | None = None,
+        detalhe_custos: DetalheCustos | None = None,
+    ):
+        self.itens_fixos = itens_fixos
+        self.packs_mistos = packs_mistos
+        self.packs_camisas = packs_camisas
+        self.itens_avulsos = itens_avulsos
+        self.camisas_em_packs_mistos = camisas_em_packs_mistos
+        self.detalhe_custos = detalhe_custos
+
+    @classmethod
+    def de_dict(cls, dados: Dict[str, Any]) -> "DetalhesPedido":
+        """Inverso de ``para_dict`` (ex.: a partir de um recibo guardado)."""
+        if "detalhe_custos" not in dados:
+            return cls(dict(dados["itens_fixos"]))
+        return cls(
+            itens_fixos=dict(dados["itens_fixos"]),
+            packs_mistos=dict(dados["packs_mistos"]),
+            packs_camisas=dict(dados["packs_camisas"]),
+            itens_avulsos=dict(dados["itens_avulsos"]),
+            camisas_em_packs_mistos=dict(dados["camisas_em_packs_mistos"]),
+            detalhe_custos=DetalheCustos.de_dict(dados["detalhe_custos"]),
+        )
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Dicionário no formato de ``detalhes`` da resposta (cópias próprias)."""
+        if self.detalhe_custos is None:
+            return {"itens_fixos": dict(self.itens_fixos)}
+        return {
+            "itens_fixos": dict(self.itens_fixos),
+            "packs_mistos": dict(self.packs_mistos),
+            "packs_camisas": dict(self.packs_camisas),
+            "itens_avulsos": dict(self.itens_avulsos),
+            "camisas_em_packs_mistos": dict(self.camisas_em_packs_mistos),
+            "detalhe_custos": self.detalhe_custos.para_dict(),
+        }
+
+
+class ResultadoOtimizacao:
+    """
+    Resultado de ``optimize_order``. Continua a poder ser desempacotado como
+    o antigo tuplo ``(custo_total, detalhes, variaveis)``; ``variaveis`` (as
+    contagens com os nomes das variáveis do modelo ILP) só é construído
+    quando é pedido.
+    """
+    __slots__ = ("custo_total", "detalhes", "_catalog", "exato", "limite_inferior")
+
+    def __init__(self, custo_total: float, detalhes: DetalhesPedido, catalog: dict | None = None,
+                 exato: bool = True, limite_inferior: float | None = None):
+        self.custo_total = custo_total
+        self.detalhes = detalhes
+        self._catalog = catalog
+        # Soluções heurísticas: limite inferior (relaxação linear) do ótimo
+        self.exato = exato
+        self.limite_inferior = limite_inferior
+
+    @classmethod
+    def de_resposta(cls, resposta: Dict[str, Any], catalog: dict | None = None) -> "ResultadoOtimizacao":
+        """Reconstrói o resultado a partir de uma resposta de sucesso da API."""
+        return cls(resposta["custo_total"], DetalhesPedido.de_dict(resposta["detalhes"]), catalog)
+
+    @property
+    def variaveis(self) -> Dict[str, int]:
+        d = self.detalhes
+        if self._catalog is None or d.detalhe_custos is None:
+            return {}
+        mistos = self._catalog["packs_mistos"]
+        return {
+            **{f"pack_misto_{p['tipo']}": d.packs_mistos.get(p["tipo"], 0) for p in mistos},
+            **{f"camisas_no_misto_{p['tipo']}": d.camisas_em_packs_mistos.get(p["tipo"], 0)
+               for p in mistos},
+            **{f"pack_camisa_{p['tipo']}": d.packs_camisas.get(p["tipo"], 0)
+               for p in self._catalog["packs_camisas"]},
+            "pecas_variadas_avulsas": d.itens_avulsos["peca_variada"],
+            "camisas_avulsas": d.itens_avulsos["camisa"],
+        }
+
+    def __iter__(self):
+        return iter((self.custo_total, self.detalhes.para_dict(), self.variaveis))
+
+    def resposta(self) -> Dict[str, Any]:
+        """
+        Resposta de sucesso da API, construída diretamente (sem conversões).
+        Soluções não provadas ótimas trazem ``"exato": false``, o limite
+        inferior do custo e o ``gap`` relativo até ele.
+        """
+        resposta = {
+            "status": "sucesso",
+            "custo_total": round(self.custo_total, 2),
+            "exato": self.exato,
+            "detalhes": self.detalhes.para_dict()
+        }
+        if not self.exato and self.limite_inferior is not None:
+            resposta["limite_inferior"] = round(self.limite_inferior, 2)
+            resposta["gap"] = round(
+                (self.custo_total - self.limite_inferior) / self.custo_total, 4
+            ) if self.custo_total else 0.0
+        return resposta
+
+
+class CurvaPrecos:
+    """
+    Resultado de ``price_curve``: custo ótimo e mistura de packs em todos os
+    pontos de um retângulo (peca_variada, camisa). ``custo`` (cêntimos),
+    ``mistos`` e ``camisas`` (contagens de cada pack, pela ordem do
+    catálogo) são arrays indexados por ``[peças - pecas[0], camisas - camisas[0]]``.
+    """
+    __slots__ = ("pecas", "camisas", "custo", "mistos", "packs_camisas", "_catalog")
+
+    def __init__(self, pecas: Tuple[int, int], camisas: Tuple[int, int], custo: np.ndarray,
+                 mistos: np.ndarray, packs_camisas: np.ndarray, catalog: dict):
+        self.pecas = pecas
+        self.camisas = camisas
+        self.custo = custo
+        self.mistos = mistos
+        self.packs_camisas = packs_camisas
+        self._catalog = catalog
+
+    def pontos_de_quebra(self) -> List[Dict[str, Any]]:
+        """
+        Pontos em que a escolha de packs muda em relação ao ponto anterior
+        (uma peça ou uma camisa a menos), com os eixos em que isso acontece
+        e a nova escolha (ex.: "com mais 3 peças passa a um pack de 40").
+        """
+        import numpy as np
+
+        escolha = np.concatenate([self.mistos, self.packs_camisas], axis=2)
+        muda_camisa = np.zeros(self.custo.shape, dtype=bool)
+        muda_camisa[:, 1:] = (escolha[:, 1:] != escolha[:, :-1]).any(axis=2)
+        muda_peca = np.zeros(self.custo.shape, dtype=bool)
+        muda_peca[1:, :] = (escolha[1:] != escolha[:-1]).any(axis=2)
+
+        mistos = self._catalog["packs_mistos"]
+        camisas = self._catalog["packs_camisas"]
+        pontos = []
+        for i, j in np.argwhere(muda_camisa | muda_peca).tolist():
+            pontos.append({
+                "peca_variada": self.pecas[0] + i,
+                "camisa": self.camisas[0] + j,
+                "eixos": [e for e, muda in (("peca_variada", muda_peca[i, j]),
+                                             ("camisa", muda_camisa[i, j])) if muda],
+                "custo": int(self.custo[i, j]) / 100,
+                "packs_mistos": {
+                    p["tipo"]: n for p, n in zip(mistos, self.mistos[i, j].tolist()) if n
+                },
+                "packs_camisas": {
+                    p["tipo"]: n for p, n in zip(camisas, self.packs_camisas[i, j].tolist()) if n
+                },
+            })
+        return pontos
+
+    def resposta(self) -> Dict[str, Any]:
+        """
+        Resposta da API: matrizes ``[peças][camisas]`` de custos (euros) e de
+        contagens de cada pack, mais os pontos de quebra.
+        """
+        mistos = self._catalog["packs_mistos"]
+        camisas = self._catalog["packs_camisas"]
+        return {
+            "status": "sucesso",
+            "peca_variada": list(self.pecas),
+            "camisa": list(self.camisas),
+            "custos": (self.custo / 100).tolist(),
+            "packs_mistos": {p["tipo"]: self.mistos[:, :, k].tolist() for k, p in enumerate(mistos)},
+            "packs_camisas": {
+                p["tipo"]: self.packs_camisas[:, :, k].tolist() for k, p in enumerate(camisas)
+            },
+            "pontos_de_quebra": self.pontos_de_quebra(),
+        }
+
+
+_GRUPOS_ALTERACOES = (
+    "itens_fixos", "packs_mistos", "packs_camisas",
+    "camisas_em_packs_mistos", "itens_avulsos",
+)
+
+
+def alteracoes_packs(anterior: DetalhesPedido, novo: DetalhesPedido) -> Dict[str, Dict[str, Any]]:
+    """
+    Escolhas que mudaram entre duas soluções, por grupo:
+    ``{"packs_camisas": {"5": {"antes": 1, "depois": 0}}, ...}``.
+    Grupos sem alterações não aparecem.
+    """
+    alteracoes = {}
+    for grupo in _GRUPOS_ALTERACOES:
+        antes = getattr(anterior, grupo) or {}
+        depois = getattr(novo, grupo) or {}
+        mudancas = {
+            chave: {"antes": antes.get(chave, 0), "depois": depois.get(chave, 0)}
+            for chave in {**antes, **depois}
+            if antes.get(chave, 0) != depois.get(chave, 0)
+        }
+        if mudancas:
+            alteracoes[grupo] = mudancas
+    return alteracoes
+
+
+# --------------------------------------------------------------------------- #
+#  MODELO ILP COMPILADO
+# --------------------------------------------------------------------------- #
+class ModeloILP:
+    """
+    Modelo de programação linear inteira original, construído uma vez por
+    catálogo. Por pedido só mudam os lados direitos das duas restrições de
+    cobertura (camisas e peças variadas).
+
+    Com ``solver_name="highs"`` o mesmo modelo é resolvido em processo pelo
+    HiGHS (pacote opcional ``highspy``), sem ficheiro MPS nem subprocesso
+    por pedido; os restantes nomes passam pelo PuLP (CBC por omissão).
+    """
+
+    def __init__(self, catalog: dict, versao: str, logger: logging.Logger | None = None):
+        self.catalog = catalog
+        self.versao = versao
+        self.log = logger or logging.getLogger(__name__)
+        self._highs = None
+
+        from pulp import LpProblem, LpMinimize, LpInteger, LpVariable, lpSum
+
+        prob = LpProblem("Minimizar_Custo_Lavanderia", LpMinimize)
+
+        # Variáveis de decisão
+        x = {
+            p["tipo"]: LpVariable(f"pack_misto_{p['tipo']}", 0, cat=LpInteger)
+            for p in catalog["packs_mistos"]
+        }
+        s = {
+            p["tipo"]: LpVariable(f"camisas_no_misto_{p['tipo']}", 0, cat=LpInteger)
+            for p in catalog["packs_mistos"]
+        }
+        y = {
+            p["tipo"]: LpVariable(f"pack_camisa_{p['tipo']}", 0, cat=LpInteger)
+            for p in catalog["packs_camisas"]
+        }
+        a_var = LpVariable("pecas_variadas_avulsas", 0, cat=LpInteger)
+        a_cam = LpVariable("camisas_avulsas", 0, cat=LpInteger)
+
+        cost_mistos = lpSum(p["preco"] * x[p["tipo"]] for p in catalog["packs_mistos"])
+        cost_camisas = lpSum(p["preco"] * y[p["tipo"]] for p in catalog["packs_camisas"])
+        cost_avulso = (
+            catalog["avulso"]["peca_variada"] * a_var +
+            catalog["avulso"]["camisa"] * a_cam
+        )
+        prob += cost_mistos + cost_camisas + cost_avulso
+
+        # Limite de camisas nos packs mistos
+        for p in catalog["packs_mistos"]:
+            prob += s[p["tipo"]] <= p["limite_camisas"] * x[p["tipo"]]
+
+        # Cobertura de camisas e de peças variadas (RHS definidos em resolver)
+        self._cobertura_camisas = (
+            lpSum(s.values()) +
+            lpSum(p["capacidade"] * y[p["tipo"]] for p in catalog["packs_camisas"]) +
+            a_cam >= 0
+        )
+        self._cobertura_pecas = (
+            lpSum(
+                (p["capacidade"] * x[p["tipo"]]) - s[p["tipo"]]
+                for p in catalog["packs_mistos"]
+            ) + a_var >= 0
+        )
+        prob += self._cobertura_camisas, "cobertura_camisas"
+        prob += self._cobertura_pecas, "cobertura_pecas"
+
+        self.prob = prob
+        self.x, self.s, self.y = x, s, y
+        self.a_var, self.a_cam = a_var, a_cam
+        # Ordem das colunas no modelo HiGHS
+        self._colunas = [*x.values(), *s.values(), *y.values(), a_var, a_cam]
+
+    def resolver(self, qty: Dict[str, int], solver_name: str) -> _SolucaoPacks:
+        if solver_name == SOLVER_HIGHS:
+            with span("optimize_order.highs"):
+                valores = self._resolver_highs(qty)
+        else:
+            valores = self._resolver_pulp(qty, solver_name)
+
+        packs_mistos = {k: valores[v.name] for k, v in self.x.items() if valores[v.name] > 0}
+        packs_camisas = {k: valores[v.name] for k, v in self.y.items() if valores[v.name] > 0}
+        camisas_em_mistos = {k: valores[v.name] for k, v in self.s.items() if valores[v.name] > 0}
+        avulsos = {
+            "peca_variada": valores[self.a_var.name],
+            "camisa": valores[self.a_cam.name],
+        }
+        return packs_mistos, camisas_em_mistos, packs_camisas, avulsos
+
+    def _resolver_pulp(self, qty: Dict[str, int], solver_name: str) -> Dict[str, int]:
+        from pulp import LpSolutionOptimal, LpStatus, PULP_CBC_CMD, getSolver
+
+        # a >= b fica guardado como a - b >= 0
+        self._cobertura_camisas.constant = -qty["camisa"]
+        self._cobertura_pecas.constant = -qty["peca_variada"]
+
+        if solver_name == SOLVER_PULP:
+            solver = PULP_CBC_CMD(msg=False, timeLimit=ILP_TEMPO_LIMITE)
+        else:
+            solver = getSolver(solver_name, msg=False, timeLimit=ILP_TEMPO_LIMITE)
+        with span("optimize_order.cbc"):
+            status = self.prob.solve(solver)
+        if LpStatus[status] != "Optimal":
+            raise RuntimeError(f"Erro no solver: {LpStatus[status]}")
+        if self.prob.sol_status != LpSolutionOptimal:
+            # Parado pelo tempo limite com uma solução não provada ótima
+            raise RuntimeError(f"Erro no solver: tempo limite de {ILP_TEMPO_LIMITE:g}s excedido")
+
+        # Verificar valores inválidos do solver (uma leitura por variável)
+        valores = {var.name: var.value() for var in self._colunas}
+        if any(v is None for v in valores.values()):
+            self.log.error("Solver retornou valores inválidos")
+            raise RuntimeError("Solução inválida do solver")
+        return {nome: int(round(v)) for nome, v in valores.items()}
+
+    def _compilar_highs(self):
+        """Traduz o modelo PuLP para um ``highspy.Highs`` (uma vez)."""
+        import highspy
+
+        h = highspy.Highs()
+        h.setOptionValue("output_flag", False)
+        h.setOptionValue("time_limit", ILP_TEMPO_LIMITE)
+        # Sem tolerância relativa: o gap por omissão (1e-4) deixa passar
+        # euros de diferença em pedidos grandes; em absoluto, menos de 1 cêntimo
+        h.setOptionValue("mip_rel_gap", 0.0)
+        h.setOptionValue("mip_abs_gap", ILP_GAP_ABSOLUTO)
+        indice = {var.name: i for i, var in enumerate(self._colunas)}
+        custos = self.prob.objective
+        for var in self._colunas:
+            h.addVar(0, highspy.kHighsInf)
+            h.changeColCost(indice[var.name], float(custos.get(var, 0.0)))
+            h.changeColIntegrality(indice[var.name], highspy.HighsVarType.kInteger)
+        self._linhas = {}
+        for nome, restricao in self.prob.constraints.items():
+            colunas = [indice[var.name] for var in restricao]
+            coeficientes = [float(c) for c in restricao.values()]
+            if restricao.sense == -1:  # <=
+                h.addRow(-highspy.kHighsInf, -restricao.constant, len(colunas), colunas, coeficientes)
+            else:  # >=
+                h.addRow(-restricao.constant, highspy.kHighsInf, len(colunas), colunas, coeficientes)
+            self._linhas[nome] = h.getNumRow() - 1
+        self._highs = h
+
+    def _resolver_highs(self, qty: Dict[str, int]) -> Dict[str, int]:
+        import highspy
+
+        if self._highs is None:
+            self._compilar_highs()
+        h = self._highs
+        h.changeRowBounds(self._linhas["cobertura_camisas"], qty["camisa"], float("inf"))
+        h.changeRowBounds(self._linhas["cobertura_pecas"], qty["peca_variada"], float("inf"))
+        h.run()
+        if h.getModelStatus() == highspy.HighsModelStatus.kTimeLimit:
+            # Parado pelo tempo limite: a melhor solução não está provada ótima
+            raise RuntimeError(f"Erro no solver: tempo limite de {ILP_TEMPO_LIMITE:g}s excedido")
+        estado = h.modelStatusToString(h.getModelStatus())
+        if estado != "Optimal":
+            raise RuntimeError(f"Erro no solver: {estado}")
+        info = h.getInfo()
+        gap = info.objective_function_value - info.mip_dual_bound
+        if gap > ILP_GAP_ABSOLUTO:
+            # "Optimal" do HiGHS só garante o gap configurado
+            raise RuntimeError(f"Erro no solver: solução não provada ótima (gap de {gap:.4f})")
+        valores = h.getSolution().col_value
+        return {var.name: int(round(valores[i])) for i, var in enumerate(self._colunas)}
+
+
 # --------------------------------------------------------------------------- #
 #  NÚCLEO DE OTIMIZAÇÃO
 # --------------------------------------------------------------------------- #
+# Máximo de pontos (peças x camisas) de uma curva de preços
+CURVA_MAX_PONTOS = int(os.environ.get("LAUNDRY_CURVA_MAX_PONTOS", 20000))
+
+
 class LaundryOptimizer:
-    """Otimiza custos de lavanderia usando programação linear inteira."""
+    """Otimiza custos de lavanderia (solver nativo exato ou ILP via PuLP)."""
     _SPECIALS = [
         "vestido_simples", "calca_com_vinco", "blazer", 
         "toalha_ou_lencol", "capa_de_edredon",
@@ -64,26 +640,43 @@ class LaundryOptimizer:
     
     _ITEM_KEYS = list(CATALOG["avulso"].keys())
 
-    def __init__(self, catalog: dict = CATALOG, logger: logging.Logger | None = None):
+    def __init__(
+        self,
+        catalog: dict = CATALOG,
+        logger: logging.Logger | None = None,
+        motor: MotorPrecos | None = None
+    ):
         self.catalog = catalog
         self.log = logger or logging.getLogger(__name__)
+        # Itens pela ordem deste catálogo (os atributos de classe são os de CATALOG)
+        self._ITEM_KEYS = list(catalog["avulso"])
+        self._SPECIALS = [k for k in self._ITEM_KEYS if k not in self._OPTIMIZABLE]
+        self._motor = motor
+        self._colunas_lp = _colunas_lp(catalog)
+        self._modelo: ModeloILP | None = None
+        self._modelo_lock = threading.Lock()
+
+    @property
+    def motor(self) -> MotorPrecos:
+        """Motor do catálogo: o que criou este otimizador ou o da versão atual."""
+        return self._motor or motor_precos(self.catalog)
 
     def optimize_order(
         self,
         items: Dict[str, int],
         solver_name: str | None = None
-    ) -> Tuple[float, Dict[str, Any], Dict[str, Any]]:
+    ) -> ResultadoOtimizacao:
         order = {k: int(items.get(k, 0)) for k in self._ITEM_KEYS}
         invalid = [k for k in items if k not in order]
         if invalid:
             raise ValueError(f"Itens desconhecidos: {invalid}")
 
-        self.log.info("Processando pedido: %s", order)
+        self.log.debug("Processando pedido: %s", order)
 
         # Validação de pedido vazio
         if all(qty == 0 for qty in order.values()):
             self.log.warning("Pedido vazio recebido")
-            return 0.0, {"itens_fixos": {}}, {}
+            return ResultadoOtimizacao(0.0, DetalhesPedido({}))
 
         fixed_cost = sum(
             order[item] * self.catalog["avulso"][item]
@@ -97,164 +690,1350 @@ class LaundryOptimizer:
 
         # Verificar se há itens para otimizar
         if qty["peca_variada"] == 0 and qty["camisa"] == 0:
-            self.log.info("Nenhum item otimizável necessário")
-            return fixed_cost, {"itens_fixos": {
+            self.log.debug("Nenhum item otimizável necessário")
+            return ResultadoOtimizacao(fixed_cost, DetalhesPedido({
                 k: v for k, v in order.items() 
                 if k in self._SPECIALS and v > 0
-            }}, {}
+            }))
 
-        # Calcular capacidade total disponível
-        total_capacity = sum(
-            p["capacidade"] * 10  # Considerar 10x a capacidade máxima
+        tabela = reducao = None
+        if solver_name in (None, SOLVER_TABELA):
+            motor = self.motor
+            tabela = motor.tabela(qty["peca_variada"], qty["camisa"])
+            if tabela is None:
+                # Acima da tabela: k x bloco a granel + resto (ver ReducaoBlocos)
+                reducao = motor.reducao()
+
+        if tabela is not None:
+            with span("optimize_order.tabela"):
+                packs_mistos, camisas_em_mistos, packs_camisas, avulsos = tabela.solucao(
+                    qty["peca_variada"], qty["camisa"]
+                )
+        elif reducao is not None:
+            with span("optimize_order.blocos"):
+                packs_mistos, camisas_em_mistos, packs_camisas, avulsos = reducao.solucao(
+                    qty["peca_variada"], qty["camisa"]
+                )
+        elif solver_name in (None, SOLVER_TABELA):
+            with span("optimize_order.ilp"):
+                packs_mistos, camisas_em_mistos, packs_camisas, avulsos = self._solve_pulp(
+                    qty, SOLVER_ILP_GRANDES
+                )
+        elif solver_name == SOLVER_NATIVO:
+            with span("optimize_order.nativo"):
+                packs_mistos, camisas_em_mistos, packs_camisas, avulsos = self._solve_native(qty)
+        elif solver_name == SOLVER_HEURISTICO:
+            with span("optimize_order.heuristico"):
+                packs_mistos, camisas_em_mistos, packs_camisas, avulsos = self._solve_heuristico(qty)
+        else:
+            packs_mistos, camisas_em_mistos, packs_camisas, avulsos = self._solve_pulp(qty, solver_name)
+
+        cost_mistos = sum(
+            p["preco"] * packs_mistos.get(p["tipo"], 0)
             for p in self.catalog["packs_mistos"]
         )
-        total_capacity += sum(
-            p["capacidade"] * 10
+        cost_camisas = sum(
+            p["preco"] * packs_camisas.get(p["tipo"], 0)
             for p in self.catalog["packs_camisas"]
         )
-        
-        # Verificar viabilidade
-        total_items = qty["peca_variada"] + qty["camisa"]
-        if total_items > total_capacity:
-            raise ValueError(f"Pedido muito grande ({total_items} itens). Capacidade máxima: {total_capacity}")
+        cost_avulso = (
+            self.catalog["avulso"]["peca_variada"] * avulsos["peca_variada"] +
+            self.catalog["avulso"]["camisa"] * avulsos["camisa"]
+        )
 
-        prob = LpProblem("Minimizar_Custo_Lavanderia", LpMinimize)
+        var_cost = cost_mistos + cost_camisas + cost_avulso
+        total_cost = round(fixed_cost + var_cost, 2)
 
-        # Variáveis de decisão
-        x = {
-            p["tipo"]: LpVariable(f"pack_misto_{p['tipo']}", 0, cat=LpInteger)
-            for p in self.catalog["packs_mistos"]
-        }
-        s = {
-            p["tipo"]: LpVariable(f"camisas_no_misto_{p['tipo']}", 0, cat=LpInteger)
-            for p in self.catalog["packs_mistos"]
-        }
-        y = {
-            p["tipo"]: LpVariable(f"pack_camisa_{p['tipo']}", 0, cat=LpInteger)
-            for p in self.catalog["packs_camisas"]
-        }
-        a_var = LpVariable("pecas_variadas_avulsas", 0, cat=LpInteger)
-        a_cam = LpVariable("camisas_avulsas", 0, cat=LpInteger)
+        # Os solvers devolvem inteiros nativos: não há conversões posteriores
+        detalhes = DetalhesPedido(
+            itens_fixos={k: order[k] for k in self._SPECIALS if order[k] > 0},
+            packs_mistos=packs_mistos,
+            packs_camisas=packs_camisas,
+            itens_avulsos=avulsos,
+            camisas_em_packs_mistos=camisas_em_mistos,
+            detalhe_custos=DetalheCustos(
+                fixed_cost, cost_mistos, cost_camisas, cost_avulso, var_cost, total_cost
+            ),
+        )
+        if solver_name != SOLVER_HEURISTICO:
+            return ResultadoOtimizacao(total_cost, detalhes, self.catalog)
 
-        cost_mistos = lpSum(p["preco"] * x[p["tipo"]] for p in self.catalog["packs_mistos"])
-        cost_camisas = lpSum(p["preco"] * y[p["tipo"]] for p in self.catalog["packs_camisas"])
-        
-        cost_avulso = (
-            self.catalog["avulso"]["peca_variada"] * a_var +
-            self.catalog["avulso"]["camisa"] * a_cam
+        # O ótimo inteiro é um número inteiro de cêntimos >= relaxação linear
+        lp, _ = _relaxacao_lp(self._colunas_lp, qty["peca_variada"], qty["camisa"])
+        limite = round(fixed_cost + math.ceil(lp - 1e-6) / 100, 2)
+        # Se a solução atinge o limite, está provada ótima
+        return ResultadoOtimizacao(
+            total_cost, detalhes, self.catalog, total_cost <= limite + 0.005, limite
         )
 
-        prob += cost_mistos + cost_camisas + cost_avulso
+    def reoptimize_order(
+        self,
+        items: Dict[str, int],
+        anterior: ResultadoOtimizacao | None,
+        delta: Dict[str, int],
+        solver_name: str | None = None
+    ) -> Tuple[Dict[str, int], ResultadoOtimizacao]:
+        """
+        Re-otimiza um pedido já resolvido (``items`` -> ``anterior``) após a
+        alteração ``delta`` (ex.: ``{"camisa": 2, "blazer": -1}``). Devolve o
+        pedido novo e o seu resultado ótimo.
 
-        # Limite de camisas nos packs mistos
-        for p in self.catalog["packs_mistos"]:
-            prob += s[p["tipo"]] <= p["limite_camisas"] * x[p["tipo"]]
-            prob += s[p["tipo"]] >= 0
+        Os itens de preço fixo são independentes dos packs: se o delta só lhes
+        toca, a composição anterior continua ótima e apenas os custos fixos
+        mudam, sem passar pelo solver. Caso contrário (ou sem ``anterior``,
+        ex.: catálogo alterado entretanto) o pedido novo é resolvido.
+        """
+        novo = {k: int(items.get(k, 0)) for k in self._ITEM_KEYS}
+        invalid = [k for k in [*items, *delta] if k not in novo]
+        if invalid:
+            raise ValueError(f"Itens desconhecidos: {invalid}")
+        delta = {k: int(q) for k, q in delta.items() if int(q) != 0}
+        for k, q in delta.items():
+            novo[k] += q
+            if novo[k] < 0:
+                raise ValueError(f"Quantidade negativa para '{k}': {novo[k]}")
 
-        # Cobertura de camisas
-        prob += (
-            lpSum(s.values()) + 
-            lpSum(p["capacidade"] * y[p["tipo"]] for p in self.catalog["packs_camisas"]) + 
-            a_cam >= qty["camisa"]
+        if (
+            anterior is None
+            or any(k in delta for k in self._OPTIMIZABLE)
+            or not any(novo.values())
+        ):
+            return novo, self.optimize_order(novo, solver_name)
+
+        with span("optimize_order.fixos"):
+            variacao = sum(q * self.catalog["avulso"][k] for k, q in delta.items())
+            itens_fixos = {k: novo[k] for k in self._SPECIALS if novo[k] > 0}
+            d = anterior.detalhes
+            if d.detalhe_custos is None:
+                custo = round(anterior.custo_total + variacao, 2)
+                return novo, ResultadoOtimizacao(custo, DetalhesPedido(itens_fixos))
+
+            c = d.detalhe_custos
+            fixed_cost = c.custos_fixos + variacao
+            total_cost = round(fixed_cost + c.total_variavel, 2)
+            detalhes = DetalhesPedido(
+                itens_fixos=itens_fixos,
+                packs_mistos=d.packs_mistos,
+                packs_camisas=d.packs_camisas,
+                itens_avulsos=d.itens_avulsos,
+                camisas_em_packs_mistos=d.camisas_em_packs_mistos,
+                detalhe_custos=DetalheCustos(
+                    fixed_cost, c.packs_mistos, c.packs_camisas, c.itens_avulsos,
+                    c.total_variavel, total_cost
+                ),
+            )
+        return novo, ResultadoOtimizacao(total_cost, detalhes, self.catalog)
+
+    # ------------------------------------------------------------------ #
+    #  SOLVER NATIVO (enumeração limitada, exato)
+    # ------------------------------------------------------------------ #
+    def _solve_native(self, qty: Dict[str, int]) -> _SolucaoPacks:
+        """
+        Resolve o mesmo problema do ILP sem PuLP/CBC.
+
+        Enumera as quantidades de packs mistos (podadas pelo melhor custo
+        encontrado) e, para cada combinação, resolve o resto em O(1):
+        a cobertura das camisas por packs de camisas + avulsas é uma mochila
+        1-D pré-calculada (``h``) e a escolha de quantas camisas colocar nos
+        mistos reduz-se a um mínimo num intervalo de ``h[j] - pv * j``.
+        Todos os custos são calculados em cêntimos para evitar empates
+        falsos de vírgula flutuante.
+        """
+        P, C = qty["peca_variada"], qty["camisa"]
+        pv = _cents(self.catalog["avulso"]["peca_variada"])
+        pc = _cents(self.catalog["avulso"]["camisa"])
+        mistos = sorted(
+            self.catalog["packs_mistos"],
+            key=lambda p: p["preco"] / p["capacidade"]
         )
+        camisas = self.catalog["packs_camisas"]
 
-        # Cobertura de peças variadas
-        prob += (
-            lpSum(
-                (p["capacidade"] * x[p["tipo"]]) - s[p["tipo"]] 
-                for p in self.catalog["packs_mistos"]
-            ) + a_var >= qty["peca_variada"]
+        # h[j]: custo mínimo para cobrir j camisas só com packs de camisas e avulsas
+        h, escolha = _mochila_camisas(camisas, pc, C)
+        psi = [h[j] - pv * j for j in range(C + 1)]
+
+        # Limite superior inicial: tudo avulso / packs de camisas
+        melhor = [pv * P + h[C], (0,) * len(mistos), C]
+        precos = [_cents(p["preco"]) for p in mistos]
+
+        folga = _folga_mistos(mistos, pc)
+
+        # Limite inferior para os itens ainda não cobertos: nenhum custa menos
+        # do que a melhor tarifa por peça das opções ainda disponíveis
+        tarifa_fora = min(
+            [pv, pc] + [_cents(p["preco"]) / p["capacidade"] for p in camisas]
         )
+        tarifa_min = [
+            min([tarifa_fora] + [precos[k] / mistos[k]["capacidade"]
+                                 for k in range(i, len(mistos))])
+            for i in range(len(mistos) + 1)
+        ]
 
-        status = prob.solve(solver_name)
-        if LpStatus[status] != "Optimal":
-            raise RuntimeError(f"Erro no solver: {LpStatus[status]}")
+        def avaliar(contagens, custo, T, L):
+            s_max = min(L, C)
+            if T - P >= s_max:
+                j = C - s_max
+                resto = h[j]
+            else:
+                lo, hi = C - s_max, C - max(0, T - P)
+                janela = psi[lo:hi + 1]
+                j = lo + janela.index(min(janela))
+                resto = psi[j] + pv * (P - T + C)
+            if custo + resto < melhor[0]:
+                melhor[:] = [custo + resto, contagens, j]
 
-        # Verificar valores inválidos do solver
-        if any(var.value() is None for var in prob.variables()):
-            self.log.error("Solver retornou valores inválidos")
-            raise RuntimeError("Solução inválida do solver")
+        def enumerar(i, contagens, custo, T, L):
+            if i == len(mistos):
+                avaliar(contagens, custo, T, L)
+                return
+            p, n = mistos[i], 0
+            while custo + n * precos[i] < melhor[0]:
+                T_n = T + n * p["capacidade"]
+                L_n = L + n * p["limite_camisas"]
+                if T_n - min(L_n, C) >= P + folga:
+                    break
+                custo_n = custo + n * precos[i]
+                if custo_n + tarifa_min[i + 1] * max(0, P + C - T_n) < melhor[0]:
+                    enumerar(i + 1, contagens + (n,), custo_n, T_n, L_n)
+                n += 1
+
+        enumerar(0, (), 0, 0, 0)
+        _, contagens, j = melhor
+
+        # Reconstruir a solução a partir das escolhas
+        packs_mistos = {p["tipo"]: n for p, n in zip(mistos, contagens) if n > 0}
+        T = sum(p["capacidade"] * n for p, n in zip(mistos, contagens))
+        S = C - j
+        camisas_em_mistos = _distribuir_camisas(self.catalog["packs_mistos"], packs_mistos, S)
+
+        packs_camisas = {}
+        a_cam = 0
+        while j > 0:
+            k = escolha[j]
+            if k < 0:
+                a_cam += 1
+                j -= 1
+            else:
+                tipo = camisas[k]["tipo"]
+                packs_camisas[tipo] = packs_camisas.get(tipo, 0) + 1
+                j = max(0, j - camisas[k]["capacidade"])
 
-        packs_mistos = {k: int(v.value()) for k, v in x.items() if v.value() > 0}
-        packs_camisas = {k: int(v.value()) for k, v in y.items() if v.value() > 0}
-        
         avulsos = {
-            "peca_variada": int(a_var.value()),
-            "camisa": int(a_cam.value()),
+            "peca_variada": max(0, P - (T - S)),
+            "camisa": a_cam,
+        }
+        packs_mistos = {
+            p["tipo"]: packs_mistos[p["tipo"]]
+            for p in self.catalog["packs_mistos"] if p["tipo"] in packs_mistos
         }
+        packs_camisas = {
+            p["tipo"]: packs_camisas[p["tipo"]]
+            for p in camisas if p["tipo"] in packs_camisas
+        }
+        return packs_mistos, camisas_em_mistos, packs_camisas, avulsos
 
-        camisas_em_mistos = {k: int(v.value()) for k, v in s.items() if v.value() > 0}
+    # ------------------------------------------------------------------ #
+    #  HEURÍSTICA (ARREDONDAMENTO DA RELAXAÇÃO LINEAR)
+    # ------------------------------------------------------------------ #
+    def _solve_heuristico(self, qty: Dict[str, int]) -> _SolucaoPacks:
+        """
+        Solução em tempo limitado, seja qual for o tamanho do pedido: as
+        colunas da relaxação linear arredondadas para baixo e o resto (menor
+        do que duas colunas) resolvido exatamente pelo solver nativo. Fica a
+        menos de um pack de cada coluna da base do ótimo.
+        """
+        _, base = _relaxacao_lp(self._colunas_lp, qty["peca_variada"], qty["camisa"])
+        contagens: Dict[str, Dict[str, int]] = {"packs_mistos": {}, "packs_camisas": {}, "avulso": {}}
+        S = 0
+        pecas, camisas = qty["peca_variada"], qty["camisa"]
+        for col, lam in base:
+            k = int(lam + 1e-9)
+            if k == 0:
+                continue
+            contagens[col.grupo][col.chave] = contagens[col.grupo].get(col.chave, 0) + k
+            if col.grupo == "packs_mistos":
+                S += k * col.camisas
+            pecas -= k * col.pecas
+            camisas -= k * col.camisas
 
-        var_cost = prob.objective.value()
-        total_cost = round(fixed_cost + var_cost, 2)
+        resto = self._solve_native({"peca_variada": max(0, pecas), "camisa": max(0, camisas)})
+        packs_mistos_r, camisas_em_mistos_r, packs_camisas_r, avulsos_r = resto
+        for tipo, n in packs_mistos_r.items():
+            contagens["packs_mistos"][tipo] = contagens["packs_mistos"].get(tipo, 0) + n
+        for tipo, n in packs_camisas_r.items():
+            contagens["packs_camisas"][tipo] = contagens["packs_camisas"].get(tipo, 0) + n
+        S += sum(camisas_em_mistos_r.values())
+
+        packs_mistos = {
+            p["tipo"]: contagens["packs_mistos"][p["tipo"]]
+            for p in self.catalog["packs_mistos"] if p["tipo"] in contagens["packs_mistos"]
+        }
+        packs_camisas = {
+            p["tipo"]: contagens["packs_camisas"][p["tipo"]]
+            for p in self.catalog["packs_camisas"] if p["tipo"] in contagens["packs_camisas"]
+        }
+        avulsos = {
+            k: avulsos_r[k] + contagens["avulso"].get(k, 0) for k in ("peca_variada", "camisa")
+        }
+        camisas_em_mistos = _distribuir_camisas(self.catalog["packs_mistos"], packs_mistos, S)
+        return packs_mistos, camisas_em_mistos, packs_camisas, avulsos
+
+    # ------------------------------------------------------------------ #
+    #  SOLVER ILP (PuLP + CBC)
+    # ------------------------------------------------------------------ #
+    def _solve_pulp(self, qty: Dict[str, int], solver_name: str) -> _SolucaoPacks:
+        """Modelo ILP compilado uma vez por catálogo; só os RHS mudam por pedido."""
+        versao = catalog_version(self.catalog)
+        # O modelo é mutável (RHS): um solve de cada vez por otimizador
+        with self._modelo_lock:
+            if self._modelo is None or self._modelo.versao != versao:
+                with span("optimize_order.modelo"):
+                    self._modelo = ModeloILP(self.catalog, versao, self.log)
+            return self._modelo.resolver(qty, solver_name)
+
+    # ------------------------------------------------------------------ #
+    #  LOTES
+    # ------------------------------------------------------------------ #
+    def optimize_batch(
+        self,
+        orders: List[Dict[str, int]],
+        solver_name: str | None = None
+    ) -> List[ResultadoOtimizacao | Exception]:
+        """
+        Otimiza vários pedidos de uma vez, devolvendo os resultados pela
+        ordem de entrada. Pedidos repetidos são resolvidos uma só vez e a
+        tabela de custos é alargada uma única vez para o maior pedido do
+        lote. Erros de um pedido são devolvidos no seu lugar (como exceção)
+        sem interromper os restantes.
+        """
+        resultados: List[Any] = [None] * len(orders)
+        unicos: Dict[Tuple[int, ...], List[int]] = {}
+        for i, items in enumerate(orders):
+            try:
+                invalid = [k for k in items if k not in self.catalog["avulso"]]
+                if invalid:
+                    raise ValueError(f"Itens desconhecidos: {invalid}")
+                chave = tuple(int(items.get(k, 0)) for k in self._ITEM_KEYS)
+            except (AttributeError, TypeError, ValueError) as e:
+                resultados[i] = e if isinstance(e, ValueError) else ValueError(
+                    f"Pedido inválido: {e}"
+                )
+                continue
+            unicos.setdefault(chave, []).append(i)
+
+        if unicos and solver_name in (None, SOLVER_TABELA):
+            i_pecas = self._ITEM_KEYS.index("peca_variada")
+            i_camisas = self._ITEM_KEYS.index("camisa")
+            self.motor.tabela(
+                max(chave[i_pecas] for chave in unicos),
+                max(chave[i_camisas] for chave in unicos),
+            )
+
+        for chave, indices in unicos.items():
+            try:
+                resultado = self.optimize_order(dict(zip(self._ITEM_KEYS, chave)), solver_name)
+            except (ValueError, RuntimeError) as e:
+                resultado = e
+            for i in indices:
+                resultados[i] = resultado
+        return resultados
+
+    # ------------------------------------------------------------------ #
+    #  CURVA DE PREÇOS
+    # ------------------------------------------------------------------ #
+    def price_curve(self, pecas: Tuple[int, int], camisas: Tuple[int, int]) -> CurvaPrecos:
+        """
+        Custo ótimo e mistura de packs em todos os pontos do retângulo
+        ``pecas[0]..pecas[1]`` x ``camisas[0]..camisas[1]`` (inclusive), de
+        uma só vez: uma fatia da tabela de custos (que cresce se for preciso)
+        ou, acima dela, a redução por blocos aplicada à grelha inteira. Só
+        se o catálogo não tiver redução se resolve ponto a ponto.
+        """
+        import numpy as np
+
+        (p0, p1), (c0, c1) = pecas, camisas
+        if min(p0, c0) < 0 or p0 > p1 or c0 > c1:
+            raise ValueError(f"Intervalos inválidos: peças {pecas}, camisas {camisas}")
+        pontos = (p1 - p0 + 1) * (c1 - c0 + 1)
+        if pontos > CURVA_MAX_PONTOS:
+            raise ValueError(f"Curva demasiado grande ({pontos} pontos). Máximo: {CURVA_MAX_PONTOS}")
+
+        motor = self.motor
+        tabela = motor.tabela(p1, c1)
+        if tabela is not None:
+            with span("price_curve.tabela"):
+                fatia = np.s_[p0:p1 + 1, c0:c1 + 1]
+                custo, mistos, packs_camisas = (
+                    tabela.custo[fatia], tabela.mistos[fatia], tabela.camisas[fatia]
+                )
+        elif (reducao := motor.reducao()) is not None:
+            with span("price_curve.blocos"):
+                custo, mistos, packs_camisas = reducao.grelha(
+                    np.arange(p0, p1 + 1)[:, None], np.arange(c0, c1 + 1)[None, :]
+                )
+        else:
+            with span("price_curve.ilp"):
+                forma = (p1 - p0 + 1, c1 - c0 + 1)
+                custo = np.zeros(forma, dtype=np.int64)
+                mistos = np.zeros(forma + (len(self.catalog["packs_mistos"]),), dtype=np.int64)
+                packs_camisas = np.zeros(forma + (len(self.catalog["packs_camisas"]),), dtype=np.int64)
+                for i, j in np.ndindex(forma):
+                    resultado = self.optimize_order({"peca_variada": p0 + i, "camisa": c0 + j})
+                    custo[i, j] = _cents(resultado.custo_total)
+                    d = resultado.detalhes
+                    mistos[i, j] = [
+                        (d.packs_mistos or {}).get(p["tipo"], 0) for p in self.catalog["packs_mistos"]
+                    ]
+                    packs_camisas[i, j] = [
+                        (d.packs_camisas or {}).get(p["tipo"], 0) for p in self.catalog["packs_camisas"]
+                    ]
+        return CurvaPrecos((p0, p1), (c0, c1), custo, mistos, packs_camisas, self.catalog)
+
+# --------------------------------------------------------------------------- #
+#  TABELA PRÉ-CALCULADA DE CUSTOS ÓTIMOS
+# --------------------------------------------------------------------------- #
+TABELA_PECAS = int(os.environ.get("LAUNDRY_TABELA_PECAS", 200))
+TABELA_CAMISAS = int(os.environ.get("LAUNDRY_TABELA_CAMISAS", 100))
+# Crescimento preguiçoso até este limite; acima dele usa-se ReducaoBlocos
+TABELA_PECAS_MAX = int(os.environ.get("LAUNDRY_TABELA_PECAS_MAX", 400))
+TABELA_CAMISAS_MAX = int(os.environ.get("LAUNDRY_TABELA_CAMISAS_MAX", 200))
+TABELA_PATH = os.environ.get("LAUNDRY_TABELA_PATH")
+# Versão do formato de ``TabelaCustos.exportar`` (muda se o formato mudar)
+FORMATO_TABELA_PRECOS = 1
+
+
+def catalog_version(catalog: dict) -> str:
+    """Hash estável do conteúdo do catálogo (muda com qualquer preço ou pack)."""
+    conteudo = json.dumps(catalog, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
+
+class TabelaCustos:
+    """
+    Custo ótimo e mistura de packs para todos os pares (peca_variada, camisa)
+    até ``max_pecas`` x ``max_camisas``, calculados de uma só vez com NumPy.
+
+    Guarda arrays compactos: ``custo`` (cêntimos), contagens de cada pack
+    misto e de camisas, camisas colocadas nos mistos e camisas avulsas.
+    As peças variadas avulsas deduzem-se das restantes.
+    """
+
+    def __init__(self, catalog: dict, versao: str, arrays: Dict[str, np.ndarray]):
+        self.catalog = catalog
+        self.versao = versao
+        self.custo = arrays["custo"]
+        self.mistos = arrays["mistos"]
+        self.camisas = arrays["camisas"]
+        self.camisas_em_mistos = arrays["camisas_em_mistos"]
+        self.camisas_avulsas = arrays["camisas_avulsas"]
+        self.max_pecas = self.custo.shape[0] - 1
+        self.max_camisas = self.custo.shape[1] - 1
+
+    @classmethod
+    def construir(cls, catalog: dict, max_pecas: int, max_camisas: int) -> "TabelaCustos":
+        """Resolve a grelha inteira: uma passagem vetorizada por combinação de mistos."""
+        import numpy as np
+
+        pv = _cents(catalog["avulso"]["peca_variada"])
+        pc = _cents(catalog["avulso"]["camisa"])
+        mistos = catalog["packs_mistos"]
+        camisas = catalog["packs_camisas"]
+        n = max_camisas + 1
+
+        h_lista, escolha = _mochila_camisas(camisas, pc, max_camisas)
+        h = np.array(h_lista, dtype=np.int64)
+        j_idx = np.arange(n, dtype=np.int64)
+        # Mínimo em intervalo de psi[j] = h[j] - pv*j, com o índice codificado
+        # na chave (psi*n + j) para recuperar o argmin junto com o valor
+        chave = (h - pv * j_idx) * n + j_idx
+        rmq = np.zeros((n, n), dtype=np.int64)
+        for lo in range(n):
+            rmq[lo, lo:] = np.minimum.accumulate(chave[lo:])
+
+        # Decomposição de j camisas fora dos mistos em packs de camisas + avulsas
+        camisas_j = np.zeros((n, len(camisas)), dtype=np.uint16)
+        avulsas_j = np.zeros(n, dtype=np.uint16)
+        for j in range(1, n):
+            k = escolha[j]
+            if k < 0:
+                camisas_j[j] = camisas_j[j - 1]
+                avulsas_j[j] = avulsas_j[j - 1] + 1
+            else:
+                anterior = max(0, j - camisas[k]["capacidade"])
+                camisas_j[j] = camisas_j[anterior]
+                camisas_j[j, k] += 1
+                avulsas_j[j] = avulsas_j[anterior]
+
+        # Combinações de packs mistos que podem ser ótimas nalguma célula
+        folga = _folga_mistos(mistos, pc)
+        teto = pv * max_pecas + int(h[max_camisas])
+        combos = []
+
+        def enumerar(i, contagens, custo, T, L):
+            if i == len(mistos):
+                combos.append((contagens, custo, T, L))
+                return
+            p, k = mistos[i], 0
+            while custo + k * _cents(p["preco"]) <= teto:
+                T_k = T + k * p["capacidade"]
+                L_k = L + k * p["limite_camisas"]
+                if T_k - min(L_k, max_camisas) >= max_pecas + folga:
+                    break
+                enumerar(i + 1, contagens + (k,), custo + k * _cents(p["preco"]), T_k, L_k)
+                k += 1
+
+        enumerar(0, (), 0, 0, 0)
+
+        P = np.arange(max_pecas + 1, dtype=np.int64)[:, None]
+        C = j_idx[None, :]
+        melhor = np.full((max_pecas + 1, n), np.iinfo(np.int64).max, dtype=np.int64)
+        melhor_combo = np.zeros(melhor.shape, dtype=np.int32)
+        melhor_j = np.zeros(melhor.shape, dtype=np.int64)
+
+        for idx, (_, custo, T, L) in enumerate(combos):
+            s_max = np.minimum(L, C)
+            sobra = T - P
+            cheio = sobra >= s_max
+            lo = np.broadcast_to(C - s_max, melhor.shape)
+            hi = np.maximum(C - np.maximum(sobra, 0), lo)
+            k = rmq[lo, hi]
+            j = np.where(cheio, lo, k % n)
+            total = custo + np.where(cheio, h[lo], k // n + pv * (P - T + C))
+            melhorou = total < melhor
+            melhor[melhorou] = total[melhorou]
+            melhor_combo[melhorou] = idx
+            melhor_j[melhorou] = j[melhorou]
+
+        contagens = np.array([c[0] for c in combos], dtype=np.uint16).reshape(len(combos), len(mistos))
+        arrays = {
+            "custo": melhor.astype(np.int32),
+            "mistos": contagens[melhor_combo],
+            "camisas": camisas_j[melhor_j],
+            "camisas_em_mistos": (C - melhor_j).astype(np.uint16),
+            "camisas_avulsas": avulsas_j[melhor_j],
+        }
+        return cls(catalog, catalog_version(catalog), arrays)
+
+    def cobre(self, pecas: int, camisas: int) -> bool:
+        return pecas <= self.max_pecas and camisas <= self.max_camisas
+
+    def custo_euros(self, pecas: int, camisas: int) -> float:
+        return int(self.custo[pecas, camisas]) / 100
+
+    def solucao(self, pecas: int, camisas: int) -> _SolucaoPacks:
+        """Lê a solução ótima de uma célula no formato dos solvers."""
+        mistos = self.mistos[pecas, camisas]
+        packs_mistos = {
+            p["tipo"]: int(n) for p, n in zip(self.catalog["packs_mistos"], mistos) if n > 0
+        }
+        packs_camisas = {
+            p["tipo"]: int(n)
+            for p, n in zip(self.catalog["packs_camisas"], self.camisas[pecas, camisas]) if n > 0
+        }
+        S = int(self.camisas_em_mistos[pecas, camisas])
+        T = sum(p["capacidade"] * n for p, n in zip(self.catalog["packs_mistos"], mistos.tolist()))
+        camisas_em_mistos = _distribuir_camisas(self.catalog["packs_mistos"], packs_mistos, S)
+        avulsos = {
+            "peca_variada": max(0, pecas - (T - S)),
+            "camisa": int(self.camisas_avulsas[pecas, camisas]),
+        }
+        return packs_mistos, camisas_em_mistos, packs_camisas, avulsos
+
+    # ------------------------------------------------------------------ #
+    #  SERIALIZAÇÃO
+    # ------------------------------------------------------------------ #
+    def exportar(self, max_pecas: int, max_camisas: int) -> Dict[str, Any]:
+        """
+        Tabela de preços para clientes sem servidor (ex.: o front end offline),
+        em JSON: preços do catálogo e, para cada par (peças, camisas) até aos
+        limites, o que ``solucao`` lê, em listas planas indexadas por
+        ``peças * (max_camisas + 1) + camisas``. Custos, peças avulsas e
+        camisas por pack misto calculam-se como em ``solucao`` e
+        ``optimize_order`` (formato em ``FORMATO_TABELA_PRECOS``).
+        """
+        if not self.cobre(max_pecas, max_camisas):
+            raise ValueError(
+                f"Tabela {self.max_pecas}x{self.max_camisas} não cobre {max_pecas}x{max_camisas}"
+            )
+        janela = (slice(0, max_pecas + 1), slice(0, max_camisas + 1))
+        mistos = self.catalog["packs_mistos"]
+        camisas = self.catalog["packs_camisas"]
+        return {
+            "formato": FORMATO_TABELA_PRECOS,
+            "catalogo": self.versao,
+            "max_pecas": max_pecas,
+            "max_camisas": max_camisas,
+            "precos": dict(self.catalog["avulso"]),
+            "packs_mistos": [dict(p) for p in mistos],
+            "packs_camisas": [dict(p) for p in camisas],
+            "mistos": {
+                p["tipo"]: self.mistos[janela][:, :, k].ravel().tolist() for k, p in enumerate(mistos)
+            },
+            "camisas": {
+                p["tipo"]: self.camisas[janela][:, :, k].ravel().tolist() for k, p in enumerate(camisas)
+            },
+            "camisas_em_mistos": self.camisas_em_mistos[janela].ravel().tolist(),
+            "camisas_avulsas": self.camisas_avulsas[janela].ravel().tolist(),
+        }
+
+    def guardar(self, path: str) -> None:
+        """Grava a tabela em ``.npz`` (comprimido) com a versão do catálogo."""
+        import numpy as np
+
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                versao=np.array(self.versao),
+                custo=self.custo,
+                mistos=self.mistos,
+                camisas=self.camisas,
+                camisas_em_mistos=self.camisas_em_mistos,
+                camisas_avulsas=self.camisas_avulsas,
+            )
+
+    @classmethod
+    def carregar(cls, path: str, catalog: dict) -> "TabelaCustos | None":
+        """Carrega uma tabela do disco; devolve None se for de outro catálogo."""
+        import numpy as np
+
+        try:
+            with np.load(path) as dados:
+                if str(dados["versao"]) != catalog_version(catalog):
+                    return None
+                arrays = {k: dados[k] for k in dados.files if k != "versao"}
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(catalog, catalog_version(catalog), arrays)
+
+
+def obter_tabela(catalog: dict = CATALOG, pecas: int = 0, camisas: int = 0) -> TabelaCustos | None:
+    """Tabela do catálogo que cobre o pedido (ver ``MotorPrecos.tabela``)."""
+    return motor_precos(catalog).tabela(pecas, camisas)
+
+# --------------------------------------------------------------------------- #
+#  PEDIDOS GRANDES (BLOCOS PERIÓDICOS)
+# --------------------------------------------------------------------------- #
+# Margem máxima (em blocos) tentada na verificação da periodicidade
+MARGEM_BLOCOS_MAX = 3
+
+
+class _Bloco:
+    """Unidade repetível de uma solução a granel: o que cobre e onde conta."""
+    __slots__ = ("pecas", "camisas", "preco", "grupo", "chave")
+
+    def __init__(self, pecas: int, camisas: int, preco: int, grupo: str, chave: str):
+        self.pecas = pecas
+        self.camisas = camisas
+        self.preco = preco  # cêntimos
+        self.grupo = grupo  # packs_mistos | packs_camisas | avulso
+        self.chave = chave
+
+
+def _blocos_granel(catalog: dict) -> List[_Bloco]:
+    """
+    Blocos por ordem angular no plano (peças, camisas): só peças, o pack
+    misto mais barato por peça cheio de camisas até ao limite, e só camisas.
+    """
+    pv = _cents(catalog["avulso"]["peca_variada"])
+    pc = _cents(catalog["avulso"]["camisa"])
+    misto = min(
+        catalog["packs_mistos"],
+        key=lambda p: (_cents(p["preco"]) / p["capacidade"], -p["capacidade"]),
+        default=None
+    )
+    blocos = []
+    if misto is not None and _cents(misto["preco"]) < pv * misto["capacidade"]:
+        blocos.append(_Bloco(misto["capacidade"], 0, _cents(misto["preco"]), "packs_mistos", misto["tipo"]))
+    else:
+        blocos.append(_Bloco(1, 0, pv, "avulso", "peca_variada"))
+    if misto is not None and 0 < misto["limite_camisas"] < misto["capacidade"]:
+        blocos.append(_Bloco(
+            misto["capacidade"] - misto["limite_camisas"], misto["limite_camisas"],
+            _cents(misto["preco"]), "packs_mistos", misto["tipo"]
+        ))
+    camisas = min(
+        catalog["packs_camisas"],
+        key=lambda p: (_cents(p["preco"]) / p["capacidade"], -p["capacidade"]),
+        default=None
+    )
+    if camisas is not None and _cents(camisas["preco"]) < pc * camisas["capacidade"]:
+        blocos.append(_Bloco(0, camisas["capacidade"], _cents(camisas["preco"]), "packs_camisas", camisas["tipo"]))
+    else:
+        blocos.append(_Bloco(0, 1, pc, "avulso", "camisa"))
+    return blocos
+
+
+class ReducaoBlocos:
+    """
+    Pedidos acima da tabela resolvidos como "k x bloco a granel + resto".
+
+    Para pedidos grandes a mistura ótima é periódica (como na mochila de
+    Gilmore-Gomory): repete o pack misto mais barato por peça (só com peças,
+    ou com camisas até ao limite) e o pack de camisas mais barato. Os blocos
+    dividem o plano (peças, camisas) em cones; dentro do cone entre dois
+    blocos consecutivos X e Y, acrescentar X a um pedido cuja coordenada em
+    X já é >= ``margem`` soma exatamente o preço de X ao custo ótimo.
+
+    Essa identidade é verificada em toda a tabela exata, para cada bloco e
+    cone, com a menor margem que a satisfaz. Um pedido reduz-se então a
+    ``k_X x X + k_Y x Y + resto``, com o resto a menos de ``margem + 1``
+    blocos de cada eixo do cone e portanto dentro da tabela: custo constante,
+    seja qual for o tamanho do pedido.
+    """
+
+    def __init__(self, tabela: TabelaCustos, blocos: List[_Bloco], margem: int):
+        self.tabela = tabela
+        self.blocos = blocos
+        self.margem = margem
+        self.cones = list(zip(blocos, blocos[1:]))
+
+    @staticmethod
+    def _coordenadas(X: _Bloco, Y: _Bloco, pecas, camisas):
+        """Coordenadas (a, b) de (peças, camisas) = a*X + b*Y, escaladas por ``det``."""
+        det = X.pecas * Y.camisas - X.camisas * Y.pecas
+        a = pecas * Y.camisas - camisas * Y.pecas
+        b = X.pecas * camisas - X.camisas * pecas
+        return a, b, det
+
+    @classmethod
+    def construir(cls, tabela: TabelaCustos) -> "ReducaoBlocos | None":
+        """Verifica a periodicidade na tabela; None se não se verificar."""
+        import numpy as np
+
+        blocos = _blocos_granel(tabela.catalog)
+        pecas = np.arange(tabela.max_pecas + 1)[:, None]
+        camisas = np.arange(tabela.max_camisas + 1)[None, :]
+        custo = tabela.custo
+        for margem in range(MARGEM_BLOCOS_MAX + 1):
+            # O resto (e um bloco acima dele) tem de caber na tabela
+            if any(
+                (margem + 2) * (X.pecas + Y.pecas) > tabela.max_pecas
+                or (margem + 2) * (X.camisas + Y.camisas) > tabela.max_camisas
+                for X, Y in zip(blocos, blocos[1:])
+            ):
+                return None
+            valida = True
+            for X, Y in zip(blocos, blocos[1:]):
+                a, b, det = cls._coordenadas(X, Y, pecas, camisas)
+                no_cone = (a >= 0) & (b >= 0)
+                for bloco, coordenada in ((X, a), (Y, b)):
+                    dp, dc = bloco.pecas, bloco.camisas
+                    np_, nc = custo.shape
+                    mascara = (no_cone & (coordenada >= margem * det))[:np_ - dp, :nc - dc]
+                    periodico = custo[dp:, dc:] == custo[:np_ - dp, :nc - dc] + bloco.preco
+                    if not periodico[mascara].all():
+                        valida = False
+                        break
+                if not valida:
+                    break
+            if valida:
+                return cls(tabela, blocos, margem)
+        return None
+
+    def decompor(self, pecas: int, camisas: int) -> Tuple[List[Tuple[_Bloco, int]], int, int]:
+        """Blocos a granel (com multiplicidade) e o resto a resolver na tabela."""
+        for X, Y in self.cones:
+            a, b, det = self._coordenadas(X, Y, pecas, camisas)
+            if a >= 0 and b >= 0:
+                k_x = max(0, a // det - self.margem)
+                k_y = max(0, b // det - self.margem)
+                return (
+                    [(X, k_x), (Y, k_y)],
+                    pecas - k_x * X.pecas - k_y * Y.pecas,
+                    camisas - k_x * X.camisas - k_y * Y.camisas,
+                )
+        # Inalcançável: o primeiro bloco é só de peças e o último só de camisas
+        raise ValueError(f"Pedido fora dos cones: {pecas} peças, {camisas} camisas")
+
+    def grelha(self, pecas: np.ndarray, camisas: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        ``decompor`` vetorizado para uma grelha de pedidos (arrays que fazem
+        broadcast): custo ótimo (cêntimos) e contagens de packs mistos e de
+        camisas em cada ponto, lidos da tabela no resto e somados aos blocos.
+        """
+        import numpy as np
+
+        t = self.tabela
+        catalog = t.catalog
+        P, C = (np.asarray(x, dtype=np.int64) for x in np.broadcast_arrays(pecas, camisas))
+        custo = np.zeros(P.shape, dtype=np.int64)
+        mistos = np.zeros(P.shape + (len(catalog["packs_mistos"]),), dtype=np.int64)
+        packs_camisas = np.zeros(P.shape + (len(catalog["packs_camisas"]),), dtype=np.int64)
+        indices = {
+            "packs_mistos": {p["tipo"]: k for k, p in enumerate(catalog["packs_mistos"])},
+            "packs_camisas": {p["tipo"]: k for k, p in enumerate(catalog["packs_camisas"])},
+        }
+        livre = np.ones(P.shape, dtype=bool)
+        for X, Y in self.cones:
+            a, b, det = self._coordenadas(X, Y, P, C)
+            cone = livre & (a >= 0) & (b >= 0)
+            livre &= ~cone
+            k_x = np.maximum(0, a[cone] // det - self.margem)
+            k_y = np.maximum(0, b[cone] // det - self.margem)
+            pecas_r = P[cone] - k_x * X.pecas - k_y * Y.pecas
+            camisas_r = C[cone] - k_x * X.camisas - k_y * Y.camisas
+
+            custo[cone] = t.custo[pecas_r, camisas_r] + k_x * X.preco + k_y * Y.preco
+            m = t.mistos[pecas_r, camisas_r].astype(np.int64)
+            s = t.camisas[pecas_r, camisas_r].astype(np.int64)
+            for bloco, k in ((X, k_x), (Y, k_y)):
+                if bloco.grupo == "packs_mistos":
+                    m[:, indices["packs_mistos"][bloco.chave]] += k
+                elif bloco.grupo == "packs_camisas":
+                    s[:, indices["packs_camisas"][bloco.chave]] += k
+            mistos[cone] = m
+            packs_camisas[cone] = s
+        return custo, mistos, packs_camisas
 
-        # Função para converter tipos numpy para tipos nativos serializáveis
-        def convert_value(v):
-            if isinstance(v, (np.floating, float)):
-                return float(round(v, 2))
-            if isinstance(v, (np.integer, int)):
-                return int(v)
-            return v
-        
-        # Converter todos os valores no breakdown
-        detalhe_custos = {
-            "custos_fixos": convert_value(fixed_cost),
-            "packs_mistos": convert_value(cost_mistos.value()),
-            "packs_camisas": convert_value(cost_camisas.value()),
-            "itens_avulsos": convert_value(cost_avulso.value()),
-            "total_variavel": convert_value(var_cost),
-            "total": convert_value(total_cost)
+    def solucao(self, pecas: int, camisas: int) -> _SolucaoPacks:
+        """Solução ótima no formato dos solvers: a do resto mais os blocos."""
+        blocos, pecas_r, camisas_r = self.decompor(pecas, camisas)
+        packs_mistos, _, packs_camisas, avulsos = self.tabela.solucao(pecas_r, camisas_r)
+        S = int(self.tabela.camisas_em_mistos[pecas_r, camisas_r])
+        for bloco, k in blocos:
+            if k == 0:
+                continue
+            if bloco.grupo == "packs_mistos":
+                packs_mistos[bloco.chave] = packs_mistos.get(bloco.chave, 0) + k
+                S += k * bloco.camisas
+            elif bloco.grupo == "packs_camisas":
+                packs_camisas[bloco.chave] = packs_camisas.get(bloco.chave, 0) + k
+            else:
+                avulsos[bloco.chave] += k * (bloco.pecas + bloco.camisas)
+
+        catalog = self.tabela.catalog
+        packs_mistos = {
+            p["tipo"]: packs_mistos[p["tipo"]]
+            for p in catalog["packs_mistos"] if p["tipo"] in packs_mistos
+        }
+        packs_camisas = {
+            p["tipo"]: packs_camisas[p["tipo"]]
+            for p in catalog["packs_camisas"] if p["tipo"] in packs_camisas
         }
+        camisas_em_mistos = _distribuir_camisas(catalog["packs_mistos"], packs_mistos, S)
+        return packs_mistos, camisas_em_mistos, packs_camisas, avulsos
+
+
+def obter_reducao(catalog: dict = CATALOG) -> ReducaoBlocos | None:
+    """Redução por blocos do catálogo (ver ``MotorPrecos.reducao``)."""
+    return motor_precos(catalog).reducao()
+
+# --------------------------------------------------------------------------- #
+#  MOTORES DE PREÇOS (CATÁLOGOS COMPILADOS)
+# --------------------------------------------------------------------------- #
+# Motores mantidos em memória, por versão do conteúdo do catálogo
+MOTORES_MAX = int(os.environ.get("LAUNDRY_MOTORES_MAX", 32))
+
+
+def _positivo(valor: Any) -> bool:
+    return (
+        isinstance(valor, (int, float)) and not isinstance(valor, bool)
+        and math.isfinite(valor) and valor > 0
+    )
+
+
+def _inteiro(valor: Any) -> bool:
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def validar_catalogo(catalog: Any) -> None:
+    """
+    Verifica a estrutura e os preços de um catálogo (no formato de
+    ``CATALOG``). Levanta ValueError com o primeiro problema encontrado.
+    """
+    if not isinstance(catalog, dict):
+        raise ValueError("Catálogo inválido: esperado objeto")
+    for chave, tipo in (("packs_mistos", list), ("packs_camisas", list), ("avulso", dict)):
+        if not isinstance(catalog.get(chave), tipo):
+            raise ValueError(f"Catálogo inválido: '{chave}' em falta ou mal formado")
+    desconhecidas = set(catalog) - {"packs_mistos", "packs_camisas", "avulso"}
+    if desconhecidas:
+        raise ValueError(f"Catálogo inválido: chaves desconhecidas {sorted(desconhecidas)}")
+
+    for item in LaundryOptimizer._OPTIMIZABLE:
+        if item not in catalog["avulso"]:
+            raise ValueError(f"Catálogo inválido: falta o preço avulso de '{item}'")
+    for item, preco in catalog["avulso"].items():
+        if not _positivo(preco):
+            raise ValueError(f"Catálogo inválido: preço avulso de '{item}' deve ser positivo")
+
+    for grupo in ("packs_mistos", "packs_camisas"):
+        tipos = set()
+        for pack in catalog[grupo]:
+            if not isinstance(pack, dict) or not isinstance(pack.get("tipo"), str):
+                raise ValueError(f"Catálogo inválido: pack em '{grupo}' sem 'tipo'")
+            nome = f"{grupo}/{pack['tipo']}"
+            if pack["tipo"] in tipos:
+                raise ValueError(f"Catálogo inválido: '{nome}' repetido")
+            tipos.add(pack["tipo"])
+            if not _inteiro(pack.get("capacidade")) or pack["capacidade"] <= 0:
+                raise ValueError(f"Catálogo inválido: capacidade de '{nome}' deve ser inteiro positivo")
+            if not _positivo(pack.get("preco")):
+                raise ValueError(f"Catálogo inválido: preço de '{nome}' deve ser positivo")
+            if grupo == "packs_mistos" and not (
+                _inteiro(pack.get("limite_camisas"))
+                and 0 <= pack["limite_camisas"] <= pack["capacidade"]
+            ):
+                raise ValueError(
+                    f"Catálogo inválido: limite_camisas de '{nome}' deve estar entre 0 e a capacidade"
+                )
+
+
+class MotorPrecos:
+    """
+    Catálogo validado e compilado uma única vez: preços e itens pela ordem
+    do catálogo, packs indexados por ``tipo``, o otimizador (com o modelo ILP
+    compilado) e, na primeira utilização, a tabela de custos ótimos e a
+    redução por blocos. Imutável: guarda uma cópia própria do catálogo, e
+    catálogos com o mesmo conteúdo partilham o motor (``motor_precos``).
+
+    Entre processos (pool de solvers) viaja só o catálogo: do outro lado é
+    reconstruído, ou reaproveitado da cache desse processo, por ``motor_precos``.
+    """
+    __slots__ = (
+        "catalog", "versao", "precos", "itens", "especiais",
+        "mistos_por_tipo", "camisas_por_tipo", "otimizador",
+        "_tabela", "_reducao", "_reducao_pronta", "_lock",
+    )
+
+    def __init__(self, catalog: dict, versao: str | None = None):
+        validar_catalogo(catalog)
+        self.catalog = json.loads(json.dumps(catalog))
+        self.versao = versao or catalog_version(self.catalog)
+        self.precos: Dict[str, float] = self.catalog["avulso"]
+        self.itens: Tuple[str, ...] = tuple(self.precos)
+        self.especiais = tuple(k for k in self.itens if k not in LaundryOptimizer._OPTIMIZABLE)
+        self.mistos_por_tipo = {p["tipo"]: p for p in self.catalog["packs_mistos"]}
+        self.camisas_por_tipo = {p["tipo"]: p for p in self.catalog["packs_camisas"]}
+        self.otimizador = LaundryOptimizer(self.catalog, motor=self)
+        self._tabela: TabelaCustos | None = None
+        self._reducao: ReducaoBlocos | None = None
+        self._reducao_pronta = False
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        return (motor_precos, (self.catalog, self.versao))
+
+    def __repr__(self) -> str:
+        return f"MotorPrecos({self.versao})"
 
-        breakdown = {
-            "itens_fixos": {k: convert_value(order[k]) for k in self._SPECIALS if order[k] > 0},
-            "packs_mistos": packs_mistos,
-            "packs_camisas": packs_camisas,
-            "itens_avulsos": avulsos,
-            "camisas_em_packs_mistos": camisas_em_mistos,
-            "detalhe_custos": detalhe_custos
+    def tabela(self, pecas: int = 0, camisas: int = 0) -> TabelaCustos | None:
+        """
+        Tabela de custos ótimos que cobre o pedido.
+
+        Na primeira utilização tenta carregar ``LAUNDRY_TABELA_PATH``; se não
+        existir ou for de outro catálogo, calcula-a. Pedidos fora dos limites
+        fazem a tabela crescer (para o dobro) até ``TABELA_*_MAX``; acima disso
+        devolve None e o chamador reduz o pedido à tabela (``reducao``).
+        """
+        if pecas > TABELA_PECAS_MAX or camisas > TABELA_CAMISAS_MAX:
+            return None
+        tabela = self._tabela
+        if tabela is not None and tabela.cobre(pecas, camisas):
+            return tabela
+
+        with self._lock:
+            tabela = self._tabela
+            if tabela is None and TABELA_PATH and os.path.exists(TABELA_PATH):
+                tabela = TabelaCustos.carregar(TABELA_PATH, self.catalog)
+            if tabela is None or not tabela.cobre(pecas, camisas):
+                atual_p = tabela.max_pecas if tabela else TABELA_PECAS // 2
+                atual_c = tabela.max_camisas if tabela else TABELA_CAMISAS // 2
+                max_p = min(TABELA_PECAS_MAX, max(pecas, 2 * atual_p))
+                max_c = min(TABELA_CAMISAS_MAX, max(camisas, 2 * atual_c))
+                tabela = TabelaCustos.construir(self.catalog, max_p, max_c)
+                logging.getLogger(__name__).info(
+                    "Tabela de custos construída: %dx%d (catálogo %s)", max_p, max_c, self.versao
+                )
+            self._tabela = tabela
+        return tabela
+
+    def reducao(self) -> ReducaoBlocos | None:
+        """
+        Redução por blocos, construída sobre a tabela máxima na primeira
+        utilização. None se a periodicidade não se verificar: nesse caso os
+        pedidos grandes seguem para o ILP (``SOLVER_ILP_GRANDES``).
+        """
+        if self._reducao_pronta:
+            return self._reducao
+        tabela = self.tabela(TABELA_PECAS_MAX, TABELA_CAMISAS_MAX)
+        with self._lock:
+            if not self._reducao_pronta:
+                self._reducao = ReducaoBlocos.construir(tabela) if tabela is not None else None
+                log = logging.getLogger(__name__)
+                if self._reducao is None:
+                    log.warning(
+                        "Periodicidade não verificada (catálogo %s): pedidos grandes usam o ILP (%s)",
+                        self.versao, SOLVER_ILP_GRANDES
+                    )
+                else:
+                    log.info("Redução por blocos ativa: margem %d (catálogo %s)",
+                             self._reducao.margem, self.versao)
+                self._reducao_pronta = True
+        return self._reducao
+
+    def aquecer(self) -> None:
+        """Constrói já a tabela máxima e a redução (antes do fork dos workers)."""
+        self.reducao()
+
+    def tabela_precos(self, max_pecas: int = TABELA_PECAS,
+                      max_camisas: int = TABELA_CAMISAS) -> Dict[str, Any]:
+        """Tabela de preços exportável (ver ``TabelaCustos.exportar``)."""
+        return self.tabela(max_pecas, max_camisas).exportar(max_pecas, max_camisas)
+
+    def precos_recibo(self, detalhes: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+        """
+        Preços unitários das linhas de um recibo (itens e packs usados em
+        ``detalhes``), guardados com ele para o PDF não depender do catálogo
+        continuar registado. Pedidos só com itens de preço fixo (ou vazios)
+        não trazem as secções de packs e avulsos.
+        """
+        itens = {**(detalhes.get("itens_fixos") or {}), **(detalhes.get("itens_avulsos") or {})}
+        mistos = detalhes.get("packs_mistos") or {}
+        camisas = detalhes.get("packs_camisas") or {}
+        return {
+            "itens": {k: self.precos[k] for k, q in itens.items() if q > 0},
+            "packs_mistos": {k: self.mistos_por_tipo[k]["preco"] for k, q in mistos.items() if q > 0},
+            "packs_camisas": {k: self.camisas_por_tipo[k]["preco"] for k, q in camisas.items() if q > 0},
         }
 
-        return total_cost, breakdown, {v.name: v.value() for v in prob.variables()}
+
+_motores: "OrderedDict[str, MotorPrecos]" = OrderedDict()
+_motores_lock = threading.Lock()
+
+
+def motor_precos(catalog: dict = CATALOG, versao: str | None = None) -> MotorPrecos:
+    """
+    Motor do catálogo, pela versão do conteúdo: compilado na primeira vez e
+    reaproveitado depois (LRU de ``MOTORES_MAX`` motores). ``versao`` só é
+    passada quando já é conhecida (ex.: motor vindo de outro processo).
+    Levanta ValueError se o catálogo for inválido.
+    """
+    versao = versao or catalog_version(catalog)
+    with _motores_lock:
+        motor = _motores.get(versao)
+        if motor is not None:
+            _motores.move_to_end(versao)
+            return motor
+    motor = MotorPrecos(catalog, versao)
+    with _motores_lock:
+        # Outra thread pode ter compilado o mesmo catálogo entretanto
+        motor = _motores.setdefault(versao, motor)
+        _motores.move_to_end(versao)
+        while len(_motores) > MOTORES_MAX:
+            _motores.popitem(last=False)
+    return motor
+
+
+def motor_por_versao(versao: str) -> MotorPrecos | None:
+    """Motor já compilado neste processo com esta versão (None se não houver)."""
+    with _motores_lock:
+        return _motores.get(versao)
 
 # --------------------------------------------------------------------------- #
 #  INTERFACE DE USO
 # --------------------------------------------------------------------------- #
-def optimizar_pedido(items: Dict[str, int]) -> Tuple[float, Dict[str, Any], Dict[str, Any]]:
-    """Função simplificada para otimização direta."""
-    return LaundryOptimizer().optimize_order(items)
+def optimizar_pedido(
+    items: Dict[str, int],
+    solver_name: str | None = None,
+    motor: MotorPrecos | None = None
+) -> ResultadoOtimizacao:
+    """
+    Função simplificada para otimização direta, com o otimizador partilhado
+    do motor (``CATALOG`` por omissão), que reaproveita o modelo ILP compilado.
+    """
+    return (motor or motor_precos()).otimizador.optimize_order(items, solver_name)
+
+
+def comparar_solvers(
+    max_pecas: int,
+    max_camisas: int,
+    passo: int = 1,
+    referencia: str = SOLVER_PULP
+) -> list:
+    """
+    Teste diferencial: compara o custo ótimo do solver nativo e da tabela
+    pré-calculada com o do ILP numa grelha de pedidos (peca_variada, camisa).
+    Devolve as divergências.
+    """
+    otimizador = LaundryOptimizer()
+    divergencias = []
+    for pecas in range(0, max_pecas + 1, passo):
+        for camisas in range(0, max_camisas + 1, passo):
+            pedido = {"peca_variada": pecas, "camisa": camisas}
+            ilp = otimizador.optimize_order(pedido, referencia).custo_total
+            for solver in (SOLVER_NATIVO, SOLVER_TABELA):
+                custo = otimizador.optimize_order(pedido, solver).custo_total
+                if abs(custo - ilp) > 0.005:
+                    divergencias.append({"pedido": pedido, solver: custo, "ilp": ilp})
+    return divergencias
+
+
+def catalogo_sem_reducao() -> dict:
+    """
+    Variante do ``CATALOG`` em que a periodicidade não se verifica (o pack
+    de 40 leva até 10 camisas): os pedidos acima da tabela seguem para o ILP
+    (``SOLVER_ILP_GRANDES``) em vez da redução por blocos.
+    """
+    catalog = json.loads(json.dumps(CATALOG))
+    for p in catalog["packs_mistos"]:
+        if p["tipo"] == "40":
+            p["limite_camisas"] = 10
+    return catalog
+
+
+def comparar_pedidos_grandes(
+    n: int,
+    max_itens: int = 10 ** 6,
+    seed: int = 0,
+    referencia: str = SOLVER_PULP,
+    catalog: dict = CATALOG
+) -> list:
+    """
+    Teste diferencial dos pedidos acima da tabela (``ReducaoBlocos`` ou, em
+    catálogos sem ela, ``SOLVER_ILP_GRANDES``): ``n`` pedidos reprodutíveis,
+    de tamanho log-uniforme até ``max_itens`` peças + camisas e com
+    proporções de camisas de 0 a 100%, comparados com o ILP ``referencia``.
+    """
+    import random
+
+    rng = random.Random(seed)
+    otimizador = motor_precos(catalog).otimizador
+    divergencias = []
+    for _ in range(n):
+        total = int(10 ** rng.uniform(2, math.log10(max_itens)))
+        camisas = rng.choice([0, total, rng.randint(0, total), rng.randint(0, total // 10)])
+        pedido = {"peca_variada": total - camisas, "camisa": camisas}
+        ilp = otimizador.optimize_order(pedido, referencia).custo_total
+        custo = otimizador.optimize_order(pedido).custo_total
+        if abs(custo - ilp) > 0.005:
+            divergencias.append({"pedido": pedido, "custo": custo, "ilp": ilp})
+    return divergencias
+
+# --------------------------------------------------------------------------- #
+#  MEMOIZAÇÃO DE RESPOSTAS
+# --------------------------------------------------------------------------- #
+MEMO_ATIVO = os.environ.get("LAUNDRY_MEMO", "1") != "0"
+MEMO_MAX = int(os.environ.get("LAUNDRY_MEMO_MAX", 4096))
+
+
+def assinatura_pedido(items: Dict[str, int], motor: MotorPrecos | None = None) -> Tuple[int, ...] | None:
+    """
+    Forma canónica de um pedido: quantidades pela ordem do catálogo do motor
+    (``CATALOG`` por omissão), com os itens em falta a 0. Pedidos inválidos
+    (itens desconhecidos, quantidades não inteiras) devolvem None e não são
+    memoizados.
+    """
+    motor = motor or motor_precos()
+    try:
+        if any(k not in motor.precos for k in items):
+            return None
+        return tuple(int(items.get(k, 0)) for k in motor.itens)
+    except (TypeError, ValueError):
+        return None
+
+
+class MemoRespostas:
+    """
+    LRU de respostas de sucesso, por (versão do catálogo, solver, assinatura).
+
+    A versão é a do motor usado (``CATALOG`` por omissão, recalculada a cada
+    consulta): um catálogo alterado ou de outro cliente tem outra chave e
+    nunca recebe preços alheios; as entradas sem uso saem pelo LRU.
+    As respostas são devolvidas como cópias rasas (o chamador pode juntar
+    chaves de topo, ex.: ``pdf_url``); os ``detalhes`` são partilhados.
+    """
+
+    def __init__(self, max_entries: int = MEMO_MAX, catalog: dict = CATALOG):
+        self.max_entries = max_entries
+        self.catalog = catalog
+        self._items: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _chave(self, items: Dict[str, int], solver_name: str | None,
+               motor: MotorPrecos | None) -> tuple | None:
+        motor = motor or motor_precos(self.catalog)
+        assinatura = assinatura_pedido(items, motor)
+        if assinatura is None:
+            return None
+        return (motor.versao, solver_name or SOLVER_TABELA, assinatura)
+
+    def obter(self, items: Dict[str, int], solver_name: str | None = None,
+              motor: MotorPrecos | None = None) -> Dict[str, Any] | None:
+        chave = self._chave(items, solver_name, motor)
+        with self._lock:
+            resposta = self._items.get(chave) if chave is not None else None
+            if resposta is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(chave)
+            self.hits += 1
+        return dict(resposta)
+
+    def guardar(self, items: Dict[str, int], solver_name: str | None,
+                resposta: Dict[str, Any], motor: MotorPrecos | None = None) -> None:
+        if self.max_entries <= 0 or resposta.get("status") != "sucesso":
+            return
+        if resposta.get("exato") is False:
+            return  # heurística: o ótimo exato pode chegar depois
+        chave = self._chave(items, solver_name, motor)
+        if chave is None:
+            return
+        with self._lock:
+            self._items[chave] = dict(resposta)
+            self._items.move_to_end(chave)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "ativo": MEMO_ATIVO,
+                "entradas": len(self._items),
+                "max_entradas": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+memo_respostas = MemoRespostas()
+
 
 # --------------------------------------------------------------------------- #
 #  HANDLER PARA CHATGPT ACTIONS
 # --------------------------------------------------------------------------- #
-def gpt_optimize_handler(items: Dict[str, int]) -> Dict[str, Any]:
-    """Formata a resposta para o padrão GPT Actions"""
+def gpt_optimize_handler(
+    items: Dict[str, int],
+    solver_name: str | None = None,
+    usar_cache: bool = MEMO_ATIVO,
+    motor: MotorPrecos | None = None
+) -> Dict[str, Any]:
+    """Formata a resposta para o padrão GPT Actions (preços do ``motor``)"""
+    motor = motor or motor_precos()
+    if usar_cache:
+        with span("handler.memo"):
+            resposta = memo_respostas.obter(items, solver_name, motor)
+        if resposta is not None:
+            return resposta
     try:
-        total, detalhes, _ = optimizar_pedido(items)
-        
-        # Função para converter tipos problemáticos recursivamente
-        def convert_types(obj):
-            if isinstance(obj, (np.floating, float)):
-                return float(round(obj, 2))
-            if isinstance(obj, (np.integer, int)):
-                return int(obj)
-            if isinstance(obj, dict):
-                return {k: convert_types(v) for k, v in obj.items()}
-            if isinstance(obj, list):
-                return [convert_types(item) for item in obj]
-            return obj
-        
+        with span("handler.optimize_order"):
+            resultado = optimizar_pedido(items, solver_name, motor)
+        with span("handler.conversao"):
+            resposta = resultado.resposta()
+    except Exception as e:
         return {
-            "status": "sucesso",
-            "custo_total": round(total, 2),
-            "detalhes": convert_types(detalhes)
+            "status": "erro",
+            "mensagem": str(e)
         }
+    if usar_cache:
+        with span("handler.memo"):
+            memo_respostas.guardar(items, solver_name, resposta, motor)
+    return resposta
+
+
+def delta_sem_solver(delta: Dict[str, int]) -> bool:
+    """True se o delta só altera itens de preço fixo (re-otimização sem solver)."""
+    return not any(int(delta.get(k, 0)) for k in LaundryOptimizer._OPTIMIZABLE)
+
+
+def gpt_reoptimize_handler(
+    items: Dict[str, int],
+    resposta_anterior: Dict[str, Any],
+    delta: Dict[str, int],
+    versao_anterior: str | None = None,
+    solver_name: str | None = None,
+    usar_cache: bool = MEMO_ATIVO,
+    motor: MotorPrecos | None = None
+) -> Dict[str, Any]:
+    """
+    Re-otimização incremental de um pedido já respondido, com os preços do
+    ``motor``. A resposta de sucesso traz também ``pedido`` (as quantidades
+    novas) e ``alteracoes`` (as escolhas de packs que mudaram, ver
+    ``alteracoes_packs``).
+    """
+    motor = motor or motor_precos()
+    try:
+        anterior = ResultadoOtimizacao.de_resposta(resposta_anterior, motor.catalog)
+        # Solução calculada com outro catálogo: não é reaproveitável
+        reutilizavel = versao_anterior in (None, motor.versao)
+        with span("handler.reoptimize_order"):
+            novo, resultado = motor.otimizador.reoptimize_order(
+                items, anterior if reutilizavel else None, delta, solver_name
+            )
+        with span("handler.conversao"):
+            resposta = resultado.resposta()
+    except Exception as e:
+        return {
+            "status": "erro",
+            "mensagem": str(e)
+        }
+    if usar_cache:
+        with span("handler.memo"):
+            memo_respostas.guardar(novo, solver_name, resposta, motor)
+    resposta["pedido"] = {k: q for k, q in novo.items() if q}
+    resposta["alteracoes"] = alteracoes_packs(anterior.detalhes, resultado.detalhes)
+    return resposta
+
+
+def gpt_price_curve_handler(
+    pecas: Tuple[int, int],
+    camisas: Tuple[int, int],
+    motor: MotorPrecos | None = None
+) -> Dict[str, Any]:
+    """Curva de preços (ver ``LaundryOptimizer.price_curve``) no formato da API."""
+    motor = motor or motor_precos()
+    try:
+        with span("handler.price_curve"):
+            curva = motor.otimizador.price_curve(pecas, camisas)
+        with span("handler.conversao"):
+            return curva.resposta()
     except Exception as e:
         return {
             "status": "erro",
             "mensagem": str(e)
         }
 
+
+def gpt_optimize_batch_handler(
+    orders: List[Dict[str, int]],
+    solver_name: str | None = None,
+    usar_cache: bool = MEMO_ATIVO,
+    motor: MotorPrecos | None = None
+) -> List[Dict[str, Any]]:
+    """Versão em lote do handler: uma resposta por pedido, pela mesma ordem."""
+    motor = motor or motor_precos()
+    respostas: List[Dict[str, Any] | None] = [None] * len(orders)
+    pendentes = []
+    for i, items in enumerate(orders):
+        resposta = memo_respostas.obter(items, solver_name, motor) if usar_cache else None
+        if resposta is None:
+            pendentes.append(i)
+        else:
+            respostas[i] = resposta
+
+    formatadas = {}
+    resultados = motor.otimizador.optimize_batch([orders[i] for i in pendentes], solver_name)
+    for i, resultado in zip(pendentes, resultados):
+        if isinstance(resultado, Exception):
+            respostas[i] = {"status": "erro", "mensagem": str(resultado)}
+            continue
+        # Pedidos repetidos partilham o resultado; formatar só uma vez
+        chave = id(resultado)
+        if chave not in formatadas:
+            formatadas[chave] = resultado.resposta()
+            if usar_cache:
+                memo_respostas.guardar(orders[i], solver_name, formatadas[chave], motor)
+        respostas[i] = dict(formatadas[chave])
+    return respostas
+
 # --------------------------------------------------------------------------- #
 #  CLI PARA TESTES
 # --------------------------------------------------------------------------- #
@@ -265,8 +2044,71 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Otimizador de Custos de Lavanderia")
     parser.add_argument("--exemplo", action="store_true", help="Executar com pedido exemplo")
     parser.add_argument("--json", type=str, help="Pedido em formato JSON")
+    parser.add_argument("--solver", type=str, default=None,
+                        help="Solver a usar: tabela (omissão, como na API), nativo, heuristico, "
+                             "pulp, highs ou nome PuLP")
+    parser.add_argument("--comparar", type=int, metavar="N",
+                        help="Comparar nativo e tabela vs ILP em todos os pedidos até N peças/camisas")
+    parser.add_argument("--passo", type=int, default=1, help="Passo da grelha de --comparar")
+    parser.add_argument("--referencia", type=str, default=SOLVER_PULP,
+                        help="Solver ILP de referência de --comparar (pulp ou highs)")
+    parser.add_argument("--grandes", type=int, metavar="N",
+                        help="Comparar N pedidos grandes aleatórios com o ILP, no catálogo por "
+                             "omissão (blocos) e num sem redução por blocos (ILP)")
+    parser.add_argument("--max-itens", type=int, default=10 ** 6,
+                        help="Tamanho máximo dos pedidos de --grandes")
+    parser.add_argument("--gerar-tabela", type=str, metavar="PATH",
+                        help="Pré-calcular a tabela de custos e gravá-la em PATH (.npz)")
+    parser.add_argument("--exportar-precos", type=str, metavar="PATH",
+                        help="Gravar a tabela de preços do front end (JSON) em PATH")
     args = parser.parse_args()
 
+    if args.gerar_tabela:
+        # Tamanho máximo: também serve a redução por blocos dos pedidos grandes
+        tabela = TabelaCustos.construir(CATALOG, TABELA_PECAS_MAX, TABELA_CAMISAS_MAX)
+        tabela.guardar(args.gerar_tabela)
+        print(f"Tabela {tabela.max_pecas}x{tabela.max_camisas} (catálogo {tabela.versao}) "
+              f"gravada em {args.gerar_tabela}")
+        raise SystemExit(0)
+
+    if args.exportar_precos:
+        artefacto = motor_precos().tabela_precos()
+        with open(args.exportar_precos, "w", encoding="utf-8") as f:
+            json.dump(artefacto, f, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        print(f"Tabela de preços {artefacto['max_pecas']}x{artefacto['max_camisas']} "
+              f"(catálogo {artefacto['catalogo']}) gravada em {args.exportar_precos}")
+        raise SystemExit(0)
+
+    if args.comparar is not None:
+        logging.getLogger(__name__).setLevel(logging.WARNING)
+        divergencias = comparar_solvers(args.comparar, args.comparar, args.passo, args.referencia)
+        print(json.dumps(divergencias, indent=2, ensure_ascii=False))
+        print(f"{len(divergencias)} divergência(s) encontradas")
+        raise SystemExit(1 if divergencias else 0)
+
+    if args.grandes is not None:
+        logging.getLogger(__name__).setLevel(logging.WARNING)
+        import time
+        divergencias = []
+        # Os dois caminhos dos pedidos acima da tabela: redução por blocos e ILP
+        casos = (("omissão", CATALOG, "blocos"),
+                 ("sem redução", catalogo_sem_reducao(), SOLVER_ILP_GRANDES))
+        for nome, catalog, esperado in casos:
+            caminho = "blocos" if motor_precos(catalog).reducao() is not None else SOLVER_ILP_GRANDES
+            if caminho != esperado:
+                raise SystemExit(f"Catálogo {nome}: caminho {caminho}, esperado {esperado}")
+            inicio = time.perf_counter()
+            encontradas = comparar_pedidos_grandes(
+                args.grandes, args.max_itens, referencia=args.referencia, catalog=catalog
+            )
+            duracao = time.perf_counter() - inicio
+            print(f"Catálogo {nome} ({caminho}): {len(encontradas)} divergência(s), "
+                  f"{1000 * duracao / (2 * args.grandes):.1f} ms por solve")
+            divergencias.extend(dict(d, catalogo=nome) for d in encontradas)
+        print(json.dumps(divergencias, indent=2, ensure_ascii=False))
+        print(f"{len(divergencias)} divergência(s) encontradas")
+        raise SystemExit(1 if divergencias else 0)
+
     if args.exemplo:
         pedido = {
             "peca_variada": 15,
@@ -282,5 +2124,5 @@ if __name__ == "__main__":
     else:
         parser.error("Use --exemplo ou --json")
 
-    resultado = gpt_optimize_handler(pedido)
+    resultado = gpt_optimize_handler(pedido, args.solver)
     print(json.dumps(resultado, indent=2, ensure_ascii=False))
@@ -0,0 +1,145 @@
+"""
+metricas.py
+===========
+Instrumentação leve do serviço, exportada em formato de texto Prometheus.
+
+    with span("optimize.validacao"):
+        ...
+
+Cada ``span`` mede uma etapa e acumula-a no histograma
+``engomadoria_etapa_segundos{etapa="..."}``. Com ``METRICS_ENABLED=0`` o
+``span`` devolve um context manager nulo partilhado (custo de uma chamada de
+função) e ``/metrics`` fica desligado.
+
+Os solves correm noutros processos (``solver_pool``): aí os spans são
+recolhidos numa lista (``recolher_spans``) e devolvidos ao processo web junto
+com o resultado, que os regista com ``registar_spans``.
+"""
+
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Tuple
+import os
+import threading
+import time
+
+METRICAS_ATIVAS = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Limites dos buckets em segundos (50 µs a 10 s)
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_NULO = nullcontext()
+_local = threading.local()
+
+
+class Histograma:
+    """Histograma Prometheus com uma série por valor da etiqueta ``etapa``."""
+
+    def __init__(self, nome: str, ajuda: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self._series: Dict[str, List[Any]] = {}  # etapa -> [contagens, soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, etapa: str, segundos: float) -> None:
+        indice = bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._series.get(etapa)
+            if serie is None:
+                serie = self._series[etapa] = [[0] * len(self.buckets), 0.0, 0]
+            if indice < len(self.buckets):
+                serie[0][indice] += 1
+            serie[1] += segundos
+            serie[2] += 1
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for etapa, (contagens, soma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                linhas.append(f'{self.nome}_bucket{{etapa="{etapa}",le="{limite:g}"}} {acumulado}')
+            linhas.append(f'{self.nome}_bucket{{etapa="{etapa}",le="+Inf"}} {total}')
+            linhas.append(f'{self.nome}_sum{{etapa="{etapa}"}} {soma:.9f}')
+            linhas.append(f'{self.nome}_count{{etapa="{etapa}"}} {total}')
+        return linhas
+
+
+etapas = Histograma(
+    "engomadoria_etapa_segundos",
+    "Duração de cada etapa do processamento de pedidos"
+)
+
+
+class _Span:
+    # Classe em vez de @contextmanager: evita criar um gerador por etapa
+    __slots__ = ("nome", "inicio")
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def __enter__(self) -> None:
+        self.inicio = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        duracao = time.perf_counter() - self.inicio
+        recolhidos = getattr(_local, "spans", None)
+        if recolhidos is not None:
+            recolhidos.append((self.nome, duracao))
+        else:
+            etapas.observar(self.nome, duracao)
+
+
+def span(nome: str):
+    """Context manager que mede a etapa ``nome`` (nulo se desligado)."""
+    return _Span(nome) if METRICAS_ATIVAS else _NULO
+
+
+@contextmanager
+def recolher_spans() -> Iterator[List[Tuple[str, float]]]:
+    """Guarda os spans desta thread numa lista em vez de os registar."""
+    anteriores = getattr(_local, "spans", None)
+    _local.spans = recolhidos = []
+    try:
+        yield recolhidos
+    finally:
+        _local.spans = anteriores
+
+
+def registar_spans(spans: List[Tuple[str, float]]) -> None:
+    for nome, duracao in spans:
+        etapas.observar(nome, duracao)
+
+
+def executar_com_spans(fn, *args: Any) -> Tuple[Any, List[Tuple[str, float]]]:
+    """Executa ``fn`` (noutro processo) e devolve também os spans medidos."""
+    with recolher_spans() as spans:
+        resultado = fn(*args)
+    return resultado, spans
+
+
+def _linhas_valores(nome: str, tipo: str, ajuda: str, valores: Dict[str, float],
+                    etiqueta: str | None = None) -> List[str]:
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+    for chave, valor in valores.items():
+        rotulo = f'{{{etiqueta}="{chave}"}}' if etiqueta else ""
+        linhas.append(f"{nome}{rotulo} {valor}")
+    return linhas
+
+
+def exportar(gauges: Dict[str, Tuple[str, str, Dict[str, float], str | None]]) -> str:
+    """
+    Texto Prometheus com o histograma de etapas e as métricas pontuais
+    ``gauges``: nome -> (tipo, ajuda, {valor_etiqueta: valor}, etiqueta).
+    """
+    linhas = etapas.exportar()
+    for nome, (tipo, ajuda, valores, etiqueta) in gauges.items():
+        linhas.extend(_linhas_valores(nome, tipo, ajuda, valores, etiqueta))
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,456 @@
+"""
+order_ledger.py
+===============
+Livro de pedidos: histórico permanente dos pedidos por cliente, para
+consultas e relatórios mensais sem re-otimizar nada.
+
+Os recibos do ``result_store`` expiram ao fim de 30 minutos; cada recibo
+criado é também registado aqui, num ficheiro SQLite em modo WAL partilhado
+pelos workers:
+
+    - ``pedidos``: uma linha por recibo, só acrescentada (nunca alterada),
+      indexada por cliente e data. Uma linha pode substituir outra (recibo
+      revisto pelo solve exato, ou re-otimizado em /optimize/delta): a
+      substituída deixa de contar nos totais, mas fica no histórico
+    - ``receita_mensal``, ``uso_mensal`` e ``uso_mensal_geral``: totais por
+      mês (receita e pedidos por cliente; itens e packs por cliente e no
+      geral), atualizados na mesma transação que as linhas. Os relatórios
+      leem só estes totais, com poucas linhas por mês, e respondem em
+      milissegundos seja qual for o tamanho do histórico
+
+A escrita não acontece na thread do pedido: ``registar`` só põe o pedido
+numa fila, escoada em lotes (uma transação por lote) por uma thread própria
+de cada processo. Com a fila cheia (base de dados inacessível), os pedidos
+novos são descartados e contados em ``perdidos``.
+
+Configuração: ``LEDGER_PATH`` (ficheiro num disco persistente, ex.:
+``/var/data/engomadoria_pedidos.sqlite3``; sem ele o livro fica desligado e
+nenhum ficheiro é criado), ``LEDGER_LOTE`` (pedidos por transação) e
+``LEDGER_FILA`` (máximo em espera).
+
+    python order_ledger.py receita --de 2025-01 --ate 2025-12
+    python order_ledger.py historico "Hotel Avenida" --ficheiro pedidos.sqlite3
+"""
+
+from __future__ import annotations
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Histórico permanente: nunca num diretório temporário por omissão
+LEDGER_PATH = os.environ.get("LEDGER_PATH") or None
+LEDGER_LOTE = int(os.environ.get("LEDGER_LOTE", 500))
+LEDGER_FILA = int(os.environ.get("LEDGER_FILA", 100000))
+
+# Categorias de uso: itens pedidos e packs escolhidos pelo otimizador
+CATEGORIAS = ("item", "pack_misto", "pack_camisas")
+
+_ESQUEMA = (
+    "CREATE TABLE IF NOT EXISTS pedidos ("
+    " id INTEGER PRIMARY KEY,"
+    " receipt_id TEXT NOT NULL,"
+    " substitui INTEGER,"
+    " ts REAL NOT NULL,"
+    " mes INTEGER NOT NULL,"
+    " cliente TEXT NOT NULL,"
+    " cliente_chave TEXT NOT NULL,"
+    " catalogo TEXT,"
+    " custo INTEGER NOT NULL,"
+    " exato INTEGER NOT NULL,"
+    " uso TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos(cliente_chave, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_ts ON pedidos(ts)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_receipt ON pedidos(receipt_id)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_substitui ON pedidos(substitui)",
+    "CREATE TABLE IF NOT EXISTS receita_mensal ("
+    " cliente_chave TEXT NOT NULL,"
+    " mes INTEGER NOT NULL,"
+    " cliente TEXT NOT NULL,"
+    " pedidos INTEGER NOT NULL,"
+    " receita INTEGER NOT NULL,"
+    " PRIMARY KEY (cliente_chave, mes)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_receita_mes ON receita_mensal(mes)",
+    "CREATE TABLE IF NOT EXISTS uso_mensal ("
+    " cliente_chave TEXT NOT NULL,"
+    " mes INTEGER NOT NULL,"
+    " categoria TEXT NOT NULL,"
+    " chave TEXT NOT NULL,"
+    " quantidade INTEGER NOT NULL,"
+    " PRIMARY KEY (cliente_chave, mes, categoria, chave)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS uso_mensal_geral ("
+    " mes INTEGER NOT NULL,"
+    " categoria TEXT NOT NULL,"
+    " chave TEXT NOT NULL,"
+    " quantidade INTEGER NOT NULL,"
+    " PRIMARY KEY (mes, categoria, chave)) WITHOUT ROWID",
+)
+
+_Uso = Dict[str, Dict[str, int]]
+
+
+def chave_cliente(cliente: str | None) -> str:
+    """Nome do cliente normalizado (o mesmo cliente com outra capitalização)."""
+    return (cliente or "").strip().casefold()
+
+
+def mes_de(texto: str | None) -> int | None:
+    """'AAAA-MM' -> AAAAMM (None fica None); ValueError se inválido."""
+    if texto is None:
+        return None
+    try:
+        ano, mes = str(texto).split("-")
+        if len(ano) != 4 or not 1 <= int(mes) <= 12:
+            raise ValueError
+        return int(ano) * 100 + int(mes)
+    except ValueError:
+        raise ValueError(f"Mês inválido: '{texto}' - formato AAAA-MM") from None
+
+
+def _mes_texto(mes: int) -> str:
+    return f"{mes // 100:04d}-{mes % 100:02d}"
+
+
+def _uso(itens: Dict[str, int] | None, resposta: Dict[str, Any]) -> _Uso:
+    detalhes = resposta.get("detalhes") or {}
+    return {
+        "item": {k: int(v) for k, v in (itens or {}).items() if v},
+        "pack_misto": dict(detalhes.get("packs_mistos") or {}),
+        "pack_camisas": dict(detalhes.get("packs_camisas") or {}),
+    }
+
+
+class LivroPedidos:
+    """
+    Livro de pedidos num ficheiro SQLite. ``registar`` é seguro em qualquer
+    thread e não toca na base de dados; as consultas usam uma ligação por
+    thread, como o ``SQLiteResultStore``.
+    """
+
+    def __init__(self, path: str, lote: int = LEDGER_LOTE, max_fila: int = LEDGER_FILA):
+        self.path = path
+        self.lote = lote
+        self.max_fila = max_fila
+        self._fila: queue.SimpleQueue = queue.SimpleQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._escritor: threading.Thread | None = None
+        self._escritor_pid: int | None = None
+        self.escritos = 0
+        self.lotes = 0
+        self.perdidos = 0
+        self.erros = 0
+        conn = self._conn()
+        for instrucao in _ESQUEMA:
+            conn.execute(instrucao)
+
+    def _conn(self) -> sqlite3.Connection:
+        # Ligação por thread e por processo (não atravessa fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ------------------------------------------------------------------ #
+    #  ESCRITA
+    # ------------------------------------------------------------------ #
+    def registar(self, receipt_id: str, cliente: str | None, resposta: Dict[str, Any],
+                 itens: Dict[str, int] | None = None, catalogo: str | None = None,
+                 substitui: str | None = None) -> None:
+        """
+        Acrescenta um pedido (assíncrono). Com ``substitui`` (receipt_id de um
+        pedido anterior), esse pedido deixa de contar nos totais.
+        """
+        if resposta.get("status") != "sucesso":
+            return
+        if self._escritor_pid != os.getpid():
+            self._arrancar_escritor()
+        if self._fila.qsize() >= self.max_fila:
+            with self._lock:
+                self.perdidos += 1
+            return
+        self._fila.put((receipt_id, substitui, time.time(), cliente or "", catalogo, resposta, itens))
+
+    def _arrancar_escritor(self) -> None:
+        # Após um fork (workers do gunicorn) a thread não existe no filho
+        with self._lock:
+            if self._escritor_pid == os.getpid():
+                return
+            self._fila = queue.SimpleQueue()
+            self._escritor = threading.Thread(
+                target=self._escrever, name="livro-pedidos", daemon=True
+            )
+            self._escritor.start()
+            self._escritor_pid = os.getpid()
+
+    def _escrever(self) -> None:
+        fila = self._fila
+        while True:
+            pendentes = [fila.get()]
+            while len(pendentes) < self.lote:
+                try:
+                    pendentes.append(fila.get_nowait())
+                except queue.Empty:
+                    break
+            fim = None in pendentes
+            pendentes = [p for p in pendentes if p is not None]
+            if pendentes:
+                self._gravar_lote(pendentes)
+            if fim:
+                return
+
+    def _gravar_lote(self, pendentes: List[tuple]) -> None:
+        for tentativa in range(3):
+            try:
+                self._transacao(pendentes)
+            except sqlite3.OperationalError as e:
+                # Base de dados bloqueada por outro worker: tentar de novo
+                log.warning("Livro de pedidos: lote de %d não gravado (%s)", len(pendentes), e)
+                time.sleep(0.1 * (tentativa + 1))
+            except Exception:
+                log.exception("Livro de pedidos: lote de %d descartado", len(pendentes))
+                break
+            else:
+                with self._lock:
+                    self.escritos += len(pendentes)
+                    self.lotes += 1
+                return
+        with self._lock:
+            self.erros += 1
+            self.perdidos += len(pendentes)
+
+    def _transacao(self, pendentes: List[tuple]) -> None:
+        conn = self._conn()
+        receita: Dict[Tuple[str, int], List[Any]] = {}  # (chave, mes) -> [cliente, pedidos, receita]
+        uso: Dict[Tuple[str, int, str, str], int] = defaultdict(int)
+
+        def contar(chave: str, mes: int, cliente: str, custo: int, uso_pedido: _Uso, sinal: int) -> None:
+            total = receita.setdefault((chave, mes), [cliente, 0, 0])
+            if sinal > 0:
+                total[0] = cliente  # fica o nome mais recente
+            total[1] += sinal
+            total[2] += sinal * custo
+            for categoria, quantidades in uso_pedido.items():
+                for nome, n in quantidades.items():
+                    uso[(chave, mes, categoria, nome)] += sinal * n
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for receipt_id, substitui, ts, cliente, catalogo, resposta, itens in pendentes:
+                anterior = None
+                if substitui is not None:
+                    # Só a linha em vigor desse recibo (ainda não substituída)
+                    anterior = conn.execute(
+                        "SELECT id, mes, cliente, cliente_chave, custo, uso FROM pedidos p"
+                        " WHERE receipt_id = ? AND NOT EXISTS ("
+                        "  SELECT 1 FROM pedidos s WHERE s.substitui = p.id)"
+                        " ORDER BY id DESC LIMIT 1",
+                        (substitui,)
+                    ).fetchone()
+                if anterior is not None:
+                    _, mes_a, cliente_a, chave_a, custo_a, uso_a = anterior
+                    contar(chave_a, mes_a, cliente_a, custo_a, json.loads(uso_a), -1)
+
+                local = time.localtime(ts)
+                mes = local.tm_year * 100 + local.tm_mon
+                chave = chave_cliente(cliente)
+                custo = round(100 * resposta.get("custo_total", 0.0))
+                uso_pedido = _uso(itens, resposta)
+                conn.execute(
+                    "INSERT INTO pedidos (receipt_id, substitui, ts, mes, cliente, cliente_chave,"
+                    " catalogo, custo, exato, uso) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (receipt_id, anterior[0] if anterior else None, ts, mes, cliente, chave,
+                     catalogo, custo, int(resposta.get("exato", True)),
+                     json.dumps(uso_pedido, ensure_ascii=False))
+                )
+                contar(chave, mes, cliente, custo, uso_pedido, 1)
+
+            conn.executemany(
+                "INSERT INTO receita_mensal (cliente_chave, mes, cliente, pedidos, receita)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (cliente_chave, mes) DO UPDATE SET"
+                "  cliente = excluded.cliente,"
+                "  pedidos = pedidos + excluded.pedidos,"
+                "  receita = receita + excluded.receita",
+                [(c, m, *total) for (c, m), total in receita.items()]
+            )
+            conn.executemany(
+                "INSERT INTO uso_mensal (cliente_chave, mes, categoria, chave, quantidade)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (cliente_chave, mes, categoria, chave) DO UPDATE SET"
+                "  quantidade = quantidade + excluded.quantidade",
+                [(*k, n) for k, n in uso.items() if n]
+            )
+            geral: Dict[Tuple[int, str, str], int] = defaultdict(int)
+            for (_, mes, categoria, nome), n in uso.items():
+                geral[(mes, categoria, nome)] += n
+            conn.executemany(
+                "INSERT INTO uso_mensal_geral (mes, categoria, chave, quantidade)"
+                " VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (mes, categoria, chave) DO UPDATE SET"
+                "  quantidade = quantidade + excluded.quantidade",
+                [(*k, n) for k, n in geral.items() if n]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def esvaziar(self, timeout: float = 5.0) -> None:
+        """Espera que a fila seja gravada e pára a thread (no fim do processo)."""
+        with self._lock:
+            escritor = self._escritor if self._escritor_pid == os.getpid() else None
+            self._escritor_pid = None
+        if escritor is not None and escritor.is_alive():
+            self._fila.put(None)
+            escritor.join(timeout)
+
+    # ------------------------------------------------------------------ #
+    #  CONSULTAS
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _filtro(de: int | None, ate: int | None, cliente: str | None,
+                coluna_cliente: str = "cliente_chave") -> Tuple[str, list]:
+        condicoes, params = [], []
+        if cliente is not None:
+            condicoes.append(f"{coluna_cliente} = ?")
+            params.append(chave_cliente(cliente))
+        if de is not None:
+            condicoes.append("mes >= ?")
+            params.append(de)
+        if ate is not None:
+            condicoes.append("mes <= ?")
+            params.append(ate)
+        return (" WHERE " + " AND ".join(condicoes)) if condicoes else "", params
+
+    def receita(self, de: int | None = None, ate: int | None = None,
+                cliente: str | None = None) -> List[Dict[str, Any]]:
+        """Receita e número de pedidos por cliente e mês (AAAAMM inclusivos)."""
+        where, params = self._filtro(de, ate, cliente)
+        linhas = self._conn().execute(
+            "SELECT cliente, mes, pedidos, receita FROM receita_mensal" + where +
+            (" AND" if where else " WHERE") + " pedidos > 0"
+            " ORDER BY mes, receita DESC",
+            params
+        ).fetchall()
+        return [
+            {"cliente": c, "mes": _mes_texto(m), "pedidos": p, "receita": r / 100}
+            for c, m, p, r in linhas
+        ]
+
+    def uso(self, categoria: str, de: int | None = None, ate: int | None = None,
+            cliente: str | None = None, limite: int | None = None) -> List[Dict[str, Any]]:
+        """
+        Quantidades de uma categoria (``CATEGORIAS``) no período, da maior
+        para a menor: itens mais pedidos ou packs mais usados.
+        """
+        if categoria not in CATEGORIAS:
+            raise ValueError(f"Categoria inválida: '{categoria}'. Válidas: {', '.join(CATEGORIAS)}")
+        tabela = "uso_mensal" if cliente is not None else "uso_mensal_geral"
+        where, params = self._filtro(de, ate, cliente)
+        where += (" AND" if where else " WHERE") + " categoria = ?"
+        params.append(categoria)
+        linhas = self._conn().execute(
+            f"SELECT chave, SUM(quantidade) AS total FROM {tabela}" + where +
+            " GROUP BY chave HAVING total > 0 ORDER BY total DESC, chave"
+            + (" LIMIT ?" if limite else ""),
+            params + ([limite] if limite else [])
+        ).fetchall()
+        return [{"chave": chave, "quantidade": total} for chave, total in linhas]
+
+    def historico(self, cliente: str, limite: int = 50,
+                  antes: float | None = None) -> List[Dict[str, Any]]:
+        """Pedidos de um cliente, do mais recente para o mais antigo (paginável por ``antes``)."""
+        linhas = self._conn().execute(
+            "SELECT p.receipt_id, p.ts, p.catalogo, p.custo, p.exato, p.uso,"
+            " EXISTS (SELECT 1 FROM pedidos s WHERE s.substitui = p.id)"
+            " FROM pedidos p WHERE p.cliente_chave = ? AND p.ts < ?"
+            " ORDER BY p.ts DESC LIMIT ?",
+            (chave_cliente(cliente), antes if antes is not None else float("inf"), limite)
+        ).fetchall()
+        return [
+            {
+                "receipt_id": receipt_id,
+                "data": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+                "ts": ts,
+                "catalogo": catalogo,
+                "custo_total": custo / 100,
+                "exato": bool(exato),
+                "substituido": bool(substituido),
+                **json.loads(uso),
+            }
+            for receipt_id, ts, catalogo, custo, exato, uso, substituido in linhas
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ativo": True,
+                "ficheiro": self.path,
+                "fila": self._fila.qsize(),
+                "escritos": self.escritos,
+                "lotes": self.lotes,
+                "perdidos": self.perdidos,
+                "erros": self.erros,
+            }
+
+
+class _LivroDesligado:
+    """Livro nulo (sem ``LEDGER_PATH``): não regista nem tem histórico."""
+
+    def registar(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def esvaziar(self, timeout: float = 5.0) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ativo": False}
+
+
+def criar_livro_pedidos(path: str | None = LEDGER_PATH) -> LivroPedidos | _LivroDesligado:
+    if not path:
+        return _LivroDesligado()
+    livro = LivroPedidos(path)
+    atexit.register(livro.esvaziar)
+    return livro
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Relatórios do livro de pedidos")
+    parser.add_argument("relatorio", choices=("receita", "itens", "packs", "historico"))
+    parser.add_argument("cliente", nargs="?", help="Cliente (obrigatório em historico)")
+    parser.add_argument("--de", help="Primeiro mês (AAAA-MM)")
+    parser.add_argument("--ate", help="Último mês (AAAA-MM)")
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--ficheiro", default=LEDGER_PATH, required=LEDGER_PATH is None,
+                        help="Ficheiro do livro (por omissão, LEDGER_PATH)")
+    args = parser.parse_args()
+
+    livro = LivroPedidos(args.ficheiro)
+    de, ate = mes_de(args.de), mes_de(args.ate)
+    if args.relatorio == "receita":
+        dados: Any = livro.receita(de, ate, args.cliente)
+    elif args.relatorio == "itens":
+        dados = livro.uso("item", de, ate, args.cliente, args.limite)
+    elif args.relatorio == "packs":
+        dados = {c: livro.uso(c, de, ate, args.cliente) for c in ("pack_misto", "pack_camisas")}
+    elif args.cliente is None:
+        raise SystemExit("historico: indique o cliente")
+    else:
+        dados = livro.historico(args.cliente, args.limite)
+    print(json.dumps(dados, indent=2, ensure_ascii=False))
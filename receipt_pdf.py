@@ -0,0 +1,543 @@
+"""
+receipt_pdf.py
+==============
+Template e geração dos recibos em PDF (ReportLab).
+
+Tudo o que é igual em todos os recibos (paleta, estilos de parágrafo,
+TableStyle e o logo já reduzido para o banner de 50pt e codificado em JPEG)
+é preparado uma única vez por processo em ``ReceiptTemplate``. Por recibo
+só se constroem os dados da tabela e os totais.
+
+Os documentos usam platypus: pedidos longos passam para as páginas seguintes
+com o cabeçalho da tabela repetido, e ``generate_statement_pdf`` junta vários
+pedidos num extrato. ``iter_zip`` exporta muitos recibos num ZIP em streaming.
+
+    python receipt_pdf.py pedidos.json -o extrato.pdf
+    python receipt_pdf.py pedidos.json -o mes.zip --por-cliente
+"""
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from typing import Iterator
+from xml.sax.saxutils import escape
+import logging
+import os
+import threading
+import time
+import zipfile
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import (
+    BaseDocTemplate, Frame, KeepTogether, PageTemplate, Paragraph, Spacer,
+    Table, TableStyle,
+)
+
+from catalogos import registo_catalogos
+
+log = logging.getLogger(__name__)
+
+# Configurações de caminho
+BASE_DIR = Path(__file__).parent.resolve()
+LOGO_PATH = BASE_DIR / "logo.png"
+
+# Verificar existência do logo
+if not LOGO_PATH.exists():
+    log.warning("Arquivo de logo não encontrado: %s", LOGO_PATH)
+    LOGO_PATH = None
+
+# Processos usados na exportação em lote (ZIP)
+EXPORT_WORKERS = int(os.environ.get("PDF_EXPORT_WORKERS", 2))
+
+# Altura do banner do logo (pt) e resolução usada ao reduzir a imagem
+LOGO_HEIGHT = 50
+LOGO_PX_POR_PT = 3  # ~216 dpi
+
+# Paleta de cores
+COLORS = {
+    "background": colors.Color(249/255, 249/255, 247/255),  # #f9f9f7
+    "text_dark": colors.Color(24/255, 34/255, 50/255),     # #182232
+    "table_header": colors.Color(26/255, 45/255, 68/255),   # #1a2d44
+    "row_even": colors.white,
+    "row_odd": colors.Color(240/255, 240/255, 240/255),    # #f0f0f0
+    "total_bg": colors.Color(26/255, 45/255, 68/255),      # #1a2d44
+    "text_light": colors.white
+}
+
+
+class ReceiptTemplate:
+    """Partes fixas do recibo, preparadas uma vez e partilhadas entre recibos."""
+
+    def __init__(self, logo_path: Path | None = LOGO_PATH, redimensionar: bool = True):
+        # Estilos personalizados
+        styles = getSampleStyleSheet()
+        self.item_style = ParagraphStyle(
+            'Item',
+            parent=styles['BodyText'],
+            fontName='Helvetica',
+            fontSize=10,
+            leading=12,
+            textColor=COLORS["text_dark"]
+        )
+        self.total_style = ParagraphStyle(
+            'Total',
+            parent=styles['BodyText'],
+            fontName='Helvetica-Bold',
+            fontSize=12,
+            textColor=COLORS["text_light"]
+        )
+        self.cliente_style = ParagraphStyle(
+            'Cliente',
+            parent=styles['BodyText'],
+            fontName='Helvetica-Bold',
+            fontSize=12,
+            leftIndent=10,
+            spaceAfter=18,
+            textColor=COLORS["text_dark"]
+        )
+        self.pedido_style = ParagraphStyle(
+            'Pedido',
+            parent=self.cliente_style,
+            fontSize=10,
+            leftIndent=0,
+            spaceAfter=6
+        )
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), COLORS["table_header"]),
+            ('TEXTCOLOR', (0,0), (-1,0), COLORS["text_light"]),
+            ('FONT', (0,0), (-1,0), 'Helvetica-Bold', 10),
+            ('ALIGN', (1,0), (-1,0), 'CENTER'),
+            ('ALIGN', (2,0), (-1,-1), 'RIGHT'),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('INNERGRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+            ('BOX', (0,0), (-1,-1), 0.5, colors.lightgrey),
+            ('ROWBACKGROUNDS', (0,1), (-1,-1), [COLORS["row_even"], COLORS["row_odd"]])
+        ])
+        self.total_table_style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,-1), COLORS["total_bg"]),
+            ('TEXTCOLOR', (0,0), (-1,-1), COLORS["text_light"]),
+            ('FONT', (0,0), (-1,-1), 'Helvetica-Bold', 12),
+            ('ALIGN', (1,0), (1,0), 'RIGHT'),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('LEFTPADDING', (0,0), (-1,-1), 10),
+            ('RIGHTPADDING', (0,0), (-1,-1), 10),
+        ])
+
+        self.logo_path = logo_path
+        self._logo_jpeg = None
+        if logo_path and redimensionar:
+            self._logo_jpeg = self._reduzir_logo(logo_path)
+
+    @staticmethod
+    def _reduzir_logo(logo_path: Path) -> bytes | None:
+        """
+        Reduz o logo à altura do banner e codifica-o em JPEG: o ReportLab
+        embute JPEG tal como está, sem descodificar nem recomprimir.
+        """
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        with Image.open(logo_path) as imagem:
+            imagem = imagem.convert("RGB")
+            altura = LOGO_HEIGHT * LOGO_PX_POR_PT
+            if imagem.height > altura:
+                largura = round(imagem.width * altura / imagem.height)
+                imagem = imagem.resize((largura, altura), Image.LANCZOS)
+            buffer = BytesIO()
+            imagem.save(buffer, format="JPEG", quality=90, optimize=True)
+        return buffer.getvalue()
+
+    def logo(self) -> ImageReader | str | None:
+        """Imagem do logo para ``drawImage`` (um leitor novo por recibo)."""
+        if self._logo_jpeg is not None:
+            return ImageReader(BytesIO(self._logo_jpeg))
+        if self.logo_path and self.logo_path.exists():
+            return str(self.logo_path)
+        return None
+
+
+_template: ReceiptTemplate | None = None
+_template_lock = threading.Lock()
+
+
+def obter_template() -> ReceiptTemplate:
+    """Template partilhado do processo, criado na primeira utilização."""
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ReceiptTemplate()
+    return _template
+
+
+# ========================================================================== #
+#  GERADOR DE PDF PROFISSIONAL (PLATYPUS, MULTI-PÁGINA)
+# ========================================================================== #
+def _euros(valor):
+    return f"€{valor:.2f}".replace('.', ',')
+
+
+def _precos(resultado, precos=None, catalogo=None):
+    """
+    Preços unitários do recibo: os guardados com ele (``precos``, ver
+    ``MotorPrecos.precos_recibo``) ou, em recibos antigos, os da versão
+    ``catalogo`` (LookupError se já não existir).
+    """
+    if precos is not None:
+        return precos
+    return registo_catalogos.motor(catalogo).precos_recibo(resultado.get('detalhes') or {})
+
+
+def _linhas_tabela(resultado, item_style, precos):
+    """Linhas da tabela de itens (cabeçalho incluído), com os preços do recibo."""
+    data = [['Descrição', 'Quantidade', 'Preço Unitário', 'Subtotal']]
+    # Pedidos só com itens de preço fixo não trazem packs nem avulsos
+    detalhes = resultado.get('detalhes') or {}
+
+    # Adicionar itens fixos
+    for item, qty in (detalhes.get('itens_fixos') or {}).items():
+        if qty > 0:
+            preco = precos['itens'][item]
+            desc = item.replace('_', ' ').replace('ou', '/').title()
+            data.append([Paragraph(desc, item_style), str(qty), _euros(preco), _euros(qty*preco)])
+
+    # Adicionar packs mistos
+    for pack, qty in (detalhes.get('packs_mistos') or {}).items():
+        if qty > 0:
+            preco = precos['packs_mistos'][pack]
+            data.append([
+                Paragraph(f"Pack Misto {pack} peças", item_style),
+                str(qty),
+                _euros(preco),
+                _euros(qty*preco)
+            ])
+
+    # Adicionar packs de camisas
+    for pack, qty in (detalhes.get('packs_camisas') or {}).items():
+        if qty > 0:
+            preco = precos['packs_camisas'][pack]
+            data.append([
+                Paragraph(f"Pack Camisas {pack}", item_style),
+                str(qty),
+                _euros(preco),
+                _euros(qty*preco)
+            ])
+
+    # Adicionar itens avulsos
+    for item, qty in (detalhes.get('itens_avulsos') or {}).items():
+        if qty > 0:
+            preco = precos['itens'][item]
+            desc = item.replace('_', ' ').title()
+            data.append([Paragraph(desc, item_style), str(qty), _euros(preco), _euros(qty*preco)])
+
+    return data
+
+
+class _ReciboDocTemplate(BaseDocTemplate):
+    """A4 com fundo, logo no topo e rodapé numerado em todas as páginas."""
+
+    def __init__(self, destino, template, rodape, **kwargs):
+        super().__init__(
+            destino,
+            pagesize=A4,
+            leftMargin=20,
+            rightMargin=20,
+            topMargin=20 + LOGO_HEIGHT + 20,
+            bottomMargin=40,
+            author="Engomadoria Teresa",
+            **kwargs
+        )
+        self.template = template
+        self.rodape = rodape
+        frame = Frame(
+            self.leftMargin, self.bottomMargin, self.width, self.height,
+            leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0,
+            id='conteudo'
+        )
+        self.addPageTemplates([
+            PageTemplate(id='recibo', frames=[frame], onPage=self._desenhar_pagina)
+        ])
+
+    def _desenhar_pagina(self, c, doc):
+        width, height = A4
+
+        # Fundo
+        c.saveState()
+        c.setFillColor(COLORS["background"])
+        c.rect(0, 0, width, height, fill=1, stroke=0)
+
+        # Logo no topo (largura total)
+        logo_y = height - LOGO_HEIGHT - 20
+        logo = self.template.logo()
+        if logo is not None:
+            c.drawImage(
+                logo,
+                x=20,
+                y=logo_y,
+                width=width - 40,
+                height=LOGO_HEIGHT,
+                preserveAspectRatio=True,
+                mask='auto'
+            )
+        else:
+            # Fallback caso o logo não exista
+            c.setFillColor(COLORS["table_header"])
+            c.rect(20, logo_y, width - 40, LOGO_HEIGHT, fill=1, stroke=0)
+            c.setFillColor(COLORS["text_light"])
+            c.setFont("Helvetica-Bold", 16)
+            c.drawCentredString(width/2, logo_y + LOGO_HEIGHT/2, "ENGOMADORIA TERESA")
+
+        # Rodapé com data, nome do cliente e página
+        c.setFillColor(COLORS["text_dark"])
+        c.setFont("Helvetica", 8)
+        c.drawCentredString(width/2, 20, f"{self.rodape} | Página {doc.page}")
+        c.restoreState()
+
+
+def _bloco_pedido(resultado, template, largura, titulo="TOTAL", precos=None, catalogo=None):
+    """Tabela de itens (cabeçalho repetido ao mudar de página) + faixa do total."""
+    table = Table(
+        _linhas_tabela(resultado, template.item_style, _precos(resultado, precos, catalogo)),
+        colWidths=[largura*0.4, largura*0.15, largura*0.2, largura*0.25],
+        repeatRows=1
+    )
+    table.setStyle(template.table_style)
+
+    return [table, Spacer(1, 10), _faixa_total(resultado['custo_total'], template, largura, titulo)]
+
+
+def _faixa_total(valor, template, largura, titulo="TOTAL"):
+    total = Table([[titulo, _euros(valor)]], colWidths=[largura*0.5, largura*0.5], rowHeights=30)
+    total.setStyle(template.total_table_style)
+    return total
+
+
+def _rodape(cliente_nome, prefixo="Recibo gerado em"):
+    footer_text = f"{prefixo} {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+    if cliente_nome:
+        footer_text += f" | Cliente: {cliente_nome}"
+    return footer_text + " | Engomadoria Teresa"
+
+
+def generate_receipt_pdf(resultado, cliente_nome="", template=None, destino=None,
+                         catalogo=None, precos=None):
+    """
+    Gera PDF profissional com design atualizado; pedidos longos continuam
+    nas páginas seguintes com o cabeçalho da tabela repetido. Os preços
+    unitários são os cobrados: ``precos`` guardados com o recibo ou, em
+    recibos sem eles, os da versão ``catalogo`` (sem ela, o ``CATALOG``
+    embutido).
+
+    ``destino`` pode ser um caminho ou um objeto binário com ``write``
+    (ex.: ``BytesIO``, resposta em streaming, ficheiro aberto por um job em
+    lote). Devolve o destino usado; sem destino, o PDF é gerado em memória
+    e devolvido em bytes (nada fica no disco).
+    """
+    try:
+        template = template or obter_template()
+        buffer = BytesIO() if destino is None else None
+
+        doc = _ReciboDocTemplate(buffer or destino, template, _rodape(cliente_nome), title="Recibo")
+        story = []
+        if cliente_nome:
+            story.append(Paragraph(f"Cliente: {escape(cliente_nome)}", template.cliente_style))
+        story.extend(_bloco_pedido(resultado, template, doc.width, precos=precos, catalogo=catalogo))
+        doc.build(story)
+        return destino if buffer is None else buffer.getvalue()
+
+    except Exception as e:
+        log.exception("Erro ao gerar PDF: %s", e)
+        raise
+
+
+def generate_statement_pdf(entradas, cliente_nome="", template=None, destino=None):
+    """
+    Extrato com vários pedidos (ex.: mensal de um cliente). ``entradas`` são
+    dicts como os do result store: {"result", "cliente", "timestamp",
+    "precos", "catalogo"}.
+    Cada pedido fica junto numa página sempre que cabe; no fim, o total geral.
+    ``destino`` como em ``generate_receipt_pdf`` (sem ele, devolve os bytes).
+    """
+    try:
+        template = template or obter_template()
+        buffer = BytesIO() if destino is None else None
+
+        doc = _ReciboDocTemplate(
+            buffer or destino, template, _rodape(cliente_nome, "Extrato gerado em"), title="Extrato"
+        )
+        titulo = "Extrato" + (f" — {cliente_nome}" if cliente_nome else "")
+        story = [Paragraph(escape(titulo), template.cliente_style)]
+        total_geral = 0.0
+        for i, entrada in enumerate(entradas, start=1):
+            resultado = entrada["result"]
+            data = datetime.fromtimestamp(entrada.get("timestamp", time.time()))
+            cabecalho = f"Pedido {i} — {data.strftime('%d/%m/%Y %H:%M')}"
+            if entrada.get("cliente") and entrada["cliente"] != cliente_nome:
+                cabecalho += f" — {entrada['cliente']}"
+            story.append(KeepTogether(
+                [Paragraph(escape(cabecalho), template.pedido_style)]
+                + _bloco_pedido(resultado, template, doc.width, "SUBTOTAL",
+                                entrada.get("precos"), entrada.get("catalogo"))
+            ))
+            story.append(Spacer(1, 16))
+            total_geral += resultado['custo_total']
+
+        if entradas:
+            story.append(_faixa_total(total_geral, template, doc.width, "TOTAL GERAL"))
+        doc.build(story)
+        return destino if buffer is None else buffer.getvalue()
+
+    except Exception as e:
+        log.exception("Erro ao gerar extrato: %s", e)
+        raise
+
+
+def render_receipt_pdf(resultado, cliente_nome="", template=None, catalogo=None,
+                       precos=None) -> bytes:
+    """Renderiza o recibo em memória (BytesIO), sem tocar no disco."""
+    return generate_receipt_pdf(resultado, cliente_nome, template, catalogo=catalogo, precos=precos)
+
+
+def render_statement_pdf(entradas, cliente_nome="", template=None) -> bytes:
+    """Renderiza um extrato em memória (BytesIO)."""
+    return generate_statement_pdf(entradas, cliente_nome, template)
+
+
+# ========================================================================== #
+#  EXPORTAÇÃO EM LOTE (PDF ÚNICO OU ZIP EM STREAMING)
+# ========================================================================== #
+def _render_documento(documento):
+    """
+    Renderiza uma entrada do ZIP. ``documento`` é (nome, conteudo), em que
+    conteudo são bytes já renderizados ou (entradas, cliente_nome): uma
+    entrada dá um recibo, várias dão um extrato.
+    """
+    nome, conteudo = documento
+    if isinstance(conteudo, bytes):
+        return nome, conteudo
+    entradas, cliente_nome = conteudo
+    if len(entradas) == 1:
+        entrada = entradas[0]
+        return nome, render_receipt_pdf(
+            entrada["result"], cliente_nome,
+            catalogo=entrada.get("catalogo"), precos=entrada.get("precos")
+        )
+    return nome, render_statement_pdf(entradas, cliente_nome)
+
+
+class _ZipStream(RawIOBase):
+    """Destino não pesquisável para o zipfile, esvaziado a cada entrada."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def esvaziar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def iter_zip(documentos, workers=None) -> Iterator[bytes]:
+    """
+    Gera um ZIP em streaming com um PDF por documento. A renderização
+    (ReportLab, CPU) corre num pool de processos quando há vários
+    documentos; cada PDF é enviado assim que fica pronto, pela ordem dada.
+    """
+    workers = workers if workers is not None else EXPORT_WORKERS
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as arquivo:
+        if workers > 1 and len(documentos) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(documentos))) as pool:
+                for nome, pdf in pool.map(_render_documento, documentos, chunksize=4):
+                    arquivo.writestr(nome, pdf)
+                    yield stream.esvaziar()
+        else:
+            for nome, pdf in map(_render_documento, documentos):
+                arquivo.writestr(nome, pdf)
+                yield stream.esvaziar()
+    yield stream.esvaziar()
+
+
+def exportar_zip(documentos, destino, workers=None) -> None:
+    """Escreve o ZIP de ``iter_zip`` num caminho ou objeto binário."""
+    if isinstance(destino, (str, Path)):
+        with open(destino, "wb") as f:
+            exportar_zip(documentos, f, workers)
+        return
+    for parte in iter_zip(documentos, workers):
+        destino.write(parte)
+
+
+# ========================================================================== #
+#  CLI PARA EXTRATOS MENSAIS
+# ========================================================================== #
+if __name__ == "__main__":
+    import argparse
+    import json
+    from laundry_optimizer_final import gpt_optimize_handler
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Exportação de recibos e extratos em PDF")
+    parser.add_argument("pedidos", help="JSON com lista de pedidos ({'items': {...}, 'cliente': ...})")
+    parser.add_argument("-o", "--saida", required=True, help="Ficheiro .pdf (extrato único) ou .zip")
+    parser.add_argument("--por-cliente", action="store_true",
+                        help="No ZIP, um extrato por cliente em vez de um recibo por pedido")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processos para renderizar o ZIP")
+    args = parser.parse_args()
+
+    with open(args.pedidos, encoding="utf-8") as f:
+        pedidos = json.load(f)
+
+    itens = [p.get("items", p) for p in pedidos]
+    itens = [{k: v for k, v in i.items() if k != "cliente"} for i in itens]
+    agora = time.time()
+    entradas = []
+    for pedido, items in zip(pedidos, itens):
+        # Catálogo do cliente (LAUNDRY_CATALOGOS_PATH), como na API
+        _, motor = registo_catalogos.selecionar(pedido.get("cliente"))
+        resposta = gpt_optimize_handler(items, motor=motor)
+        if resposta["status"] != "sucesso":
+            raise SystemExit(f"Pedido inválido {pedido}: {resposta['mensagem']}")
+        entradas.append({
+            "result": resposta,
+            "cliente": pedido.get("cliente", ""),
+            "timestamp": pedido.get("timestamp", agora),
+            "catalogo": motor.versao,
+            "precos": motor.precos_recibo(resposta["detalhes"])
+        })
+
+    if args.saida.endswith(".zip"):
+        if args.por_cliente:
+            por_cliente = {}
+            for entrada in entradas:
+                por_cliente.setdefault(entrada["cliente"], []).append(entrada)
+            documentos = [
+                (f"extrato_{(cliente or 'sem_cliente').replace(' ', '_')}.pdf", (lista, cliente))
+                for cliente, lista in por_cliente.items()
+            ]
+        else:
+            documentos = [
+                (f"recibo_{i:04d}.pdf", ([entrada], entrada["cliente"]))
+                for i, entrada in enumerate(entradas, start=1)
+            ]
+        exportar_zip(documentos, args.saida, args.workers)
+    else:
+        clientes = {e["cliente"] for e in entradas}
+        generate_statement_pdf(entradas, clientes.pop() if len(clientes) == 1 else "",
+                               destino=args.saida)
+    print(f"{len(entradas)} pedido(s) exportados para {args.saida}")
@@ -0,0 +1,192 @@
+"""
+request_log.py
+==============
+Registo estruturado e amostrado dos pedidos HTTP.
+
+    - os registos vão para uma fila (``QueueHandler``) e são formatados e
+      escritos por uma thread própria (``QueueListener``): a I/O de logging
+      nunca bloqueia as threads de pedido
+    - formatação preguiçosa: a mensagem e o JSON só são construídos na thread
+      do listener, e apenas para registos que passam o nível
+    - uma linha JSON por pedido (método, rota, estado, duração), amostrada
+      com ``LOG_SAMPLE_RATE``; erros (estado >= 400) são sempre registados
+    - cada pedido tem um ID de correlação (``X-Request-ID``) presente em todos
+      os registos feitos durante o pedido; em /optimize é o próprio
+      ``receipt_id``, e em /download_pdf o ``receipt_id`` do URL
+
+Configuração por ambiente: ``LOG_LEVEL`` (INFO), ``LOG_SAMPLE_RATE`` (0.1)
+e ``LOG_FORMAT`` (json | texto).
+"""
+
+from __future__ import annotations
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.1))
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+
+# Atributos padrão de um LogRecord (o resto são campos passados em ``extra``)
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registo, incluindo os campos passados em ``extra``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados["exc"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class _FiltroCorrelacao(logging.Filter):
+    """Acrescenta o ID de correlação do pedido em curso (se houver)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id") and has_request_context():
+            record.request_id = g.get("request_id")
+        return True
+
+
+def _garantir_request_id(record: logging.LogRecord) -> bool:
+    # O formato de texto usa %(request_id)s; registos fora de pedidos têm "-"
+    if getattr(record, "request_id", None) is None:
+        record.request_id = "-"
+    return True
+
+
+_destino = logging.StreamHandler(sys.stderr)
+_destino.setFormatter(
+    FormatadorJSON() if LOG_FORMAT == "json"
+    else logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+)
+_destino.addFilter(_garantir_request_id)
+
+_listener: QueueListener | None = None
+_listener_pid: int | None = None
+_listener_lock = threading.Lock()
+
+
+def _arrancar_listener(fila: queue.SimpleQueue) -> None:
+    global _listener, _listener_pid
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener = QueueListener(fila, _destino, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+class _QueueHandlerPreguicoso(QueueHandler):
+    """
+    Não formata na thread do pedido: o registo segue tal como está para o
+    listener (a fila é do próprio processo, não há serialização). Após um
+    fork (workers do gunicorn, processos do pool de solvers) a thread do
+    listener não existe no filho, e é arrancada no primeiro registo.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if _listener_pid != os.getpid():
+            _arrancar_listener(self.queue)
+        super().emit(record)
+
+
+def configurar_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Substitui os handlers do logger raiz por um ``QueueHandler`` servido por
+    um ``QueueListener`` (idempotente).
+    """
+    raiz = logging.getLogger()
+    raiz.setLevel(level)
+    if any(isinstance(h, _QueueHandlerPreguicoso) for h in raiz.handlers):
+        return
+
+    entrada = _QueueHandlerPreguicoso(queue.SimpleQueue())
+    entrada.addFilter(_FiltroCorrelacao())
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(entrada)
+    _arrancar_listener(entrada.queue)
+
+
+def parar_logging() -> None:
+    """Escoa a fila e pára o listener (no fim do processo)."""
+    global _listener, _listener_pid
+    with _listener_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+        _listener_pid = None
+
+
+atexit.register(parar_logging)
+
+
+_log_pedidos = logging.getLogger("engomadoria.pedidos")
+
+
+def registar_pedido(metodo: str, rota: str, estado: int, inicio: float,
+                    request_id: str | None = None,
+                    sample_rate: float = LOG_SAMPLE_RATE) -> None:
+    """Linha estruturada de um pedido: amostrada se correu bem, sempre se falhou."""
+    nivel = logging.WARNING if estado >= 400 else logging.INFO
+    if (nivel > logging.INFO or random.random() < sample_rate) and _log_pedidos.isEnabledFor(nivel):
+        extra = {
+            "metodo": metodo,
+            "rota": rota,
+            "estado": estado,
+            "duracao_ms": round(1000 * (time.perf_counter() - inicio), 3),
+        }
+        if request_id is not None:
+            extra["request_id"] = request_id
+        _log_pedidos.log(nivel, "pedido", extra=extra)
+
+
+def novo_request_id() -> str:
+    return str(uuid.uuid4())
+
+
+def instalar(app, sample_rate: float = LOG_SAMPLE_RATE) -> None:
+    """Regista os hooks de correlação e o registo amostrado na app Flask."""
+
+    @app.before_request
+    def _abrir_pedido():
+        # /download_pdf/<id>: o ID de correlação é o próprio receipt_id
+        receipt_id = (request.view_args or {}).get("receipt_id")
+        g.request_id = receipt_id or novo_request_id()
+        g.inicio_pedido = time.perf_counter()
+
+    @app.after_request
+    def _fechar_pedido(response):
+        request_id = g.get("request_id")
+        if request_id:
+            response.headers["X-Request-ID"] = request_id
+        registar_pedido(
+            request.method, request.path, response.status_code,
+            g.get("inicio_pedido", time.perf_counter()), sample_rate=sample_rate
+        )
+        return response
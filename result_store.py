@@ -0,0 +1,255 @@
+"""
+result_store.py
+===============
+Armazenamento dos resultados de otimização (recibos) entre pedidos.
+
+Substitui o antigo dicionário ``result_cache`` por processo. Dois backends
+com a mesma interface:
+
+    - ``MemoryResultStore``: LRU + TTL no próprio processo, com expiração
+      O(1) amortizada e limites de entradas e de bytes (desenvolvimento,
+      testes, servidor de um só processo)
+    - ``SQLiteResultStore``: ficheiro SQLite em modo WAL partilhado por todos
+      os workers do gunicorn, para que qualquer worker sirva qualquer recibo
+
+``criar_result_store()`` escolhe o backend pelas variáveis de ambiente
+``RESULT_STORE`` (memory | sqlite) e ``RESULT_STORE_PATH``.
+"""
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Dict
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Tempo de vida de um recibo (30 minutos)
+RESULT_TTL = 1800
+
+
+class ResultStore(ABC):
+    """
+    Interface comum: entradas são dicts {"result", "cliente", "timestamp"}.
+    Um backend que não implemente todos os métodos falha ao ser criado.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class MemoryResultStore(ResultStore):
+    """
+    LRU + TTL em memória. A ordem de acesso (LRU) é mantida num OrderedDict e
+    a ordem de expiração numa fila: como o TTL é fixo, expiram sempre primeiro
+    as entradas mais antigas, e basta olhar para a cabeça da fila.
+    """
+
+    def __init__(self, ttl: float = RESULT_TTL, max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[str, tuple] = OrderedDict()  # key -> (entry, size, expira)
+        self._expiracoes: deque = deque()  # (expira, key)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remover(self, key: str) -> None:
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
+
+    def _expirar(self, agora: float) -> None:
+        while self._expiracoes and self._expiracoes[0][0] <= agora:
+            expira, key = self._expiracoes.popleft()
+            item = self._items.get(key)
+            # Ignorar marcas antigas de entradas entretanto substituídas
+            if item is not None and item[2] == expira:
+                self._remover(key)
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        with self._lock:
+            self._expirar(time.time())
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        size = len(json.dumps(entry, ensure_ascii=False, default=str))
+        agora = time.time()
+        with self._lock:
+            self._expirar(agora)
+            if key in self._items:
+                self._remover(key)
+            expira = agora + self.ttl
+            self._items[key] = (entry, size, expira)
+            self._expiracoes.append((expira, key))
+            self._bytes += size
+            while self._items and (
+                len(self._items) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._remover(next(iter(self._items)))
+            # A fila de expirações não deve crescer além das entradas vivas
+            if len(self._expiracoes) > 2 * self.max_entries:
+                self._expiracoes = deque(
+                    (e, k) for e, k in self._expiracoes
+                    if k in self._items and self._items[k][2] == e
+                )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._items:
+                self._remover(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expirar(time.time())
+            return {
+                "backend": "memory",
+                "entradas": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SQLiteResultStore(ResultStore):
+    """
+    Backend partilhado entre processos: SQLite em modo WAL (leitores não
+    bloqueiam o escritor). Uma ligação por thread; expiração e limites são
+    aplicados periodicamente nas escritas.
+    """
+
+    def __init__(self, path: str, ttl: float = RESULT_TTL, max_entries: int = 100000,
+                 max_bytes: int = 256 * 1024 * 1024, purge_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._escritas = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resultados ("
+                " id TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " expira REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_expira ON resultados(expira)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # Ligação por thread e por processo (não atravessa fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        row = self._conn().execute(
+            "SELECT payload FROM resultados WHERE id = ? AND expira > ?",
+            (key, time.time())
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        payload = json.dumps(entry, ensure_ascii=False, default=str)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO resultados (id, payload, expira) VALUES (?, ?, ?)",
+            (key, payload, time.time() + self.ttl)
+        )
+        with self._lock:
+            self._escritas += 1
+            purgar = self._escritas % self.purge_every == 0
+        if purgar:
+            self.purge()
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM resultados WHERE id = ?", (key,))
+
+    def purge(self) -> None:
+        """Remove expirados e, se preciso, os mais antigos até cumprir os limites."""
+        conn = self._conn()
+        conn.execute("DELETE FROM resultados WHERE expira <= ?", (time.time(),))
+        total, tamanho = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM resultados"
+        ).fetchone()
+        if total > self.max_entries or tamanho > self.max_bytes:
+            excesso = max(
+                total - self.max_entries,
+                int(total * (tamanho - self.max_bytes) / tamanho) + 1 if tamanho > self.max_bytes else 0
+            )
+            conn.execute(
+                "DELETE FROM resultados WHERE id IN ("
+                " SELECT id FROM resultados ORDER BY expira LIMIT ?)",
+                (excesso,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        total, tamanho = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM resultados WHERE expira > ?",
+            (time.time(),)
+        ).fetchone()
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "entradas": total,
+                "bytes": tamanho,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def criar_result_store(logger: logging.Logger | None = None) -> ResultStore:
+    """
+    Backend configurado por ambiente. Por omissão usa SQLite em produção
+    (vários workers) e memória em desenvolvimento.
+    """
+    padrao = "sqlite" if os.environ.get("PRODUCTION") else "memory"
+    backend = os.environ.get("RESULT_STORE", padrao)
+    if backend == "sqlite":
+        path = os.environ.get(
+            "RESULT_STORE_PATH",
+            os.path.join(tempfile.gettempdir(), "engomadoria_resultados.sqlite3")
+        )
+        (logger or logging.getLogger(__name__)).info("Result store SQLite em %s", path)
+        return SQLiteResultStore(path)
+    return MemoryResultStore()
@@ -0,0 +1,394 @@
+"""
+solver_pool.py
+==============
+Camada de execução dos solves fora das threads de pedido.
+
+Os solves correm num ``ProcessPoolExecutor`` limitado de processos já
+aquecidos (otimizador importado e tabela de custos carregada), com:
+    - limite de pedidos pendentes (backpressure): acima dele o pedido é
+      recusado de imediato com ``SolverOcupado`` (HTTP 503 + Retry-After)
+    - tempo limite por solve: ``SolverTempoEsgotado`` (HTTP 504). Conta
+      desde a submissão, incluindo a espera na fila do pool: com carga, um
+      solve pode esgotá-lo antes de começar. Se ainda estiver na fila é só
+      cancelado; se já foi entregue a um processo (o pool entrega até
+      ``max_workers + 1`` de cada vez), o pool é reiniciado para não ficar
+      com um processo preso, e os outros solves em curso nele falham também
+    - prazo opcional por pedido, mais curto: ``SolverAtrasado`` devolve o
+      controlo ao pedido (que responde com uma heurística) enquanto o solve
+      continua em segundo plano até ao tempo limite; o resultado chega pelos
+      callbacks de ``SolvePendente.quando_concluir``
+    - métricas de profundidade da fila e tempo de solve (só dos solves
+      concluídos; tempos esgotados e erros contam à parte); os spans medidos
+      nos processos do pool são devolvidos e registados no processo web
+
+Com ``max_workers=0`` o solve corre na própria thread (mantendo o limite de
+pendentes e as métricas), útil em desenvolvimento.
+"""
+
+from __future__ import annotations
+from concurrent.futures import (
+    CancelledError, Future, ProcessPoolExecutor, TimeoutError as FutureTimeout,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+
+from metricas import METRICAS_ATIVAS, executar_com_spans, registar_spans
+
+
+class SolverOcupado(RuntimeError):
+    """Fila de solves cheia; o cliente deve tentar de novo após ``retry_after`` s."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Servidor ocupado, tente novamente dentro de alguns segundos")
+        self.retry_after = retry_after
+
+
+class SolverTempoEsgotado(RuntimeError):
+    """
+    O solve não terminou dentro do tempo limite (contado desde a submissão).
+    Se já estava a correr, o pool foi reiniciado e os outros solves em curso
+    nele também falharam.
+    """
+
+
+class SolvePendente:
+    """Solve que continua em segundo plano depois de ``SolverAtrasado``."""
+    __slots__ = ("_lock", "_callbacks", "_concluido", "resultado")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[Any], None]] = []
+        self._concluido = False
+        self.resultado: Any = None
+
+    def quando_concluir(self, callback: Callable[[Any], None]) -> None:
+        """
+        Chama ``callback(resultado)`` quando o solve terminar com sucesso (já,
+        se já terminou), numa thread do executor. Se o solve falhar ou
+        esgotar o tempo limite, o callback nunca é chamado.
+        """
+        with self._lock:
+            if not self._concluido:
+                self._callbacks.append(callback)
+                return
+        callback(self.resultado)
+
+    def _concluir(self, resultado: Any, log: logging.Logger) -> None:
+        with self._lock:
+            self.resultado = resultado
+            self._concluido = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(resultado)
+            except Exception:
+                log.exception("Erro num callback de solve concluído")
+
+
+class SolverAtrasado(RuntimeError):
+    """O solve não terminou dentro do prazo do pedido; continua em ``pendente``."""
+
+    def __init__(self, prazo: float, pendente: SolvePendente):
+        super().__init__(f"O cálculo excedeu o prazo de {1000 * prazo:g} ms")
+        self.pendente = pendente
+
+
+def _aquecer() -> None:
+    """Inicializador dos processos: importa o otimizador e carrega as tabelas."""
+    from catalogos import registo_catalogos
+    registo_catalogos.aquecer(completo=False)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class SolverExecutor:
+    """Executor limitado de solves com backpressure, timeout e métricas."""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_pending: int = 16,
+        timeout: float = 10.0,
+        logger: logging.Logger | None = None
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.log = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_pid: int | None = None
+        self._pendentes = 0
+
+        # Métricas
+        self.concluidos = 0
+        self.rejeitados = 0
+        self.tempos_esgotados = 0
+        self.atrasados = 0
+        self.erros = 0
+        self._tempo_total = 0.0
+        self._tempo_max = 0.0
+
+    # ------------------------------------------------------------------ #
+    #  POOL
+    # ------------------------------------------------------------------ #
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        # Criado preguiçosamente e recriado após fork (workers do gunicorn)
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_aquecer
+                )
+                self._pool_pid = os.getpid()
+                for _ in range(self.max_workers):
+                    self._pool.submit(_ping)
+            return self._pool
+
+    def _reiniciar_pool(self, pool: ProcessPoolExecutor | None) -> None:
+        """
+        Descarta ``pool`` (ex.: processo preso num solve), se ainda for o
+        atual: falhas de solves de um pool já substituído não reiniciam o novo.
+        """
+        with self._lock:
+            if pool is None or self._pool is not pool:
+                return
+            self._pool = None
+        processos = list(getattr(pool, "_processes", {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for processo in processos:
+            processo.terminate()
+        # Aquecer já o substituto, para o próximo pedido não pagar o arranque
+        self.aquecer()
+
+    def aquecer(self) -> None:
+        """Arranca os processos do pool antecipadamente."""
+        if self.max_workers > 0:
+            self._obter_pool()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    # ------------------------------------------------------------------ #
+    #  EXECUÇÃO
+    # ------------------------------------------------------------------ #
+    def _retry_after(self) -> int:
+        media = self._tempo_total / self.concluidos if self.concluidos else 1.0
+        return max(1, math.ceil(self._pendentes * media / max(1, self.max_workers)))
+
+    def _reservar(self) -> float:
+        """Ocupa um lugar na fila de pendentes; devolve o instante de início."""
+        with self._lock:
+            if self._pendentes >= self.max_pending:
+                self.rejeitados += 1
+                raise SolverOcupado(self._retry_after())
+            self._pendentes += 1
+        return time.perf_counter()
+
+    def _libertar(self, inicio: float, sucesso: bool) -> None:
+        """Liberta o lugar na fila; só os solves com sucesso entram nos tempos."""
+        duracao = time.perf_counter() - inicio
+        with self._lock:
+            self._pendentes -= 1
+            if sucesso:
+                self.concluidos += 1
+                self._tempo_total += duracao
+                self._tempo_max = max(self._tempo_max, duracao)
+
+    def _erro(self, erro: BaseException, pool: ProcessPoolExecutor | None) -> BaseException:
+        """
+        Conta o erro e devolve a exceção a levantar: um solve apanhado no
+        reinício do pool por causa de outro (tempo esgotado ou processo
+        morto) passa a ``SolverTempoEsgotado`` (HTTP 504) em vez de erro interno.
+        """
+        with self._lock:
+            self.erros += 1
+            reiniciado = pool is not None and self._pool is not pool
+        if isinstance(erro, (BrokenProcessPool, CancelledError, asyncio.CancelledError)):
+            if reiniciado:
+                return SolverTempoEsgotado(
+                    "O cálculo foi interrompido pelo reinício do pool de solvers; tente novamente"
+                )
+            if isinstance(erro, BrokenProcessPool):
+                self._reiniciar_pool(pool)
+        return erro
+
+    def _submeter(self, fn: Callable[..., Any], *args: Any) -> tuple[ProcessPoolExecutor, Future]:
+        pool = self._obter_pool()
+        if not METRICAS_ATIVAS:
+            return pool, pool.submit(fn, *args)
+        # Os spans medidos no processo do pool vêm junto com o resultado
+        return pool, pool.submit(executar_com_spans, fn, *args)
+
+    @staticmethod
+    def _resultado(valor: Any) -> Any:
+        if not METRICAS_ATIVAS:
+            return valor
+        resultado, spans = valor
+        registar_spans(spans)
+        return resultado
+
+    def _tempo_esgotado(self, pool: ProcessPoolExecutor | None,
+                        future: Future | None) -> SolverTempoEsgotado:
+        with self._lock:
+            self.tempos_esgotados += 1
+        if future is not None and future.cancel():
+            # Ainda na fila do pool: nenhum processo preso, nada a reiniciar
+            self.log.error("Solve não começou em %.1fs: pool sobrecarregado", self.timeout)
+            return SolverTempoEsgotado(
+                f"O cálculo não começou dentro do tempo limite de {self.timeout:g}s "
+                "(servidor sobrecarregado)"
+            )
+        # Terminar o processo preso derruba o pool inteiro: os outros solves
+        # em curso nele falham (BrokenProcessPool) e os pedidos recebem erro
+        self.log.error("Solve excedeu %.1fs; a reiniciar o pool (com até %d outros solves em curso)",
+                       self.timeout, max(0, self._pendentes - 1))
+        self._reiniciar_pool(pool)
+        return SolverTempoEsgotado(f"O cálculo excedeu o tempo limite de {self.timeout:g}s")
+
+    def _atrasar(self, pool: ProcessPoolExecutor, future: Future, prazo: float,
+                 inicio: float) -> SolverAtrasado:
+        """
+        O solve passou o prazo: uma thread continua à espera dele até ao tempo
+        limite e só então liberta o lugar na fila (o processo continua ocupado).
+        """
+        with self._lock:
+            self.atrasados += 1
+        pendente = SolvePendente()
+        threading.Thread(
+            target=self._continuar, args=(pool, future, pendente, inicio),
+            name="solve-atrasado", daemon=True
+        ).start()
+        return SolverAtrasado(prazo, pendente)
+
+    def _continuar(self, pool: ProcessPoolExecutor, future: Future,
+                   pendente: SolvePendente, inicio: float) -> None:
+        sucesso = False
+        try:
+            restante = self.timeout - (time.perf_counter() - inicio)
+            resultado = self._resultado(future.result(timeout=max(0.0, restante)))
+            sucesso = True
+        except FutureTimeout:
+            self._tempo_esgotado(pool, future)
+        except Exception as erro:
+            self.log.exception("Erro no solve em segundo plano")
+            self._erro(erro, pool)
+        finally:
+            self._libertar(inicio, sucesso)
+        if sucesso:
+            pendente._concluir(resultado, self.log)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, prazo: float | None = None) -> Any:
+        """
+        Executa ``fn(*args)`` no pool e devolve o resultado (bloqueante).
+        Com ``prazo`` (s) menor que o tempo limite, desiste de esperar ao fim
+        dele com ``SolverAtrasado``; o solve continua em segundo plano.
+        """
+        inicio = self._reservar()
+        pool = future = None
+        atrasado = sucesso = False
+        try:
+            if self.max_workers <= 0:
+                resultado = fn(*args)
+            else:
+                pool, future = self._submeter(fn, *args)
+                if prazo is not None and prazo < self.timeout:
+                    try:
+                        valor = future.result(timeout=prazo)
+                    except FutureTimeout:
+                        atrasado = True
+                        raise self._atrasar(pool, future, prazo, inicio) from None
+                else:
+                    valor = future.result(timeout=self.timeout)
+                resultado = self._resultado(valor)
+            sucesso = True
+            return resultado
+        except FutureTimeout:
+            raise self._tempo_esgotado(pool, future) from None
+        except SolverAtrasado:
+            raise
+        except Exception as erro:
+            substituto = self._erro(erro, pool)
+            if substituto is erro:
+                raise
+            raise substituto from erro
+        finally:
+            if not atrasado:
+                self._libertar(inicio, sucesso)
+
+    async def submit_async(self, fn: Callable[..., Any], *args: Any,
+                           prazo: float | None = None) -> Any:
+        """
+        Versão para ASGI de ``submit``: espera pelo resultado no event loop,
+        sem ocupar uma thread por pedido. Mesmos limites, prazo, timeout e
+        métricas.
+        """
+        inicio = self._reservar()
+        loop = asyncio.get_running_loop()
+        pool = future = None
+        atrasado = sucesso = False
+        try:
+            if self.max_workers <= 0:
+                resultado = await loop.run_in_executor(None, fn, *args)
+            else:
+                pool, future = self._submeter(fn, *args)
+                if prazo is not None and prazo < self.timeout:
+                    # asyncio.wait não cancela o solve quando o prazo passa
+                    feitos, _ = await asyncio.wait({asyncio.wrap_future(future)}, timeout=prazo)
+                    if not feitos:
+                        atrasado = True
+                        raise self._atrasar(pool, future, prazo, inicio)
+                valor = await asyncio.wait_for(
+                    asyncio.wrap_future(future), self.timeout - (time.perf_counter() - inicio)
+                )
+                resultado = self._resultado(valor)
+            sucesso = True
+            return resultado
+        except asyncio.TimeoutError:
+            # Terminar processos bloqueia: fora do event loop
+            raise await loop.run_in_executor(None, self._tempo_esgotado, pool, future) from None
+        except SolverAtrasado:
+            raise
+        except asyncio.CancelledError as erro:
+            # Solve cancelado pelo reinício do pool, não o pedido cancelado
+            if asyncio.current_task().cancelling() or future is None or not future.cancelled():
+                raise
+            raise self._erro(erro, pool) from None
+        except Exception as erro:
+            # Reiniciar o pool (BrokenProcessPool) também bloqueia
+            substituto = await loop.run_in_executor(None, self._erro, erro, pool)
+            if substituto is erro:
+                raise
+            raise substituto from erro
+        finally:
+            if not atrasado:
+                self._libertar(inicio, sucesso)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "fila": self._pendentes,
+                "fila_max": self.max_pending,
+                "concluidos": self.concluidos,
+                "rejeitados": self.rejeitados,
+                "tempos_esgotados": self.tempos_esgotados,
+                "atrasados": self.atrasados,
+                "erros": self.erros,
+                "tempo_medio_ms": round(
+                    1000 * self._tempo_total / self.concluidos, 3
+                ) if self.concluidos else 0.0,
+                "tempo_max_ms": round(1000 * self._tempo_max, 3),
+            }